@@ -1,64 +1,32 @@
 # Import ifcopenshell
 import ifcopenshell as ifc
 
-# Define function to get rectangle profile from the columns
-def get_rectangle_profiles_from_columns(model):
-    # Create an empty dictionary to fill with the profile
-    profiles_dictionary = {}
-
-    #For every column in all the IfcColumn
-    for col in model.by_type("IfcColumn"):
-        if not col.Representation: #Check if there aren't
-            continue
-        
-        # Cicle to look the IfcColumn Representations (where the geometry is stored) in Representation
-        for rep in col.Representation.Representations:
-
-            # For every items in the representations
-            for item in rep.Items:
-
-                # Case 1: if column has direct geometry
-                if item.is_a("IfcExtrudedAreaSolid"):
-                    # Define the profile using SweptArea
-                    profile = item.SweptArea
-                    # Check only the rectangle profile
-                    if profile.is_a("IfcRectangleProfileDef"):
-                        # Get the name of the profile
-                        name = profile.ProfileName or "Unnamed"
-                        # Look if the profile name is already in the dictionary and if not it creates an empty list
-                        if name not in profiles_dictionary:
-                            profiles_dictionary[name] = []
-                        # Append the profile in the profile name list
-                        profiles_dictionary[name].append((col.GlobalId, profile))
-
-                # Case 2: if column uses type geometry (IFC defines the geometry once)
-                elif item.is_a("IfcMappedItem"):
-                    # Get the MappedRepresentation in MappingSource (the reusable geometry definition)
-                    mapped_rep = item.MappingSource.MappedRepresentation
-                    # Search for items inside MappedRepresentation
-                    for mapped_item in mapped_rep.Items:
-                        if mapped_item.is_a("IfcExtrudedAreaSolid"):
-                            # Define the profile using SweptArea
-                            profile = mapped_item.SweptArea
-                            # Check only the rectangle profile
-                            if profile.is_a("IfcRectangleProfileDef"):
-                                # Get the name of the profile
-                                name = profile.ProfileName or "Unnamed"
-                                # Look if the profile name is already in the dictionary and if not it creates an empty list
-                                if name not in profiles_dictionary:
-                                    profiles_dictionary[name] = []
-                                # Append the profile in the profile name list
-                                profiles_dictionary[name].append((col.GlobalId, profile))
-
-    return profiles_dictionary
+# Import the profile catalog and the vectorized section properties of the profiles
+from profile_catalog import STRUCTURAL_CLASSES, ProfileCatalog, build_profile_catalog
+from profile_analytics import extract_profile_arrays, summarize_by_profile_name, format_profile_table
+
+# Define function to get rectangle profile from the columns (of a model or of a prebuilt catalog)
+def get_rectangle_profiles_from_columns(model_or_catalog):
+    # The catalog stores identical profiles once and walks the type geometry (IfcMappedItem)
+    # once per representation map, not once per column
+    if isinstance(model_or_catalog, ProfileCatalog):
+        catalog = model_or_catalog
+    else:
+        catalog = build_profile_catalog(model_or_catalog, ("IfcColumn",))
+
+    # Dictionary {profile name: [(GlobalId, profile), ...]} with only the rectangle profiles of the columns
+    return catalog.group_by_profile_name("IfcRectangleProfileDef", element_class="IfcColumn")
 
 # Define main
 def main():
     # Assign the file to the model variable using file path
     model = ifc.open(r"C:\Users\ricki\Desktop\GitHub\BIManalyst_g_46\25-08-D-STR.ifc")
 
+    # Build the profile catalog of all the structural members once, shared by the column listing and the analytics
+    catalog = build_profile_catalog(model, STRUCTURAL_CLASSES)
+
     #Call the funtion to get the profiles dictionary
-    grouped = get_rectangle_profiles_from_columns(model)
+    grouped = get_rectangle_profiles_from_columns(catalog)
 
     # For the items in the 
     for profile_name, col_profiles in grouped.items():
@@ -72,5 +40,11 @@ def main():
         # To divide the profile list in the terminal
         print("-" * 40)
 
+    # Section properties of all the structural members (columns, beams, members) grouped by profile name
+    arrays = extract_profile_arrays(catalog)
+    print("Section properties by profile name:")
+    for line in format_profile_table(summarize_by_profile_name(arrays)):
+        print(line)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""
+Profile analytics:
+- Extract parameterized profile dimensions of structural members into NumPy arrays
+  (one row per unique profile of the ProfileCatalog, elements refer to it by index)
+- Compute section properties (area, second moments, section moduli) in vectorized form
+- Summarize the results in a compact table grouped by profile name
+
+All values are expressed in the project length unit of the model (e.g. mm, mm2, mm4, mm3).
+Second moments and moduli refer to the centroidal axes of the profile position:
+x is the axis parallel to the profile width (strong axis for I/U/T shapes), y is parallel to the depth.
+L shapes use the geometric (not principal) centroidal axes.
+
+Functions:
+- extract_profile_arrays: Collect kind, name and dimensions of the unique profiles (ProfileCatalog) into NumPy arrays
+- compute_section_properties: Compute A, Ix, Iy, Wx, Wy for every row of the profile arrays
+- summarize_by_profile_name: Group section properties by profile name into a compact table
+- format_profile_table: Format the compact table as aligned text lines
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from profile_catalog import STRUCTURAL_CLASSES, ProfileCatalog, build_profile_catalog
+
+# Supported profile kinds and the attributes read as dimensions d0..d3 (order matters).
+PROFILE_ATTRIBUTES: Dict[str, Tuple[str, ...]] = {
+    "IfcRectangleProfileDef": ("XDim", "YDim"),
+    "IfcRectangleHollowProfileDef": ("XDim", "YDim", "WallThickness"),
+    "IfcCircleProfileDef": ("Radius",),
+    "IfcCircleHollowProfileDef": ("Radius", "WallThickness"),
+    "IfcEllipseProfileDef": ("SemiAxis1", "SemiAxis2"),
+    "IfcIShapeProfileDef": ("OverallWidth", "OverallDepth", "WebThickness", "FlangeThickness"),
+    "IfcUShapeProfileDef": ("FlangeWidth", "Depth", "WebThickness", "FlangeThickness"),
+    "IfcTShapeProfileDef": ("FlangeWidth", "Depth", "WebThickness", "FlangeThickness"),
+    "IfcLShapeProfileDef": ("Width", "Depth", "Thickness"),
+}
+
+# Kind codes: index in this tuple; profiles not listed get the code of "Other" (properties are NaN).
+PROFILE_KINDS: Tuple[str, ...] = tuple(PROFILE_ATTRIBUTES) + ("Other",)
+
+# Collect kind, name and dimensions of the unique profiles of all members into NumPy arrays.
+# Accepts a model or a prebuilt ProfileCatalog; dimensions are read once per unique profile.
+# Returns "profile_name" (object), "kind" (int8) and "dims" (u x 4, NaN padded) for the u unique profiles,
+# plus "ref" and "element" (int arrays, one per element/profile occurrence) and "global_id" per element row.
+def extract_profile_arrays(model_or_catalog, ifc_classes: Tuple[str, ...] = STRUCTURAL_CLASSES) -> Dict[str, np.ndarray]:
+    if isinstance(model_or_catalog, ProfileCatalog):
+        catalog = model_or_catalog
+    else:
+        catalog = build_profile_catalog(model_or_catalog, ifc_classes)
+
+    other = PROFILE_KINDS.index("Other")
+    n = len(catalog)
+    names = np.empty(n, dtype=object)
+    kinds = np.full(n, other, dtype=np.int8)
+    dims = np.full((n, 4), np.nan)
+
+    for ref, profile in enumerate(catalog.profiles):
+        ptype = profile.is_a()
+        names[ref] = getattr(profile, "ProfileName", None) or "Unnamed"
+        if ptype not in PROFILE_ATTRIBUTES:
+            continue
+        values = [getattr(profile, a, None) for a in PROFILE_ATTRIBUTES[ptype]]
+        # L shapes may omit Width (equal legs)
+        if ptype == "IfcLShapeProfileDef" and values[0] is None:
+            values[0] = values[1]
+        kinds[ref] = PROFILE_KINDS.index(ptype)
+        dims[ref, : len(values)] = [float(v) if v is not None else np.nan for v in values]
+
+    return {
+        "profile_name": names,
+        "kind": kinds,
+        "dims": dims,
+        "ref": np.asarray(catalog.occ_profile, dtype=np.intp),
+        "element": np.asarray(catalog.occ_element, dtype=np.intp),
+        "global_id": np.array(catalog.global_ids, dtype=object),
+    }
+
+# Compute A, Ix, Iy, Wx, Wy for every row of the profile arrays (one masked pass per profile kind).
+# Returns a dict of float64 arrays aligned with the input rows; unsupported kinds give NaN.
+def compute_section_properties(kind: np.ndarray, dims: np.ndarray) -> Dict[str, np.ndarray]:
+    n = len(kind)
+    out = {k: np.full(n, np.nan) for k in ("area", "ix", "iy", "wx", "wy")}
+
+    def _store(mask, area, ix, iy, wx, wy):
+        out["area"][mask] = area
+        out["ix"][mask] = ix
+        out["iy"][mask] = iy
+        out["wx"][mask] = wx
+        out["wy"][mask] = wy
+
+    def _select(name):
+        mask = kind == PROFILE_KINDS.index(name)
+        return mask, dims[mask].T
+
+    # Rectangle: b = XDim, h = YDim
+    mask, (b, h, _, _) = _select("IfcRectangleProfileDef")
+    ix, iy = b * h**3 / 12.0, h * b**3 / 12.0
+    _store(mask, b * h, ix, iy, ix / (h / 2.0), iy / (b / 2.0))
+
+    # Rectangle hollow: outer minus inner rectangle (corner radii ignored)
+    mask, (b, h, t, _) = _select("IfcRectangleHollowProfileDef")
+    bi, hi = b - 2.0 * t, h - 2.0 * t
+    ix = (b * h**3 - bi * hi**3) / 12.0
+    iy = (h * b**3 - hi * bi**3) / 12.0
+    _store(mask, b * h - bi * hi, ix, iy, ix / (h / 2.0), iy / (b / 2.0))
+
+    # Circle
+    mask, (r, _, _, _) = _select("IfcCircleProfileDef")
+    i = np.pi * r**4 / 4.0
+    _store(mask, np.pi * r**2, i, i, i / r, i / r)
+
+    # Circle hollow
+    mask, (r, t, _, _) = _select("IfcCircleHollowProfileDef")
+    ri = r - t
+    i = np.pi * (r**4 - ri**4) / 4.0
+    _store(mask, np.pi * (r**2 - ri**2), i, i, i / r, i / r)
+
+    # Ellipse: a along x, b along y
+    mask, (a, b, _, _) = _select("IfcEllipseProfileDef")
+    ix, iy = np.pi * a * b**3 / 4.0, np.pi * a**3 * b / 4.0
+    _store(mask, np.pi * a * b, ix, iy, ix / b, iy / a)
+
+    # I shape (doubly symmetric, fillet radii ignored)
+    mask, (b, h, tw, tf) = _select("IfcIShapeProfileDef")
+    hw = h - 2.0 * tf
+    ix = (b * h**3 - (b - tw) * hw**3) / 12.0
+    iy = (2.0 * tf * b**3 + hw * tw**3) / 12.0
+    _store(mask, 2.0 * b * tf + hw * tw, ix, iy, ix / (h / 2.0), iy / (b / 2.0))
+
+    # U shape: symmetric about x, centroid shifted towards the web along x
+    mask, (b, h, tw, tf) = _select("IfcUShapeProfileDef")
+    hw = h - 2.0 * tf
+    area = 2.0 * b * tf + hw * tw
+    xc = (b * tf * b + hw * tw * tw / 2.0) / area
+    ix = (b * h**3 - (b - tw) * hw**3) / 12.0
+    iy = 2.0 * (tf * b**3 / 12.0 + b * tf * (b / 2.0 - xc) ** 2) + hw * tw**3 / 12.0 + hw * tw * (xc - tw / 2.0) ** 2
+    _store(mask, area, ix, iy, ix / (h / 2.0), iy / np.maximum(xc, b - xc))
+
+    # T shape: symmetric about y, flange on top, centroid measured from the top fibre
+    mask, (b, h, tw, tf) = _select("IfcTShapeProfileDef")
+    hw = h - tf
+    area = b * tf + hw * tw
+    yc = (b * tf * tf / 2.0 + hw * tw * (tf + hw / 2.0)) / area
+    ix = b * tf**3 / 12.0 + b * tf * (yc - tf / 2.0) ** 2 + tw * hw**3 / 12.0 + tw * hw * (tf + hw / 2.0 - yc) ** 2
+    iy = (tf * b**3 + hw * tw**3) / 12.0
+    _store(mask, area, ix, iy, ix / np.maximum(yc, h - yc), iy / (b / 2.0))
+
+    # L shape: vertical leg t x h plus horizontal leg (b - t) x t, geometric centroidal axes
+    mask, (b, h, t, _) = _select("IfcLShapeProfileDef")
+    a1, a2 = t * h, (b - t) * t
+    area = a1 + a2
+    xc = (a1 * t / 2.0 + a2 * (t + (b - t) / 2.0)) / area
+    yc = (a1 * h / 2.0 + a2 * t / 2.0) / area
+    ix = t * h**3 / 12.0 + a1 * (h / 2.0 - yc) ** 2 + (b - t) * t**3 / 12.0 + a2 * (t / 2.0 - yc) ** 2
+    iy = h * t**3 / 12.0 + a1 * (t / 2.0 - xc) ** 2 + t * (b - t) ** 3 / 12.0 + a2 * (t + (b - t) / 2.0 - xc) ** 2
+    _store(mask, area, ix, iy, ix / np.maximum(yc, h - yc), iy / np.maximum(xc, b - xc))
+
+    return out
+
+# Group section properties by profile name into a compact table.
+# Properties are computed once per unique profile; occurrences only contribute counts.
+# One row per (profile name, kind): count, mean properties and a flag when dimensions differ within the name.
+# Properties that could not be computed (NaN, e.g. a missing dimension) are left out of the means and their
+# occurrences counted in "missing"; a mean with no computed value is NaN.
+def summarize_by_profile_name(arrays: Dict[str, np.ndarray]) -> List[Dict[str, object]]:
+    if len(arrays["kind"]) == 0:
+        return []
+    props = compute_section_properties(arrays["kind"], arrays["dims"])
+    weights = np.bincount(arrays["ref"], minlength=len(arrays["kind"])).astype(np.float64)
+
+    # Group key: profile name + kind, grouped with a single np.unique over a combined key
+    keys = np.array([f"{n}\x00{k}" for n, k in zip(arrays["profile_name"], arrays["kind"])], dtype=object)
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.ravel()
+    n_groups = len(uniq)
+    counts = np.bincount(inverse, weights=weights, minlength=n_groups)
+
+    valid = {k: ~np.isnan(v) for k, v in props.items()}
+    sums = {k: np.bincount(inverse, weights=np.where(valid[k], v, 0.0) * weights, minlength=n_groups)
+            for k, v in props.items()}
+    computed = {k: np.bincount(inverse, weights=valid[k] * weights, minlength=n_groups) for k in props}
+    complete = np.logical_and.reduce(list(valid.values()))
+    missing = np.bincount(inverse, weights=~complete * weights, minlength=n_groups)
+    used = weights > 0
+    dims = np.nan_to_num(arrays["dims"][used], nan=0.0)
+    dmin = np.full((n_groups, 4), np.inf)
+    dmax = np.full((n_groups, 4), -np.inf)
+    np.minimum.at(dmin, inverse[used], dims)
+    np.maximum.at(dmax, inverse[used], dims)
+    consistent = np.all(np.isclose(dmin, dmax), axis=1)
+
+    table: List[Dict[str, object]] = []
+    for g, key in enumerate(uniq):
+        if counts[g] == 0:
+            continue
+        name, kind = key.split("\x00")
+        row = {
+            "profile_name": name,
+            "profile_type": PROFILE_KINDS[int(kind)],
+            "count": int(counts[g]),
+            "missing": int(missing[g]),
+            "consistent": bool(consistent[g]),
+        }
+        for k in ("area", "ix", "iy", "wx", "wy"):
+            row[k] = float(sums[k][g] / computed[k][g]) if computed[k][g] > 0 else float("nan")
+        table.append(row)
+    return table
+
+# Format the compact table as aligned text lines (same layout style as the A3 reports).
+def format_profile_table(table: List[Dict[str, object]]) -> List[str]:
+    headers = ["Profile Name", "Type", "Count", "Missing", "A", "Ix", "Iy", "Wx", "Wy", "Dims"]
+    rows = []
+    for r in table:
+        rows.append(
+            [r["profile_name"], r["profile_type"], r["count"], r["missing"]]
+            + [f"{r[k]:.4g}" for k in ("area", "ix", "iy", "wx", "wy")]
+            + ["ok" if r["consistent"] else "MIXED"]
+        )
+    widths = [len(h) for h in headers]
+    for r in rows:
+        for i, cell in enumerate(r):
+            widths[i] = max(widths[i], len(str(cell)))
+    out = [" | ".join(f"{h:<{widths[i]}}" for i, h in enumerate(headers))]
+    out.append("─┼─".join("─" * w for w in widths))
+    for r in rows:
+        out.append(" | ".join(f"{str(c):<{widths[i]}}" for i, c in enumerate(r)))
+    return out
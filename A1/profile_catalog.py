@@ -0,0 +1,137 @@
+"""
+Profile catalog:
+- Deduplicate structurally identical profile definitions by value (not by entity id)
+- Walk each IfcRepresentationMap (type geometry) once and cache its profiles
+- Store every element as small integer references into the catalog
+
+Profiles are compared on their class and non-entity attributes (ProfileType, ProfileName, dimensions).
+The Position placement is ignored since it does not change the section; other entity-valued attributes
+(e.g. the curves of arbitrary profiles) are compared by entity id.
+
+Functions / classes:
+- profile_key: Build the hashable value key of a profile definition
+- ProfileCatalog: Unique profiles plus compact (element, profile) occurrence arrays
+- build_profile_catalog: Fill a catalog with the swept profiles of IfcColumn, IfcBeam and IfcMember
+"""
+
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+# Default structural member classes collected in the catalog.
+STRUCTURAL_CLASSES: Tuple[str, ...] = ("IfcColumn", "IfcBeam", "IfcMember")
+
+# Build the hashable value key of a profile definition: (class, ((attribute, value), ...)).
+def profile_key(profile) -> tuple:
+    values = []
+    for attr, value in profile.get_info(include_identifier=False, recursive=False).items():
+        if attr in ("type", "Position"):
+            continue
+        if hasattr(value, "is_a"):
+            value = ("#", value.id())
+        elif isinstance(value, float):
+            value = round(value, 6)
+        elif isinstance(value, tuple):
+            value = tuple(("#", v.id()) if hasattr(v, "is_a") else v for v in value)
+        values.append((attr, value))
+    return (profile.is_a(), tuple(values))
+
+class ProfileCatalog:
+    """Unique profile definitions and the elements referencing them by integer index."""
+
+    def __init__(self):
+        # Unique profiles: representative entity and value key, indexed by catalog reference
+        self.profiles: List[object] = []
+        self.keys: List[tuple] = []
+        self._by_key: Dict[tuple, int] = {}
+        # Caches: profile entity id -> reference, representation map id -> references
+        self._by_entity: Dict[int, int] = {}
+        self._by_map: Dict[int, Tuple[int, ...]] = {}
+        # Elements: GlobalId and class code (index in self.classes)
+        self.classes: List[str] = []
+        self._class_elements: List[object] = []  # first element of every class, for is_a() filters
+        self.global_ids: List[str] = []
+        self.element_class = array("B")
+        # Occurrences: one per (element, swept profile); element row and catalog reference
+        self.occ_element = array("I")
+        self.occ_profile = array("I")
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    # Return the catalog reference of a profile, adding it if no identical profile exists yet.
+    def intern(self, profile) -> int:
+        ref = self._by_entity.get(profile.id())
+        if ref is not None:
+            return ref
+        key = profile_key(profile)
+        ref = self._by_key.get(key)
+        if ref is None:
+            ref = len(self.profiles)
+            self.profiles.append(profile)
+            self.keys.append(key)
+            self._by_key[key] = ref
+        self._by_entity[profile.id()] = ref
+        return ref
+
+    # Yield the catalog references of the swept profiles of an element.
+    # Type geometry (IfcMappedItem) is resolved once per IfcRepresentationMap.
+    def _element_refs(self, element) -> Iterator[int]:
+        if not element.Representation:
+            return
+        for rep in element.Representation.Representations:
+            for item in rep.Items:
+                # Case 1: direct geometry
+                if item.is_a("IfcExtrudedAreaSolid"):
+                    yield self.intern(item.SweptArea)
+                # Case 2: type geometry shared through the representation map
+                elif item.is_a("IfcMappedItem"):
+                    rmap = item.MappingSource
+                    refs = self._by_map.get(rmap.id())
+                    if refs is None:
+                        refs = tuple(
+                            self.intern(mapped_item.SweptArea)
+                            for mapped_item in rmap.MappedRepresentation.Items
+                            if mapped_item.is_a("IfcExtrudedAreaSolid")
+                        )
+                        self._by_map[rmap.id()] = refs
+                    yield from refs
+
+    # Add an element and its profile occurrences; return the element row.
+    def add_element(self, element) -> int:
+        cls = element.is_a()
+        if cls not in self.classes:
+            self.classes.append(cls)
+            self._class_elements.append(element)
+        row = len(self.global_ids)
+        self.global_ids.append(element.GlobalId)
+        self.element_class.append(self.classes.index(cls))
+        for ref in self._element_refs(element):
+            self.occ_element.append(row)
+            self.occ_profile.append(ref)
+        return row
+
+    # Group occurrences by profile name as {name: [(GlobalId, profile), ...]}.
+    # profile_class and element_class filter the profiles and the elements with is_a() (subtypes included),
+    # e.g. "IfcRectangleProfileDef" and "IfcColumn".
+    def group_by_profile_name(self, profile_class: str = None, element_class: str = None) -> Dict[str, List[Tuple[str, object]]]:
+        codes = None
+        if element_class:
+            codes = {code for code, element in enumerate(self._class_elements) if element.is_a(element_class)}
+        grouped: Dict[str, List[Tuple[str, object]]] = {}
+        for row, ref in zip(self.occ_element, self.occ_profile):
+            if codes is not None and self.element_class[row] not in codes:
+                continue
+            profile = self.profiles[ref]
+            if profile_class and not profile.is_a(profile_class):
+                continue
+            name = getattr(profile, "ProfileName", None) or "Unnamed"
+            grouped.setdefault(name, []).append((self.global_ids[row], profile))
+        return grouped
+
+# Fill a catalog with the swept profiles of the given classes (IfcColumn, IfcBeam and IfcMember by default).
+def build_profile_catalog(model, ifc_classes: Tuple[str, ...] = STRUCTURAL_CLASSES, catalog: ProfileCatalog = None) -> ProfileCatalog:
+    catalog = catalog if catalog is not None else ProfileCatalog()
+    for cls in ifc_classes:
+        for element in model.by_type(cls):
+            catalog.add_element(element)
+    return catalog
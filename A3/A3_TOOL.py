@@ -1,81 +1,613 @@
 """
 Main pipeline:
-- Ask for IFC path (or take first CLI argument)
+- Take the IFC model, the price list and every option from the command line (never prompts, see --help)
+- Import ifcopenshell and the helpers only when a run starts, so --help and argument errors answer at once
 - Open IFC (not stored in repo)
 - Import CSV price list, create/attach cost data, assign elements
-- Write cost report (QTO.txt)
+- Write cost reports (QTO/BOQ, totals, JSON) and the IFC concurrently, atomically (temp file + rename)
+- Print time and peak memory per stage, including the import time (--low-memory releases the model before the reports)
+- Optionally write only a cost overlay IFC (--overlay) instead of the whole enriched model
+- Optionally stream every element line as NDJSON (--ndjson, --gzip also compresses QTO_elements.txt)
+- Read .ifczip models without extracting them and write the enriched model compressed (.ifczip, --ifczip)
+- Optionally write element and item tables to Parquet / Arrow IPC (--parquet, --arrow)
+- Optionally compare price scenarios on the same quantities (--scenario=SPEC, repeatable)
+- Optionally estimate cost ranges with a Monte Carlo simulation (--montecarlo, --montecarlo-samples=N, --seed=S)
+- Preview mode: rough estimate from a stratified sample of the elements (--preview, --preview-size=N)
+- Optionally split the BOQ by zone or grid bay from element bounding boxes (--zones=SPEC)
+- Federation: estimate several models in parallel processes, each GlobalId once, BOQ per source (model1 model2 ...)
+- Pre-flight: check that the elements have the quantities their price list units need (--preflight,
+  --min-coverage=MIN)
+- Optionally checkpoint every completed stage and resume an interrupted run with the same inputs (--checkpoint,
+  --resume)
+- Optionally append the totals per item and storey to an SQLite history of the revisions (--history, --history-db=DB,
+  --revision)
+- Return an EstimateQuery (element <-> cost item indexes) for scripts and dashboards
+
+Modes (one function each, sharing the pipeline stages below them):
+- structural_cost_estimation: Full run of one model (optionally gated by the pre-flight coverage)
+- federated_cost_estimation: Full run of several models as one project
+- preflight_check: Quantity completeness check only
+- preview_estimation: Extrapolated estimate from a sample of the elements
+- ReportOptions: Optional reports of the full runs (per-element QTO, JSON stream, columnar, scenarios, Monte Carlo)
 """
 
+import time
+
+_IMPORT_START = time.perf_counter()
+
+import argparse
+import gc
 import os
 import sys
-import re
 from pathlib import Path
-from xml.parsers.expat import model
-import ifcopenshell
+from typing import NamedTuple, Optional, Sequence
 
-from helper.helper_cost import assign_elements_to_cost_items_by_type_name_from_csv
-from helper.helper_write import (
-    write_qto_types_no_cost,
-    write_boq_report,
-    write_qto_types_no_cost_totals,
-    write_boq_report_totals,
-)
-from helper.helper_JSON import output_to_json
+from helper.helper_read import PriceListFormat
+from helper.helper_stage import StageMonitor
 
+# Time spent importing this module (the heavy imports happen in the "import" stage of a run)
+MODULE_IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
+# Exit status of a command line run stopped by --min-coverage=MIN (coverage below MIN)
+EXIT_COVERAGE_BELOW_MIN = 1
+# Default Monte Carlo samples (--montecarlo) and preview sample size (--preview)
+MONTECARLO_SAMPLES = 100000
+PREVIEW_SIZE = 2000
 
-def structural_cost_estimation(model_path, price_csv_path, output_dir="output"):
 
-    # Open IFC model
-    model = ifcopenshell.open(str(model_path))
-    print(f"Opened IFC: {model_path}")
+class ReportOptions(NamedTuple):
+    """
+    Optional reports of a run, next to QTO/BOQ/JSON (defaults: none of them):
+    - detailed: QTO_elements.txt, one streamed row per element -> cost item line
+    - stream_format: "ndjson" (or "json") streams every cost item and element line to A3_TOOL.ndjson
+    - compress: gzip these large reports while they are streamed (QTO_elements.txt.gz, A3_TOOL.ndjson.gz)
+    - columnar: "parquet" (or "arrow") writes A3_TOOL_elements.parquet and A3_TOOL_items.parquet (requires pyarrow)
+    - scenarios: price scenario specs (see helper.helper_scenario, e.g. "prices_2026.csv", "+5%") evaluated on the
+      same quantities and assignments; writes the comparison BOQ_scenarios.txt
+    - montecarlo: samples of the unit costs and quantities (0: off; seed for reproducible runs, per-item ranges from
+      uncertainty_csv, see helper.helper_montecarlo); writes P10/P50/P90 per item and in total to BOQ_montecarlo.txt
+    """
 
-    output_dir = os.path.join(os.path.dirname(__file__), "output")
-    os.makedirs(output_dir, exist_ok=True)
+    detailed: bool = False
+    stream_format: Optional[str] = None
+    compress: bool = False
+    columnar: Optional[str] = None
+    scenarios: Sequence = ()
+    montecarlo: int = 0
+    seed: Optional[int] = None
+    uncertainty_csv: Optional[str] = None
 
-    if not os.path.isfile(price_csv_path):
-        raise FileNotFoundError(f"No file found at {price_csv_path}!")
-    
-    assign_elements_to_cost_items_by_type_name_from_csv(
-        model,
-        price_csv_path,
-        schedule_name="Price List",
-    )
 
-    # Pass csv_path to all report functions
-    qto_path = write_qto_types_no_cost(model, output_dir=output_dir, filename="QTO.txt")
-    boq_path = write_boq_report(model, output_dir=output_dir, filename="BOQ.txt", csv_path=price_csv_path)
-    qto_tot_path = write_qto_types_no_cost_totals(model, output_dir=output_dir, filename="QTO_total.txt")
-    boq_tot_path = write_boq_report_totals(model, output_dir=output_dir, filename="BOQ_total.txt", csv_path=price_csv_path)
-    
-    print(f"Written QTO: {os.path.abspath(qto_path)}")
-    print(f"Written BOQ: {os.path.abspath(boq_path)}")
-    print(f"Written QTO (totals): {os.path.abspath(qto_tot_path)}")
-    print(f"Written BOQ (totals): {os.path.abspath(boq_tot_path)}")
+def preflight_check(model_path, price_csv_path, output_dir="output", *, price_format=None):
+    """
+    Check, without estimating, that the elements carry the base quantities their matched price list unit needs
+    and write PREFLIGHT.txt with the coverage by IFC class and storey (see helper.helper_preflight).
+
+    Returns the helper.helper_preflight check (coverage, priced and missing elements).
+    """
+    monitor = _stage_monitor()
+    # ifcopenshell and the helpers are loaded here, not at module import; the stages use the loaded modules
+    with monitor.stage("import"):
+        import helper.helper_ifczip
+        import helper.helper_preflight
+
+    _check_inputs([model_path], price_csv_path, output_dir)
+    model = _open_stage(monitor, model_path)
+    check = _preflight_stage(monitor, model, price_csv_path, output_dir, price_format or PriceListFormat())
+    _print_stages(monitor)
+    return check
+
+
+def preview_estimation(model_path, price_csv_path, output_dir="output", *, sample_size=PREVIEW_SIZE, seed=None,
+                       price_format=None):
+    """
+    Rough estimate for a first number on a huge model: only a stratified sample of about sample_size elements
+    (by IFC class and storey) is matched and measured; writes the extrapolated BOQ_preview.txt with margins of error.
+    The model is not modified and no other output is written; seed makes the sample reproducible.
+
+    Returns the helper.helper_preview estimate.
+    """
+    monitor = _stage_monitor()
+    with monitor.stage("import"):
+        from helper.helper_estimate import compile_price_list
+        from helper.helper_preview import preview_estimate
+        from helper.helper_write import write_boq_preview
+
+    _check_inputs([model_path], price_csv_path, output_dir)
+    model = _open_stage(monitor, model_path)
+    with monitor.stage("preview"):
+        prices = compile_price_list(price_csv_path, price_format=price_format or PriceListFormat())
+        estimate = preview_estimate(model, prices, sample_size=int(sample_size), seed=seed)
+        preview_path = write_boq_preview(estimate, output_dir)
+    print(f"Preview: {estimate.total:.2f} ± {estimate.total_margin:.2f} ({100 * estimate.confidence:g}%), "
+          f"sample {estimate.sample} of {estimate.population} elements in {len(estimate.strata)} strata")
+    print(f"Written BOQ (preview): {os.path.abspath(preview_path)}")
+    _print_stages(monitor)
+    return estimate
+
+
+def structural_cost_estimation(model_path, price_csv_path, output_dir="output", *, reports=None, price_format=None,
+                               overlay=False, ifc_zip=False, low_memory=False, zones=None, zone_geometry=True,
+                               ifc_classes=(), match_workers=None, min_coverage=None, checkpoint_stages=False,
+                               resume=False, history=None, revision=None):
+    """
+    Run the whole estimation and print time and peak memory per stage.
+
+    reports (ReportOptions): optional reports next to QTO/BOQ/JSON and the enriched IFC.
+    price_format (helper.helper_read.PriceListFormat) sets the CSV delimiter, encoding and column names.
+    overlay=True writes <model>_cost_overlay.ifc with only the cost entities (elements referenced by GlobalId)
+    instead of re-serializing the whole model; merge it with helper.helper_overlay when a single file is needed.
+    The model may be a .ifczip (read without extracting it, see helper.helper_ifczip); the enriched IFC (or the
+    overlay) is then written as .ifczip too, compressed while it is serialized; ifc_zip=True does so for a .ifc.
+    low_memory=True releases the IFC model as soon as the cost-enriched IFC is written:
+    extract the element table -> write IFC -> release model -> render reports and JSON from the table.
+    zones ("zones.csv", "grid" or "grid:STEP", see helper.helper_zones) also writes BOQ_zones.txt; element boxes come
+    from the geometry (zone_geometry=False: placements only) and are cached in output_dir/A3_TOOL_boxes.npz.
+
+    ifc_classes restricts the matching to these IFC classes (the other elements stay in the QTO, unpriced); only the
+    elements of priced classes are visited (helper.helper_scan).
+    match_workers: processes matching the distinct element names (None: automatic, up to one per CPU for large
+    models; 1: serial), see helper.helper_match; the result does not depend on it.
+    min_coverage (e.g. 0.95) checks the quantity completeness first (PREFLIGHT.txt, see preflight_check) and stops
+    before the assignment when it is lower.
+    checkpoint_stages=True records the completed stages in output_dir/A3_TOOL_checkpoint (element table, report
+    snapshot, written outputs, see helper.helper_checkpoint); resume=True (implies checkpoint_stages) skips the
+    stages completed by an earlier run when the input files (SHA-256) and the output options are unchanged. A
+    resumed run opens the model only for the outputs still to write that need it (enriched IFC, zones);
+    low_memory may change between runs.
+    history: SQLite database (True: output_dir/A3_TOOL_history.sqlite) the run is appended to, with its totals per
+    item and per storey, labelled revision (default: the model file name), see helper.helper_history.
+
+    Returns a helper.helper_query.EstimateQuery over the result (element <-> cost item lookups and filtered
+    sub-totals by item, storey, type and class), None when the coverage is below min_coverage.
+    """
+    monitor = _stage_monitor()
+    model_path = Path(model_path)
+    reports = reports or ReportOptions()
+    f = price_format or PriceListFormat()
+
+    # ifcopenshell (schema wrapper, API) and the helpers are loaded here, not at module import;
+    # the stages use the loaded modules
+    with monitor.stage("import"):
+        import helper.helper_cost
+        import helper.helper_records
+        from helper.helper_ifczip import is_ifczip
+        from helper.helper_output import write_model_atomic
+        from helper.helper_query import EstimateQuery
+
+    # Parse the price scenarios first, so a wrong spec fails before the long stages
+    scenarios, montecarlo_options = _analysis_options(reports, f)
+    _check_inputs([model_path], price_csv_path, output_dir)
+
+    # Output options: part of the checkpoint fingerprint and recorded with the run in the history
+    options = {"price_format": f, "ifc_zip": bool(ifc_zip), "ifc_classes": sorted(ifc_classes), "overlay": overlay,
+               "detailed": reports.detailed, "stream_format": reports.stream_format, "compress": reports.compress,
+               "columnar": reports.columnar, "scenarios": list(reports.scenarios or ()),
+               "montecarlo": montecarlo_options, "zones": zones, "zone_geometry": zone_geometry}
+    checkpoint = None
+    if checkpoint_stages or resume:
+        files = [model_path, price_csv_path] + [p for p in (reports.uncertainty_csv, zones) if p and os.path.isfile(p)]
+        checkpoint = _checkpoint_stage(monitor, output_dir, files, options, resume)
+    table = checkpoint.load("table") if checkpoint and checkpoint.done("table") else None
+    done = checkpoint.written_outputs() if checkpoint else {}
+    if table is not None:
+        print(f"Resumed from the checkpoint: element table loaded, {len(done)} outputs already written"
+              + (f" ({', '.join(done)})" if done else ""))
+
+    # The model is needed to match, for the enriched IFC and for the zone boxes only
+    ifc_pending = not overlay and "IFC" not in done
+    zones_pending = bool(zones) and "BOQ (zones)" not in done
+    model = _open_stage(monitor, model_path) if table is None or ifc_pending or zones_pending else None
+
+    if table is None:
+        if min_coverage is not None:
+            # Quantity completeness by class and storey, before the matching and writing stages
+            check = _preflight_stage(monitor, model, price_csv_path, output_dir, f)
+            if check.coverage < min_coverage:
+                print(f"[WARNING] Coverage below {min_coverage:.1%}, estimate not run.")
+                _print_stages(monitor)
+                return None
+        table = _match_stage(monitor, model, price_csv_path, f, ifc_classes, match_workers)
+        if checkpoint:
+            with monitor.stage("checkpoint (table)"):
+                checkpoint.save("table", table)
+    elif ifc_pending:
+        # Matching skipped: re-create the checkpointed cost items and assignments for the enriched IFC
+        from helper.helper_cost import assign_elements_from_table
+
+        with monitor.stage("assign (checkpoint)"):
+            assign_elements_from_table(model, table, schedule_name="Price List")
+
+    snapshot = _aggregate_stage(monitor, table, checkpoint)
+    zone_assignment = _zones_stage(monitor, model, table, zones, zone_geometry, model_path, output_dir) if zones_pending else None
 
     # Generate output IFC filename
-    input_stem = model_path.stem
-    input_ext = model_path.suffix
-    output_ifc_name = f"{input_stem}_cost{input_ext}"
+    input_ext = ".ifczip" if ifc_zip or is_ifczip(model_path) else model_path.suffix
+    output_ifc_name = f"{model_path.stem}_cost_overlay{input_ext}" if overlay else f"{model_path.stem}_cost{input_ext}"
     output_ifc_path = os.path.join(output_dir, output_ifc_name)
-    model.write(output_ifc_path)
-    print(f"Updated IFC written to: {os.path.abspath(output_ifc_path)}")
 
-    # Generate JSON output with csv_path
-    json_path = output_to_json(model, csv_path=price_csv_path)
+    if low_memory and ifc_pending:
+        # Write the enriched IFC first, then release the model before rendering the reports
+        with monitor.stage("write ifc"):
+            write_model_atomic(model, output_ifc_path)
+        if checkpoint:
+            checkpoint.output_written("IFC", output_ifc_path)
+        print(f"Updated IFC written to: {os.path.abspath(output_ifc_path)}")
+    if model is not None and (low_memory or overlay or not ifc_pending):
+        # The overlay is built from the element table: the model is not needed anymore
+        with monitor.stage("release model"):
+            model = None
+            gc.collect()
 
+    # Reports, JSON and IFC (enriched model or overlay) rendered concurrently from one snapshot;
+    # outputs already written by a checkpointed run are skipped
+    _outputs_stage(monitor, table, output_dir, reports, scenarios, montecarlo_options,
+                   model=model,
+                   ifc_path=output_ifc_path if model is not None else None,
+                   overlay_path=output_ifc_path if overlay else None,
+                   zones=zone_assignment,
+                   snapshot=snapshot,
+                   skip=tuple(done),
+                   on_written=checkpoint.output_written if checkpoint else None)
+    model = None
 
-if __name__ == "__main__":
-    # Determine IFC path: CLI arg else prompt
-    if len(sys.argv) > 1:
-        input_path = sys.argv[1]
-    else:
-        input_path = input("Enter absolute path to IFC model: ").strip()
+    if history and "history" not in done:
+        history_path = _history_stage(monitor, history, output_dir, snapshot, revision or model_path.name,
+                                      [model_path], price_csv_path, options, checkpoint)
+        if checkpoint:
+            checkpoint.output_written("history", history_path)
+
+    # Element <-> cost indexes over the same table, returned for interactive queries
+    with monitor.stage("query index"):
+        query = EstimateQuery(table)
+
+    _print_stages(monitor)
+    return query
+
+
+def federated_cost_estimation(model_paths, price_csv_path, output_dir="output", *, duplicates="first",
+                              max_workers=None, reports=None, price_format=None, history=None, revision=None):
+    """
+    Estimate several IFC models (e.g. one per building section) as one project and print time and memory per stage.
+
+    Every model is opened and estimated in its own worker process (max_workers, default one per model up to the
+    CPU count) without being modified; the element tables are merged with each GlobalId counted once, the copy
+    kept according to duplicates ("first", "last", "max" or "error", see helper.helper_federation).
+    Writes one merged QTO/BOQ/JSON (and the optional reports, see ReportOptions) and BOQ_sources.txt
+    with the amounts per source model and the duplicates dropped; no IFC is written.
+    history / revision (default: the model file names) append the merged totals to the estimate history.
+    """
+    monitor = _stage_monitor()
+    reports = reports or ReportOptions()
+    f = price_format or PriceListFormat()
+
+    with monitor.stage("import"):
+        from helper.helper_federation import federate
+        from helper.helper_records import build_report_snapshot
+
+    _check_inputs(model_paths, price_csv_path, output_dir)
+    scenarios, montecarlo_options = _analysis_options(reports, f)
+
+    with monitor.stage("estimate (parallel)"):
+        result = federate(model_paths, price_csv_path, policy=duplicates, price_format=f, max_workers=max_workers)
+    print(f"Federated {len(result.sources)} models: {len(result.table)} elements, "
+          f"{sum(result.duplicates)} duplicates dropped ({result.conflicts} priced differently)")
+
+    _outputs_stage(monitor, result.table, output_dir, reports, scenarios, montecarlo_options, sources=result)
+
+    if history:
+        _history_stage(monitor, history, output_dir, build_report_snapshot(result.table),
+                       revision or " + ".join(Path(p).name for p in model_paths), model_paths, price_csv_path,
+                       {"duplicates": duplicates, "price_format": f})
+
+    _print_stages(monitor)
+    return result
 
-    model_path = Path(input_path)
-    if not model_path.is_file():
-        raise FileNotFoundError(f"No file found at {model_path}!")
-    # Assign cost items from price list
-    price_csv = input("Enter price list path:").strip()
 
-    structural_cost_estimation(model_path, price_csv)
+# Stage monitor of a run, starting with the time spent importing this module.
+def _stage_monitor():
+    monitor = StageMonitor()
+    monitor.record("import (module)", MODULE_IMPORT_SECONDS)
+    return monitor
 
+# Print the time and peak memory of every stage.
+def _print_stages(monitor):
+    print("Stages:")
+    for line in monitor.report():
+        print(f"  {line}")
+
+# Fail early on missing input files, then create the output folder.
+def _check_inputs(model_paths, price_csv_path, output_dir):
+    for path in list(model_paths) + [price_csv_path]:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No file found at {path}!")
+    os.makedirs(output_dir, exist_ok=True)
+
+# Parse the scenario specs and build the Monte Carlo options (simulate_costs keyword arguments, None when off).
+def _analysis_options(reports, price_format):
+    f = price_format
+    scenarios = reports.scenarios
+    if scenarios:
+        from helper.helper_scenario import Scenario, parse_scenario
+        scenarios = [s if isinstance(s, Scenario) else parse_scenario(s, delimiter=f.delimiter, encoding=f.encoding,
+                                                                       ident_col=f.ident_col,
+                                                                       unit_cost_col=f.unit_cost_col)
+                     for s in scenarios]
+    montecarlo_options = None
+    if reports.montecarlo:
+        from helper.helper_montecarlo import read_uncertainty_csv
+        montecarlo_options = {"samples": int(reports.montecarlo), "seed": reports.seed}
+        if reports.uncertainty_csv:
+            montecarlo_options["per_item"] = read_uncertainty_csv(reports.uncertainty_csv)
+    return scenarios, montecarlo_options
+
+# Open the IFC model (.ifc or .ifczip).
+def _open_stage(monitor, model_path):
+    from helper.helper_ifczip import open_ifc
+
+    with monitor.stage("open"):
+        model = open_ifc(model_path)
+    print(f"Opened IFC: {model_path}")
+    return model
+
+# Quantity completeness by class and storey of the matched elements, written to PREFLIGHT.txt.
+def _preflight_stage(monitor, model, price_csv_path, output_dir, price_format):
+    from helper.helper_estimate import compile_price_list
+    from helper.helper_preflight import run_preflight
+    from helper.helper_write import write_preflight_report
+
+    with monitor.stage("preflight"):
+        check = run_preflight(model, compile_price_list(price_csv_path, price_format=price_format))
+        preflight_path = write_preflight_report(check, output_dir)
+    print(f"Pre-flight: {check.coverage:.1%} coverage, {check.missing} of {check.priced} priced elements "
+          f"without the needed quantity ({check.elements} elements)")
+    print(f"Written pre-flight report: {os.path.abspath(preflight_path)}")
+    return check
+
+# Stage checkpoints in output_dir/A3_TOOL_checkpoint, loaded when resuming a run with the same inputs and options.
+def _checkpoint_stage(monitor, output_dir, files, options, resume):
+    from helper.helper_checkpoint import Checkpoint, run_fingerprint
+
+    with monitor.stage("checkpoint (inputs)"):
+        return Checkpoint(os.path.join(output_dir, "A3_TOOL_checkpoint"), run_fingerprint(files, options),
+                          resume=resume)
+
+# Match the elements to the price list, assign them in the model and extract the element table.
+def _match_stage(monitor, model, price_csv_path, price_format, ifc_classes, match_workers):
+    from helper.helper_cost import assign_elements_to_cost_items_by_type_name_from_csv
+    from helper.helper_records import extract_element_table
+
+    f = price_format
+    with monitor.stage("assign"):
+        stats = assign_elements_to_cost_items_by_type_name_from_csv(
+            model,
+            price_csv_path,
+            schedule_name="Price List",
+            ident_col=f.ident_col,
+            text_col=f.text_col,
+            ifc_match_col=f.ifc_match_col,
+            unit_cost_col=f.unit_cost_col,
+            delimiter=f.delimiter,
+            encoding=f.encoding,
+            filter_ifc_classes=tuple(ifc_classes),
+            match_workers=match_workers,
+        )
+    print(f"Scanned {stats['scanned']} elements of the priced classes, skipped {stats['skipped_no_candidates']} "
+          f"elements of other classes; {stats['unique_names']} distinct names matched, {stats['assigned']} assigned")
+
+    # Extract once the compact element table (classes, types, levels, cost items, quantities)
+    # shared by all the reports, instead of re-walking the model in every writer
+    with monitor.stage("extract"):
+        return extract_element_table(model, csv_path=price_csv_path, price_format=f)
+
+# Aggregated view of the table shared by the reports (per type/level counts, BOQ per item and level).
+def _aggregate_stage(monitor, table, checkpoint):
+    from helper.helper_records import build_report_snapshot
+
+    if checkpoint and checkpoint.done("snapshot"):
+        return checkpoint.load("snapshot")
+    with monitor.stage("aggregate"):
+        snapshot = build_report_snapshot(table)
+    if checkpoint:
+        with monitor.stage("checkpoint (snapshot)"):
+            checkpoint.save("snapshot", snapshot)
+    return snapshot
+
+# Zones: element bounding boxes (cached per model file) and one spatial index query per zone.
+def _zones_stage(monitor, model, table, zones, zone_geometry, model_path, output_dir):
+    from helper.helper_zones import assign_zones, element_boxes, parse_zones
+
+    with monitor.stage("zones"):
+        stat = os.stat(model_path)
+        boxes = element_boxes(model, table, geometry=zone_geometry,
+                              cache_path=os.path.join(output_dir, "A3_TOOL_boxes.npz"),
+                              key=f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}")
+        return assign_zones(boxes, parse_zones(zones, model, boxes))
+
+# Render the reports (and the IFC targets given) concurrently and print the written paths.
+def _outputs_stage(monitor, table, output_dir, reports, scenarios, montecarlo_options, **targets):
+    from helper.helper_output import write_outputs_concurrently
+
+    with monitor.stage("outputs"):
+        written = write_outputs_concurrently(
+            table,
+            output_dir,
+            schedule_name="Price List",
+            json_dir=output_dir,
+            detailed=reports.detailed,
+            stream_format=reports.stream_format,
+            compress=reports.compress,
+            columnar=reports.columnar,
+            scenarios=scenarios,
+            montecarlo=montecarlo_options,
+            **targets,
+        )
+    _print_written(written)
+    return written
+
+# Append a run to the estimate history (True: output_dir/A3_TOOL_history.sqlite); returns the database path.
+# Input digests are reused from the checkpoint fingerprint when there is one.
+def _history_stage(monitor, history, output_dir, snapshot, revision, model_paths, price_csv_path, options,
+                   checkpoint=None):
+    from helper.helper_history import EstimateHistory
+
+    history_path = os.path.join(output_dir, "A3_TOOL_history.sqlite") if history is True else str(history)
+    with monitor.stage("history"), EstimateHistory(history_path) as db:
+        run_id = db.record_run(snapshot, revision=revision, model_paths=model_paths, price_list=price_csv_path,
+                               options={name: repr(value) for name, value in options.items()},
+                               digests=checkpoint.fingerprint["files"] if checkpoint else None)
+    print(f"Recorded run {run_id} in the estimate history: {os.path.abspath(history_path)}")
+    return history_path
+
+# Print the paths of the written outputs.
+def _print_written(written):
+    for name, path in written.items():
+        if name == "IFC":
+            print(f"Updated IFC written to: {os.path.abspath(path)}")
+        elif name == "IFC overlay":
+            print(f"Cost overlay IFC written to: {os.path.abspath(path)}")
+        elif name == "JSON stream":
+            print(f"JSON stream written to: {os.path.abspath(path)}")
+        elif name != "JSON":
+            print(f"Written {name}: {os.path.abspath(path)}")
+
+
+# Command line parser: model and price list are required, every other setting has a flag.
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="A3_TOOL", description="Cost estimation of IFC models from a CSV price list.")
+    parser.add_argument("model", type=Path, nargs="+",
+                        help="IFC model (.ifc or .ifczip); several models are estimated together as one federation")
+    parser.add_argument("price_list", help="price list CSV")
+    parser.add_argument("-o", "--output-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "output"),
+                        help="output folder (default: output next to this script)")
+
+    csv = parser.add_argument_group("price list format")
+    defaults = PriceListFormat()
+    csv.add_argument("--delimiter", default=defaults.delimiter, help="CSV delimiter (default: %(default)s)")
+    csv.add_argument("--encoding", default=defaults.encoding, help="CSV encoding (default: %(default)s)")
+    csv.add_argument("--ident-col", default=defaults.ident_col, help="identification code column (default: %(default)s)")
+    csv.add_argument("--name-col", default=defaults.text_col, help="description column (default: %(default)s)")
+    csv.add_argument("--ifc-match-col", default=defaults.ifc_match_col, help="IFC class column (default: %(default)s)")
+    csv.add_argument("--cost-col", default=defaults.unit_cost_col, help="unit cost column (default: %(default)s)")
+    csv.add_argument("--unit-col", default=defaults.unit_col, help="unit column (default: %(default)s)")
+    csv.add_argument("--density-col", default=defaults.density_col, help="density column, kg/m3 (default: %(default)s)")
+
+    csv.add_argument("--classes", type=lambda v: [c.strip() for c in v.split(",") if c.strip()], default=[],
+                     metavar="IFCCLASS,...", help="price only these IFC classes (e.g. IfcBeam,IfcColumn)")
+
+    csv.add_argument("--match-workers", type=int, metavar="N",
+                     help="processes for the name matching (default: automatic, up to one per CPU; 1: serial)")
+
+    out = parser.add_argument_group("outputs")
+    out.add_argument("--low-memory", action="store_true", help="release the model before the reports are rendered")
+    out.add_argument("--overlay", action="store_true", help="write only the cost entities instead of the whole model")
+    out.add_argument("--detailed", action="store_true", help="add the per-element report QTO_elements.txt")
+    out.add_argument("--ndjson", action="store_true", help="stream the element lines to A3_TOOL.ndjson")
+    out.add_argument("--gzip", action="store_true", help="gzip the NDJSON stream and QTO_elements.txt")
+    out.add_argument("--ifczip", action="store_true", help="write the enriched IFC (or overlay) as .ifczip")
+    columnar = out.add_mutually_exclusive_group()
+    columnar.add_argument("--parquet", action="store_const", dest="columnar", const="parquet",
+                          help="write the element and item tables to Parquet")
+    columnar.add_argument("--arrow", action="store_const", dest="columnar", const="arrow",
+                          help="write the element and item tables to Arrow IPC")
+    out.add_argument("--scenario", action="append", default=[], metavar="SPEC",
+                     help="price scenario for BOQ_scenarios.txt, repeatable (e.g. prices_2026.csv, +5%%)")
+    out.add_argument("--montecarlo", action="store_true", help="write the cost ranges BOQ_montecarlo.txt")
+    out.add_argument("--montecarlo-samples", type=int, metavar="N",
+                     help=f"samples of --montecarlo (implies it, default: {MONTECARLO_SAMPLES})")
+    out.add_argument("--seed", type=int, help="random seed of --montecarlo and --preview")
+    out.add_argument("--uncertainty", metavar="CSV", help="per-item ranges of --montecarlo")
+    out.add_argument("--zones", metavar="SPEC", help="BOQ by zone: zones.csv, grid or grid:STEP")
+    out.add_argument("--zones-by-placement", action="store_true", help="zone boxes from the placements only")
+    out.add_argument("--history", action="store_true",
+                     help="append the totals to the SQLite estimate history OUTPUT_DIR/A3_TOOL_history.sqlite")
+    out.add_argument("--history-db", metavar="DB", help="estimate history database to append to (implies --history)")
+    out.add_argument("--revision", metavar="LABEL", help="revision label of the run in the history (default: model file name)")
+
+    federation = parser.add_argument_group("federation (several models)")
+    federation.add_argument("--duplicates", choices=("first", "last", "max", "error"), default="first",
+                            help="copy kept for a GlobalId found in several models (default: %(default)s)")
+    federation.add_argument("--workers", type=int, help="worker processes (default: one per model, up to the CPUs)")
+
+    modes = parser.add_argument_group("modes")
+    modes.add_argument("--preview", action="store_true", help="only estimate from a stratified sample of the elements")
+    modes.add_argument("--preview-size", type=int, metavar="N",
+                       help=f"elements in the --preview sample (implies it, default: {PREVIEW_SIZE})")
+    modes.add_argument("--resume", action="store_true",
+                       help="skip the stages completed by an interrupted run with the same inputs and options")
+    modes.add_argument("--checkpoint", action="store_true",
+                       help="record the completed stages in OUTPUT_DIR/A3_TOOL_checkpoint (implied by --resume)")
+    modes.add_argument("--preflight", action="store_true", help="only check the quantity completeness")
+    modes.add_argument("--min-coverage", type=float, metavar="MIN",
+                       help="check the quantity completeness first and go on only when coverage >= MIN "
+                            "(else exit with status 1)")
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    args = parser.parse_args()
+    price_format = PriceListFormat(args.delimiter, args.encoding, args.ident_col, args.name_col,
+                                   args.ifc_match_col, args.cost_col, args.unit_col, args.density_col)
+    reports = ReportOptions(
+        detailed=args.detailed,
+        stream_format="ndjson" if args.ndjson else None,
+        compress=args.gzip,
+        columnar=args.columnar,
+        scenarios=args.scenario,
+        montecarlo=args.montecarlo_samples or (MONTECARLO_SAMPLES if args.montecarlo else 0),
+        seed=args.seed,
+        uncertainty_csv=args.uncertainty,
+    )
+
+    history = args.history_db or args.history or None
+    preview_size = args.preview_size or (PREVIEW_SIZE if args.preview else 0)
+
+    if len(args.model) > 1:
+        single_only = [flag for flag, used in (("--low-memory", args.low_memory), ("--overlay", args.overlay),
+                                               ("--preview", preview_size), ("--preflight", args.preflight),
+                                               ("--min-coverage", args.min_coverage is not None),
+                                               ("--zones", args.zones), ("--resume", args.resume),
+                                               ("--checkpoint", args.checkpoint), ("--classes", args.classes),
+                                               ("--ifczip", args.ifczip)) if used]
+        if single_only:
+            parser.error(f"{', '.join(single_only)} can only be used with a single model")
+        federated_cost_estimation(
+            args.model,
+            args.price_list,
+            args.output_dir,
+            duplicates=args.duplicates,
+            max_workers=args.workers,
+            reports=reports,
+            price_format=price_format,
+            history=history,
+            revision=args.revision,
+        )
+    elif preview_size:
+        if args.preflight or args.min_coverage is not None:
+            parser.error("--preview and --preflight cannot be used together")
+        preview_estimation(args.model[0], args.price_list, args.output_dir, sample_size=preview_size, seed=args.seed,
+                           price_format=price_format)
+    elif args.preflight and args.min_coverage is None:
+        preflight_check(args.model[0], args.price_list, args.output_dir, price_format=price_format)
+    else:
+        query = structural_cost_estimation(
+            args.model[0],
+            args.price_list,
+            args.output_dir,
+            reports=reports,
+            price_format=price_format,
+            overlay=args.overlay,
+            ifc_zip=args.ifczip,
+            low_memory=args.low_memory,
+            zones=args.zones,
+            zone_geometry=not args.zones_by_placement,
+            ifc_classes=args.classes,
+            match_workers=args.match_workers,
+            min_coverage=args.min_coverage,
+            checkpoint_stages=args.checkpoint,
+            resume=args.resume,
+            history=history,
+            revision=args.revision,
+        )
+        if query is None:
+            sys.exit(EXIT_COVERAGE_BELOW_MIN)
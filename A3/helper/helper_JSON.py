@@ -1,15 +1,24 @@
 """
 Creates a JSON file that reflects the BOQ_total.txt structure.
 Aggregates data from IfcCostItem without level breakdown.
+
+Functions:
+- output_to_json: Write A3_TOOL.json (document, items with totals, summary)
+- json_items: Yield the JSON objects of the cost items (totals) of a ReportSnapshot
+- stream_json: Stream items and, optionally, every element line as NDJSON or as one JSON document,
+  optionally gzip compressed, with memory bounded by the chunk size (not by the number of lines)
 """
 import json
 import os
 from datetime import datetime
-from collections import defaultdict
+from typing import Dict, Iterator, Optional
+
+from .helper_records import as_element_table, as_report_snapshot
+from .helper_write import WRITE_BUFFER_SIZE, atomic_write
 
-from .helper_read import read_price_list
-from .helper_get import get_quantity_for_unit
+DOCUMENT_TITLE = "BILL OF QUANTITIES (BOQ) – TOTALS ONLY"
 
+# Accepts the IFC model (csv_path gives the units), an ElementTable or a ReportSnapshot.
 def output_to_json(model, csv_path=None, output_dir="output"):
 
     os.makedirs(output_dir, exist_ok=True)
@@ -17,93 +26,18 @@ def output_to_json(model, csv_path=None, output_dir="output"):
     # Define output path
     out_path = os.path.join(output_dir, "A3_TOOL.json")
 
-    # CSV units map
-    csv_unit_map = {}
-    if csv_path and os.path.isfile(csv_path):
-        try:
-            from .helper_read import read_price_list
-            rows_csv = read_price_list(csv_path, delimiter=";", encoding="cp1252")
-            for r in rows_csv:
-                ident = r.get("Identification Code") or r.get("Identification") or ""
-                unit = r.get("Unit") or r.get("Measurement Unit") or ""
-                if ident:
-                    csv_unit_map[ident] = unit
-        except Exception:
-            pass
-
-    # Map cost item -> elements
-    item_map = defaultdict(list)
-    for rel in model.by_type("IfcRelAssignsToControl"):
-        ci = getattr(rel, "RelatingControl", None)
-        if not ci or not ci.is_a("IfcCostItem"):
-            continue
-        for obj in rel.RelatedObjects or []:
-            if obj and obj.is_a("IfcElement"):
-                item_map[ci.id()].append(obj)
-
-    items = []
-    grand_total = 0.0
+    snapshot = as_report_snapshot(model, csv_path=csv_path)
 
     # Process each cost item
-    for cid, elems in sorted(item_map.items(), key=lambda x: x[0]):
-        ci = model[cid]
-        ident = getattr(ci, "Identification", "") or ci.GlobalId
-        descr = getattr(ci, "Name", "") or "(no name)"
-        
-        # Extract measurement unit
-        if ident in csv_unit_map:
-            unit = csv_unit_map[ident]
-        else:
-            vals = getattr(ci, "CostValues", None) or []
-            if vals:
-                u = getattr(vals[0], "Unit", None)
-                unit = getattr(u, "Name", "") if u else "-"
-            else:
-                unit = "-"
-        
-        # Extract unit cost
-        vals = getattr(ci, "CostValues", None) or []
-        if vals:
-            v = vals[0].AppliedValue
-            try:
-                rate = float(getattr(v, "wrappedValue", v))
-            except Exception:
-                s = str(v)
-                if "(" in s and ")" in s:
-                    try:
-                        rate = float(s.split("(")[1].split(")")[0])
-                    except Exception:
-                        rate = 0.0
-                else:
-                    rate = 0.0
-        else:
-            rate = 0.0
-
-        # Sum quantities of all elements
-        qty_sum = 0.0
-        for e in elems:
-            q = get_quantity_for_unit(e, unit, model=model)
-            if q is None:
-                q = 1.0
-            qty_sum += float(q)
-        
-        amount = rate * qty_sum
+    items = list(json_items(snapshot))
+    grand_total = 0.0
+    for _, _, _, amount in snapshot.boq_totals:
         grand_total += amount
-        
-        # Add item to JSON
-        items.append({
-            "itemCode": ident,
-            "description": descr,
-            "unit": unit,
-            "quantity": round(qty_sum, 4),
-            "unitCost": round(rate, 2),
-            "totalAmount": round(amount, 2)
-        })
 
     # Final JSON structure
     output_data = {
         "document": {
-            "title": "BILL OF QUANTITIES (BOQ) – TOTALS ONLY",
+            "title": DOCUMENT_TITLE,
             "date": datetime.now().strftime("%Y-%m-%d"),
             "source": "IFC Model Analysis"
         },
@@ -114,8 +48,117 @@ def output_to_json(model, csv_path=None, output_dir="output"):
     }
 
     # Write JSON file
-    with open(out_path, "w", encoding="utf-8") as json_file:
+    with atomic_write(out_path) as json_file:
         json.dump(output_data, json_file, indent=2, ensure_ascii=False)
     
     print(f"JSON output saved to: {out_path}")
-    return out_path
\ No newline at end of file
+    return out_path
+
+# One JSON object per cost item, in the same format as the "items" of A3_TOOL.json.
+def json_items(snapshot) -> Iterator[Dict[str, object]]:
+    for item, _, qty_sum, amount in snapshot.boq_totals:
+        ci = snapshot.items[item]
+        yield {
+            "itemCode": ci.code,
+            "description": ci.description,
+            "unit": ci.unit,
+            "quantity": round(qty_sum, 4),
+            "unitCost": round(ci.rate, 2),
+            "totalAmount": round(amount, 2),
+        }
+
+# One JSON object per element -> cost item line, read straight from the table columns.
+def _iter_lines(table) -> Iterator[Dict[str, object]]:
+    strings, items, gids, levels = table.strings, table.items, table.global_ids, table.level
+    for row, item, q in zip(table.line_element, table.line_item, table.line_quantity):
+        ci = items[item]
+        yield {
+            "globalId": gids[row],
+            "level": strings[levels[row]],
+            "itemCode": ci.code,
+            "quantity": round(q, 4),
+            "totalAmount": round(q * ci.rate, 2),
+        }
+
+# Write the JSON text of records, encoding and flushing chunk_size records at a time.
+def _write_chunked(f, records, sep: str, chunk_size: int) -> int:
+    n = 0
+    chunk = []
+    for rec in records:
+        chunk.append(json.dumps(rec, ensure_ascii=False))
+        n += 1
+        if len(chunk) >= chunk_size:
+            f.write(sep.join(chunk) + sep)
+            chunk.clear()
+    if chunk:
+        f.write(sep.join(chunk) + sep)
+    return n
+
+# Write the elements of a JSON array (one per line, comma separated) chunk by chunk; returns the count.
+def _write_array(f, records, chunk_size: int) -> int:
+    n = 0
+    chunk = []
+    for rec in records:
+        chunk.append("    " + json.dumps(rec, ensure_ascii=False))
+        n += 1
+        if len(chunk) >= chunk_size:
+            f.write(("" if n == len(chunk) else ",\n") + ",\n".join(chunk))
+            chunk.clear()
+    if chunk:
+        f.write(("" if n == len(chunk) else ",\n") + ",\n".join(chunk))
+    if n:
+        f.write("\n")
+    return n
+
+# Stream the estimate as NDJSON (fmt="ndjson") or as one JSON document (fmt="json").
+# NDJSON: one record per line with a "record" field: "document", "item", "line" (if elements) and "summary" last.
+# JSON: {"document", "items", "lines" (if elements), "summary"}, arrays written chunk by chunk.
+# compress=True writes gzip (".gz" is appended to the file name). Accepts the IFC model or an ElementTable.
+def stream_json(
+    model,
+    csv_path: Optional[str] = None,
+    output_dir: str = "output",
+    *,
+    fmt: str = "ndjson",
+    elements: bool = True,
+    compress: bool = False,
+    chunk_size: int = 10000,
+    filename: Optional[str] = None,
+) -> str:
+    if fmt not in ("ndjson", "json"):
+        raise ValueError(f"Unknown JSON format: {fmt} (expected 'ndjson' or 'json')")
+
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, filename or f"A3_TOOL.{fmt}")
+    if compress and not out_path.endswith(".gz"):
+        out_path += ".gz"
+
+    table = as_element_table(model, csv_path=csv_path)
+    snapshot = as_report_snapshot(table)
+    document = {
+        "title": DOCUMENT_TITLE,
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "source": "IFC Model Analysis",
+    }
+    grand_total = sum(amount for _, _, _, amount in snapshot.boq_totals)
+    summary = {"total": round(grand_total, 2), "items": len(snapshot.boq_totals)}
+
+    # gzip (compress=True) is written by the same streaming writer as the reports (target name in the header)
+    with atomic_write(out_path, buffering=WRITE_BUFFER_SIZE, compress=compress) as f:
+        if fmt == "ndjson":
+            tag = lambda kind, recs: ({"record": kind, **r} for r in recs)
+            f.write(json.dumps({"record": "document", **document}, ensure_ascii=False) + "\n")
+            _write_chunked(f, tag("item", json_items(snapshot)), "\n", chunk_size)
+            if elements:
+                summary["lines"] = _write_chunked(f, tag("line", _iter_lines(table)), "\n", chunk_size)
+            f.write(json.dumps({"record": "summary", **summary}, ensure_ascii=False) + "\n")
+        else:
+            f.write('{\n  "document": ' + json.dumps(document, ensure_ascii=False) + ',\n  "items": [\n')
+            _write_array(f, json_items(snapshot), chunk_size)
+            if elements:
+                f.write('  ],\n  "lines": [\n')
+                summary["lines"] = _write_array(f, _iter_lines(table), chunk_size)
+            f.write('  ],\n  "summary": ' + json.dumps(summary, ensure_ascii=False) + "\n}\n")
+
+    print(f"JSON stream saved to: {out_path}")
+    return out_path
@@ -0,0 +1,120 @@
+"""
+Stage checkpoints of a run, for resuming long estimations after a crash:
+- Fingerprint the run: SHA-256 of the input files (model, price list, option files) and the options
+- Persist the result of every completed stage in a checkpoint folder: the element table (match results,
+  assignment and quantities), the report snapshot (aggregated cube) and the list of written outputs
+- Every file is written atomically and the manifest last, so a crash never leaves a stage half recorded
+- A resumed run loads the manifest only when the fingerprint is unchanged; otherwise it starts over
+
+Checkpoints are pickles written by this tool into its own output folder; do not resume from untrusted folders.
+
+Functions / classes:
+- file_digest: SHA-256 of a file, read in chunks
+- run_fingerprint: Digests of the input files and a stable text of the options
+- Checkpoint: Manifest of the completed stages with their saved results and written outputs
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+from typing import Dict, Iterable, Optional
+
+from .helper_write import atomic_path, atomic_write
+
+MANIFEST = "manifest.json"
+VERSION = 2
+
+# SHA-256 of a file, read in 1 MiB chunks.
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Fingerprint of a run: {absolute path: SHA-256} of the input files and the repr of every option.
+def run_fingerprint(files: Iterable[str], options: Dict[str, object]) -> Dict[str, object]:
+    return {
+        "files": {os.path.abspath(str(p)): file_digest(str(p)) for p in files},
+        "options": {name: repr(value) for name, value in sorted(options.items())},
+    }
+
+class Checkpoint:
+    """
+    Completed stages of a run in a checkpoint folder (manifest.json + one <stage>.pkl per saved result).
+    resume=False (or a changed fingerprint) clears the folder and starts a new run.
+    Outputs are recorded one by one as they are written (thread-safe), with their paths.
+    """
+
+    def __init__(self, directory: str, fingerprint: Dict[str, object], *, resume: bool = False):
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self.resumed = False
+        manifest = self._read_manifest() if resume else None
+        if manifest is not None and manifest.get("version") == VERSION and manifest.get("fingerprint") == fingerprint:
+            self.stages: Dict[str, object] = manifest.get("stages", {})
+            self.outputs: Dict[str, object] = manifest.get("outputs", {})
+            self.resumed = True
+        else:
+            if resume:
+                print("[WARNING] No checkpoint for these inputs and options, running all stages.")
+            shutil.rmtree(directory, ignore_errors=True)
+            self.stages = {}
+            self.outputs = {}
+        os.makedirs(directory, exist_ok=True)
+        self._write_manifest()
+
+    def _read_manifest(self) -> Optional[Dict[str, object]]:
+        try:
+            with open(os.path.join(self.directory, MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self) -> None:
+        with atomic_write(os.path.join(self.directory, MANIFEST)) as f:
+            json.dump({"version": VERSION, "fingerprint": self.fingerprint,
+                       "stages": self.stages, "outputs": self.outputs}, f, indent=2)
+
+    # True when the stage completed (and its saved result, if any, is still there).
+    def done(self, stage: str) -> bool:
+        info = self.stages.get(stage)
+        if info is None:
+            return False
+        return not info.get("file") or os.path.isfile(os.path.join(self.directory, info["file"]))
+
+    # Record a completed stage, saving its result (pickled) when given.
+    def save(self, stage: str, result: object = None) -> None:
+        info: Dict[str, object] = {}
+        if result is not None:
+            info["file"] = f"{stage}.pkl"
+            with atomic_path(os.path.join(self.directory, info["file"])) as tmp_path:
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self.stages[stage] = info
+            self._write_manifest()
+
+    # Saved result of a completed stage.
+    def load(self, stage: str) -> object:
+        with open(os.path.join(self.directory, self.stages[stage]["file"]), "rb") as f:
+            return pickle.load(f)
+
+    # Record a written output: a path, or {part: path} for writers with several files.
+    def output_written(self, name: str, result: object) -> None:
+        with self._lock:
+            self.outputs[name] = result
+            self._write_manifest()
+
+    # Outputs recorded as written whose files are all still there: {output name: path or {part: path}}.
+    def written_outputs(self) -> Dict[str, object]:
+        found = {}
+        for name, result in self.outputs.items():
+            paths = result.values() if isinstance(result, dict) else [result]
+            if all(os.path.isfile(p) for p in paths):
+                found[name] = result
+        return found
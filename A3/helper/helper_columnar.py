@@ -0,0 +1,151 @@
+"""
+Columnar export:
+- Write element-level and item-level tables to Parquet or Arrow IPC (Feather v2) for pandas, DuckDB, Polars...
+- String columns (class, type, storey, item, unit) are dictionary encoded straight from the interned
+  string table of the ElementTable, so no per-row Python strings are created for them
+- Arrow IPC files can be memory-mapped by readers; Parquet files are smaller and compressed
+
+Requires pyarrow (imported only when a columnar export is requested).
+
+Functions:
+- element_arrow_table: Build the element-level pyarrow.Table (one row per element -> cost item line)
+- item_arrow_table: Build the item-level pyarrow.Table (one row per cost item, totals)
+- write_columnar: Write both tables as <prefix>_elements.<ext> and <prefix>_items.<ext>
+"""
+
+import os
+from array import array
+from typing import Dict, Optional
+
+from .helper_records import UNTYPED, as_element_table, as_report_snapshot
+from .helper_write import atomic_path
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Import pyarrow lazily so the rest of the tool runs without it.
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError as e:
+        raise ImportError("Columnar export requires pyarrow. Install it with: pip install pyarrow") from e
+    return pa, pc
+
+# Wrap an int array as an int32 Arrow array (zero copy when the C int is 32 bit), -1 becomes null.
+def _indices(pa, pc, values: array):
+    if values.itemsize == 4:
+        arr = pa.Array.from_buffers(pa.int32(), len(values), [None, pa.py_buffer(values)])
+    else:
+        arr = pa.array(values, type=pa.int32())
+    return pc.if_else(pc.equal(arr, UNTYPED), pa.scalar(None, pa.int32()), arr)
+
+# Build the element-level table: one row per element -> cost item line, then one row per unassigned element
+# (item columns null). Columns: global_id, ifc_class, type_class, type_name, level, item_code, unit,
+# quantity, rate, amount.
+def element_arrow_table(table):
+    pa, pc = _pyarrow()
+
+    # Row order: assignment lines, then elements without cost item
+    rows = array("i", table.line_element)
+    items = array("i", table.line_item)
+    quantities = array("d", table.line_quantity)
+    assigned = bytearray(len(table))
+    for row in table.line_element:
+        assigned[row] = 1
+    for row in range(len(table)):
+        if not assigned[row]:
+            rows.append(row)
+            items.append(UNTYPED)
+            quantities.append(0.0)
+
+    row_idx = _indices(pa, pc, rows)
+    item_idx = _indices(pa, pc, items)
+    no_item = pc.is_null(item_idx)
+
+    strings = pa.array(table.strings.values, type=pa.string())
+    def by_row(column: array):
+        return pa.DictionaryArray.from_arrays(pc.take(_indices(pa, pc, column), row_idx), strings)
+
+    codes = pa.array([i.code for i in table.items], type=pa.string())
+    units = pa.array([i.unit for i in table.items], type=pa.string())
+    rates = pa.array([i.rate for i in table.items], type=pa.float64())
+
+    quantity = pa.Array.from_buffers(pa.float64(), len(quantities), [None, pa.py_buffer(quantities)])
+    quantity = pc.if_else(no_item, pa.scalar(None, pa.float64()), quantity)
+    rate = pc.take(rates, item_idx)
+
+    return pa.table(
+        {
+            "global_id": pc.take(pa.array(table.global_ids, type=pa.string()), row_idx),
+            "ifc_class": by_row(table.ifc_class),
+            "type_class": by_row(table.type_class),
+            "type_name": by_row(table.type_name),
+            "level": by_row(table.level),
+            "item_code": pa.DictionaryArray.from_arrays(item_idx, codes),
+            "unit": pa.DictionaryArray.from_arrays(item_idx, units),
+            "quantity": quantity,
+            "rate": rate,
+            "amount": pc.multiply(quantity, rate),
+        }
+    )
+
+# Build the item-level table: one row per cost item with the totals of BOQ_total.txt.
+# Columns: item_code, description, unit, quantity, rate, amount.
+def item_arrow_table(table):
+    pa, _ = _pyarrow()
+    snapshot = as_report_snapshot(table)
+    totals = {item: (q, amount) for item, _, q, amount in snapshot.boq_totals}
+    items = snapshot.items
+    units = sorted({i.unit for i in items})
+    unit_ref = {u: n for n, u in enumerate(units)}
+    return pa.table(
+        {
+            "item_code": pa.array([i.code for i in items], type=pa.string()),
+            "description": pa.array([i.description for i in items], type=pa.string()),
+            "unit": pa.DictionaryArray.from_arrays(
+                pa.array([unit_ref[i.unit] for i in items], type=pa.int32()), pa.array(units, type=pa.string())
+            ),
+            "quantity": pa.array([totals.get(n, (0.0, 0.0))[0] for n in range(len(items))], type=pa.float64()),
+            "rate": pa.array([i.rate for i in items], type=pa.float64()),
+            "amount": pa.array([totals.get(n, (0.0, 0.0))[1] for n in range(len(items))], type=pa.float64()),
+        }
+    )
+
+# Write one pyarrow.Table atomically in the given format, in batches/row groups of chunk_size rows.
+def _write_arrow_table(arrow_table, out_path: str, fmt: str, chunk_size: int) -> str:
+    pa, _ = _pyarrow()
+    with atomic_path(out_path) as tmp_path:
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(arrow_table, tmp_path, row_group_size=chunk_size)
+        else:
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table, max_chunksize=chunk_size)
+    return out_path
+
+# Write <prefix>_elements.<ext> and <prefix>_items.<ext> (fmt "parquet" or "arrow"); returns both paths.
+# Accepts the IFC model (csv_path gives the units) or an ElementTable.
+def write_columnar(
+    model,
+    csv_path: Optional[str] = None,
+    output_dir: str = "output",
+    *,
+    fmt: str = "parquet",
+    prefix: str = "A3_TOOL",
+    chunk_size: int = 1 << 20,
+) -> Dict[str, str]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown columnar format: {fmt} (expected one of {', '.join(FORMATS)})")
+    _pyarrow()  # fail before the extraction if pyarrow is missing
+    table = as_element_table(model, csv_path=csv_path)
+
+    os.makedirs(output_dir, exist_ok=True)
+    ext = FORMATS[fmt]
+    paths = {
+        "elements": os.path.join(output_dir, f"{prefix}_elements{ext}"),
+        "items": os.path.join(output_dir, f"{prefix}_items{ext}"),
+    }
+    _write_arrow_table(element_arrow_table(table), paths["elements"], fmt, chunk_size)
+    _write_arrow_table(item_arrow_table(table), paths["items"], fmt, chunk_size)
+    print(f"Columnar output ({fmt}) saved to: {paths['elements']}, {paths['items']}")
+    return paths
@@ -6,33 +6,39 @@ Cost helpers:
 - Assign products to cost items (IfcRelAssignsToControl)
 
 Functions:
+- _api: Return ifcopenshell.api, imported on first use
 - ensure_cost_schedule: Find or create an IfcCostSchedule by name, ensuring only one exists
 - _schedule_children_cost_items: Collect direct child IfcCostItem nested under schedule
 - add_or_get_cost_item: Find an IfcCostItem by name/identification or create one under the schedule
 - add_unit_cost_value: Create an IfcCostValue as a child of a cost item with AppliedValue
-- _best_match: Fuzzy match element name to the best CSV row on the given column
+- _is_assigned: Whether an element is already assigned to a cost item
 - import_price_list_as_cost_schedule_from_csv: Create schedule and one IfcCostItem per CSV row with unit costs
 - assign_elements_to_cost_items_by_type_name_from_csv: Assign IfcElements to cost items by fuzzy matching type and name from CSV
+- assign_elements_from_table: Re-create the cost items and assignments of an ElementTable (resumed runs)
 """
 
-import difflib
 from collections import defaultdict
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from ifcopenshell.guid import new as new_guid
 
-try:
-    from ifcopenshell import api as ifc_api
-except Exception as e:
-    raise ImportError("ifcopenshell.api not available. Install IfcOpenShell with API support.") from e
+# Return ifcopenshell.api, imported on first use (it loads numpy and the API modules, not needed to import this module).
+def _api():
+    try:
+        from ifcopenshell import api as ifc_api
+    except Exception as e:
+        raise ImportError("ifcopenshell.api not available. Install IfcOpenShell with API support.") from e
+    return ifc_api
 
 from .helper_read import read_price_list, normalize_text, parse_decimal_eu
+from .helper_match import match_keys
+from .helper_scan import iter_planned_elements, plan_element_scan
 
 # Find or create IfcCostSchedule by name ensuring only one exists.
 def ensure_cost_schedule(model, name: str = "Price List", predefined_type: str = "COSTPLAN"):
     for s in model.by_type("IfcCostSchedule"):
         if (getattr(s, "Name", None) or "") == name:
             return s
-    return ifc_api.run("cost.add_cost_schedule", model, name=name, predefined_type=predefined_type)
+    return _api().run("cost.add_cost_schedule", model, name=name, predefined_type=predefined_type)
 
 # Collect direct child IfcCostItem nested under schedule.
 def _schedule_children_cost_items(schedule) -> List[object]:
@@ -48,20 +54,20 @@ def add_or_get_cost_item(model, cost_schedule, name, identification=None, descri
     for ci in model.by_type("IfcCostItem"):
         if ci.Name == name and (identification is None or getattr(ci, "Identification", None) == identification):
             return ci
-    item = ifc_api.run("cost.add_cost_item", model, cost_schedule=cost_schedule)
+    item = _api().run("cost.add_cost_item", model, cost_schedule=cost_schedule)
     attrs = {"Name": name}
     if identification is not None:
         attrs["Identification"] = identification
     if description is not None:
         attrs["Description"] = description
     if attrs:
-        ifc_api.run("cost.edit_cost_item", model, cost_item=item, attributes=attrs)
+        _api().run("cost.edit_cost_item", model, cost_item=item, attributes=attrs)
     return item
 
 # Creates an IfcCostValue as a child of a cost item, set AppliedValue and store label in Name
 def add_unit_cost_value(model, item, amount, cost_type="UNIT"):
-    cost_value = ifc_api.run("cost.add_cost_value", model, parent=item)
-    ifc_api.run(
+    cost_value = _api().run("cost.add_cost_value", model, parent=item)
+    _api().run(
         "cost.edit_cost_value",
         model,
         cost_value=cost_value,
@@ -69,14 +75,12 @@ def add_unit_cost_value(model, item, amount, cost_type="UNIT"):
     )
     return cost_value
 
-# Fuzzy match element name to the best CSV row on the given column.
-def _best_match(element_name: str, candidates: List[Dict[str, str]], name_col: str) -> Dict[str, str] | None:
-    if not candidates:
-        return None
-    base = (element_name or "").strip().lower()
-    scores = [(difflib.SequenceMatcher(None, base, (c.get(name_col) or "").strip().lower()).ratio(), c) for c in candidates]
-    scores.sort(key=lambda x: x[0], reverse=True)
-    return scores[0][1] if scores else None
+# Whether the element is already assigned to the cost item (IfcRelAssignsToControl).
+def _is_assigned(element, item) -> bool:
+    for rel in getattr(element, "HasAssignments", []) or []:
+        if rel.is_a("IfcRelAssignsToControl") and rel.RelatingControl == item:
+            return True
+    return False
 
 # Create schedule and one IfcCostItem (+ unit cost) per CSV row; return (schedule, code->item). Importing price lists directly into IFC.
 def import_price_list_as_cost_schedule_from_csv(
@@ -126,38 +130,47 @@ def assign_elements_to_cost_items_by_type_name_from_csv(
     unit_cost_col: str = "IfcCostValue",
     delimiter: str = ";",
     encoding: str = "cp1252",
-    filter_ifc_classes: Tuple[str, ...] = (),  # currently scans all IfcElement
+    filter_ifc_classes: Tuple[str, ...] = (),
+    match_workers: Optional[int] = 1,
 ) -> Dict[str, int]:
     """
-    For each IfcElement:
+    For each IfcElement of a class with Ifc Match rows (and in filter_ifc_classes when given):
     - filter CSV by Ifc Match == element.is_a()
     - fuzzy match by Name
     - create/reuse IfcCostItem (by Identification Code), add unit cost, relate element
+    Only the planned classes are visited (helper_scan.plan_element_scan); the elements of the other classes
+    are counted in skipped_no_candidates without being loaded.
+    Every distinct (class, name) is matched once; match_workers > 1 (None: automatic for large work lists)
+    matches them on a process pool (helper_match.match_keys), with the same result as the serial matching.
     """
     schedule = ensure_cost_schedule(model, schedule_name)
     rows = read_price_list(csv_path, delimiter=delimiter, encoding=encoding)
 
-    # Index rows by IFC class
+    # Index rows by IFC class (rows without Ifc Match are never matched and not planned)
     by_class: Dict[str, List[Dict[str, str]]] = {}
     for r in rows:
-        cls = (r.get(ifc_match_col) or "").strip() or "IfcElement"
-        by_class.setdefault(cls, []).append(r)
+        cls = (r.get(ifc_match_col) or "").strip()
+        if cls:
+            by_class.setdefault(cls, []).append(r)
+
+    # Visit only the element classes that have price list rows
+    plan = plan_element_scan(model, by_class, filter_ifc_classes)
+    if plan.unmatchable:
+        print(f"[WARNING] Ifc Match classes no element can have: {', '.join(plan.unmatchable)}")
+
+    # Match every distinct (class, lowercased name) once, then assign the elements in scan order
+    elements = list(iter_planned_elements(model, plan))
+    keys = [(e.is_a(), (getattr(e, "Name", "") or "").strip().lower()) for e in elements]
+    unique = list(dict.fromkeys(keys))
+    texts = {cls: [(r.get(text_col) or "").strip().lower() for r in by_class[cls]] for cls in plan.classes}
+    best = dict(zip(unique, match_keys(texts, unique, workers=match_workers)))
 
     code_to_item: Dict[str, object] = {}
     assigned = 0
-    skipped_no_candidates = 0
     skipped_no_match = 0
 
-    for e in model.by_type("IfcElement"):
-        candidates = by_class.get(e.is_a(), [])
-        if not candidates:
-            skipped_no_candidates += 1
-            continue
-
-        match = _best_match(getattr(e, "Name", "") or "", candidates, text_col)
-        if not match:
-            skipped_no_match += 1
-            continue
+    for e, key in zip(elements, keys):
+        match = by_class[key[0]][best[key]]
 
         code = (match.get(ident_col) or "").strip()
         if not code:
@@ -183,17 +196,12 @@ def assign_elements_to_cost_items_by_type_name_from_csv(
             code_to_item[code] = item
 
         # Skip if already assigned to this control
-        already = False
-        for rel in getattr(e, "HasAssignments", []) or []:
-            if rel.is_a("IfcRelAssignsToControl") and rel.RelatingControl == item:
-                already = True
-                break
-        if already:
+        if _is_assigned(e, item):
             continue
 
         # Assign single related_object (API expects one)
         try:
-            ifc_api.run(
+            _api().run(
                 "control.assign_control",
                 model,
                 relating_control=item,
@@ -209,4 +217,34 @@ def assign_elements_to_cost_items_by_type_name_from_csv(
             )
             assigned += 1
 
-    return {"assigned": assigned, "skipped_no_candidates": skipped_no_candidates, "skipped_no_match": skipped_no_match}
+    return {"assigned": assigned, "scanned": plan.scanned, "unique_names": len(unique), "skipped_no_candidates": plan.skipped_elements,
+            "skipped_no_match": skipped_no_match}
+
+# Re-create the cost items and assignments of an ElementTable in a model opened again (resumed runs), as the matching
+# does: one IfcCostItem per table item with its unit cost when the price list cost parsed, elements found by GlobalId
+# and not already assigned to the item, one IfcRelAssignsToControl per item.
+def assign_elements_from_table(model, table, *, schedule_name: str = "Price List 2025") -> Dict[str, int]:
+    schedule = ensure_cost_schedule(model, schedule_name)
+    items: List[object] = []
+    for rec in table.items:
+        item = add_or_get_cost_item(model, schedule, name=rec.description, identification=rec.code)
+        if rec.has_rate:
+            add_unit_cost_value(model, item, amount=rec.rate, cost_type="UNIT")
+        items.append(item)
+
+    related: Dict[int, List[object]] = defaultdict(list)
+    missing = 0
+    for row, item in zip(table.line_element, table.line_item):
+        try:
+            e = model.by_guid(table.global_ids[row])
+        except RuntimeError:
+            missing += 1
+            continue
+        if not _is_assigned(e, items[item]):
+            related[item].append(e)
+    for item, objects in related.items():
+        model.create_entity("IfcRelAssignsToControl", GlobalId=new_guid(), RelatedObjects=objects, RelatingControl=items[item])
+
+    if missing:
+        print(f"[WARNING] {missing} elements of the checkpoint not found in the model")
+    return {"assigned": sum(len(o) for o in related.values()), "missing": missing}
@@ -0,0 +1,176 @@
+"""
+Estimation without modifying the model:
+- Compile a price list once (rows by IFC class, codes, rates, units) and memoize the fuzzy matches
+  per (IFC class, element name), so repeated estimates reuse earlier matches
+- Index a model once (element classes, types, levels and quantities per unit)
+- Build the ElementTable of an estimate directly from the indexes, with the same matching rule and
+  results as assign_elements_to_cost_items_by_type_name_from_csv + extract_element_table,
+  but without adding cost entities to the model (so opened models can be reused)
+
+Functions / classes:
+- PriceMatch: Matched price list row (code, description, unit, rate, density, whether the cost parsed)
+- CompiledPriceList: Parsed price list with rows by IFC class and a memo of the fuzzy matches
+- compile_price_list: Read and compile a price list CSV
+- ModelIndex: Elements of an opened model (ElementTable without items) and a quantity cache
+- estimate_element_table: Match every element of a ModelIndex against a CompiledPriceList into an ElementTable
+"""
+
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .helper_get import QuantityProvider
+from .helper_match import best_index, match_keys
+from .helper_read import PriceListFormat, read_price_list, parse_decimal_eu, row_density
+from .helper_records import ElementTable, add_model_elements
+
+class PriceMatch(NamedTuple):
+    """
+    Price list row an element is priced with (density in kg/m3 from the optional Density column).
+    has_rate is False when the row cost did not parse (rate 0.0, no unit cost value is written).
+    """
+
+    code: str
+    description: str
+    unit: str
+    rate: float
+    density: Optional[float] = None
+    has_rate: bool = True
+
+class CompiledPriceList:
+    """
+    Price list rows grouped by "Ifc Match" class with their lowercased names, and a memo
+    (IFC class, lowercased element name) -> PriceMatch or None shared by all the estimates.
+    """
+
+    def __init__(self, rows: List[Dict[str, str]], *, ident_col: str = "Identification Code", text_col: str = "Name",
+                 ifc_match_col: str = "Ifc Match", unit_cost_col: str = "IfcCostValue", unit_col: str = "Unit",
+                 density_col: str = "Density"):
+        self.ident_col = ident_col
+        self.text_col = text_col
+        self.unit_cost_col = unit_cost_col
+        self.density_col = density_col
+        self.by_class: Dict[str, List[Tuple[str, Dict[str, str]]]] = {}
+        for r in rows:
+            # Rows without Ifc Match are never matched
+            cls = (r.get(ifc_match_col) or "").strip()
+            if cls:
+                self.by_class.setdefault(cls, []).append(((r.get(text_col) or "").strip().lower(), r))
+        # Identification Code -> unit, same headers as read_unit_map
+        self.units: Dict[str, str] = {}
+        for r in rows:
+            ident = r.get(ident_col) or r.get("Identification Code") or r.get("Identification") or ""
+            if ident:
+                self.units[ident] = r.get(unit_col) or r.get("Unit") or r.get("Measurement Unit") or ""
+        self.matches: Dict[Tuple[str, str], Optional[PriceMatch]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self.by_class.values())
+
+    # Return the PriceMatch of an element (IFC class, Name), None if no row matches or the row has no code.
+    # Same rule as helper_match.best_index: highest SequenceMatcher ratio, first row wins on ties.
+    def match(self, ifc_class: str, name: str) -> Optional[PriceMatch]:
+        base = (name or "").strip().lower()
+        key = (ifc_class, base)
+        if key in self.matches:
+            return self.matches[key]
+        bucket = self.by_class.get(ifc_class, ())
+        result = self._result(bucket[best_index(base, [text for text, _ in bucket])]) if bucket else None
+        self.matches[key] = result
+        return result
+
+    # Match the (IFC class, name) keys not yet in the memo in one batch (helper_match.match_keys: workers > 1
+    # or None for automatic runs them on a process pool); later match() calls are memo hits.
+    def prefetch(self, keys, workers: Optional[int] = 1) -> int:
+        todo = list(dict.fromkeys(
+            (cls, (name or "").strip().lower()) for cls, name in keys if cls in self.by_class
+        ))
+        todo = [key for key in todo if key not in self.matches]
+        texts = {cls: [text for text, _ in self.by_class[cls]] for cls in {cls for cls, _ in todo}}
+        for key, i in zip(todo, match_keys(texts, todo, workers=workers)):
+            self.matches[key] = self._result(self.by_class[key[0]][i])
+        return len(todo)
+
+    # PriceMatch of a (text, row) price list entry, None if the row has no code.
+    def _result(self, entry: Tuple[str, Dict[str, str]]) -> Optional[PriceMatch]:
+        best = entry[1]
+        code = (best.get(self.ident_col) or "").strip()
+        if not code:
+            return None
+        uc_raw = best.get(self.unit_cost_col)
+        try:
+            rate = parse_decimal_eu(uc_raw) if uc_raw is not None else None
+        except Exception:
+            rate = None
+        return PriceMatch(
+            code,
+            (best.get(self.text_col) or "").strip() or code,
+            self.units.get(code) or "-",
+            rate if rate is not None else 0.0,
+            row_density(best, self.density_col),
+            rate is not None,
+        )
+
+# Read and compile a price list CSV (same columns and defaults as the assignment functions).
+# price_format (PriceListFormat) gives the dialect and all the column names at once.
+def compile_price_list(csv_path: str, *, delimiter: str = ";", encoding: str = "cp1252",
+                       price_format: Optional[PriceListFormat] = None, **columns) -> CompiledPriceList:
+    if price_format is not None:
+        columns = {**price_format._asdict(), **columns}
+        delimiter, encoding = columns.pop("delimiter"), columns.pop("encoding")
+    return CompiledPriceList(read_price_list(csv_path, delimiter=delimiter, encoding=encoding), **columns)
+
+class ModelIndex:
+    """
+    Elements of an opened model: an ElementTable without items (class, type, level per row), the entities
+    in the same row order, a QuantityProvider and a (row, unit, density) -> quantity cache. The lock serializes access
+    to the model.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.entities = model.by_type("IfcElement")
+        self.elements = ElementTable(schema=model.schema)
+        add_model_elements(self.elements, self.entities)
+        self.provider = QuantityProvider(model)
+        self.quantities: Dict[Tuple[int, str, Optional[float]], float] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    # Quantity of a row in the given price list unit (missing quantities default to 1.0, as in the reports).
+    def quantity(self, row: int, unit: str, density: Optional[float] = None) -> float:
+        key = (row, unit, density)
+        q = self.quantities.get(key)
+        if q is None:
+            q = self.provider.quantity(self.entities[row], unit, density)
+            q = float(q) if q is not None else 1.0
+            self.quantities[key] = q
+        return q
+
+# Match every element of the index against the price list and return the ElementTable of the estimate.
+# Cost items are numbered in order of first match, as the assignment creates them. The model is not modified.
+# Rows of classes without price list rows are skipped without matching (see helper_scan for the model scan).
+def estimate_element_table(index: ModelIndex, price_list: CompiledPriceList,
+                           ifc_classes: Tuple[str, ...] = (), *, match_workers: Optional[int] = 1) -> ElementTable:
+    table = index.elements.copy_elements()
+    strings = table.strings
+    # Only the classes with price list rows (and in ifc_classes when given) are matched
+    priced = {strings.get(cls) for cls in price_list.by_class if not ifc_classes or cls in ifc_classes}
+    items: Dict[str, int] = {}
+    with index.lock:
+        # Names not matched yet are matched in one batch (in parallel with match_workers > 1)
+        price_list.prefetch(((strings[table.ifc_class[row]], getattr(e, "Name", "") or "")
+                             for row, e in enumerate(index.entities) if table.ifc_class[row] in priced),
+                            workers=match_workers)
+        for row, e in enumerate(index.entities):
+            if table.ifc_class[row] not in priced:
+                continue
+            m = price_list.match(strings[table.ifc_class[row]], getattr(e, "Name", "") or "")
+            if m is None:
+                continue
+            item = items.get(m.code)
+            if item is None:
+                item = items[m.code] = table.add_item(m.code, m.description, m.unit, m.rate, m.has_rate)
+            table.add_line(row, item, index.quantity(row, m.unit, m.density))
+    return table
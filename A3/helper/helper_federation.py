@@ -0,0 +1,162 @@
+"""
+Federated estimation over several IFC models (e.g. one file per building section):
+- Open and estimate every model in its own worker process (ModelIndex + CompiledPriceList, the models are
+  not modified); only the compact ElementTable of each model travels back to the parent process
+- Merge the tables into one, deduplicating the elements by GlobalId with a conflict policy
+- Keep the source model of every merged element for the per-source BOQ (see write_boq_sources)
+
+Duplicate policies (an element found in several models is counted once):
+- "first": keep the copy of the first model in the given order
+- "last": keep the copy of the last model
+- "max": keep the copy with the highest amount (first on ties)
+- "error": raise ValueError on the first duplicated GlobalId
+
+Functions / classes:
+- DUPLICATE_POLICIES: Accepted policy names
+- FederationResult: Merged ElementTable, source names, source per row and duplicate counts
+- estimate_source: Open and estimate one model into an ElementTable (worker process entry point)
+- merge_element_tables: Merge (source name, ElementTable) pairs with GlobalId deduplication
+- federate: Estimate N models in parallel processes and merge them
+- aggregate_boq_by_source: Sum quantities and amounts per cost item and source model
+"""
+
+import os
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .helper_read import PriceListFormat
+from .helper_records import ElementTable, UNTYPED
+
+DUPLICATE_POLICIES = ("first", "last", "max", "error")
+
+class FederationResult(NamedTuple):
+    """
+    Merged estimate of several models:
+    - table: ElementTable with every GlobalId once (rows in source order), items merged by code
+    - sources / source_of: source names and the source index of every merged row
+    - elements / duplicates: per source, the elements read and the duplicate copies dropped
+    - conflicts: duplicated GlobalIds whose copies are priced differently (other items or quantities)
+    """
+
+    table: ElementTable
+    policy: str
+    sources: Tuple[str, ...]
+    source_of: array
+    elements: Tuple[int, ...]
+    duplicates: Tuple[int, ...]
+    conflicts: int
+
+# Open one model and estimate it without modifying it (runs in a worker process; returns only the table).
+def estimate_source(model_path: str, csv_path: str, price_format: PriceListFormat = PriceListFormat()) -> ElementTable:
+    from .helper_estimate import ModelIndex, compile_price_list, estimate_element_table
+    from .helper_ifczip import open_ifc
+
+    model = open_ifc(model_path)
+    return estimate_element_table(ModelIndex(model), compile_price_list(csv_path, price_format=price_format))
+
+# Lines of every row of a table: {row: [(item code, quantity), ...]} and the amount of every row.
+def _row_lines(table: ElementTable) -> Tuple[Dict[int, List[Tuple[str, float]]], Dict[int, float]]:
+    lines: Dict[int, List[Tuple[str, float]]] = defaultdict(list)
+    amounts: Dict[int, float] = defaultdict(float)
+    for row, item, q in zip(table.line_element, table.line_item, table.line_quantity):
+        ci = table.items[item]
+        lines[row].append((ci.code, q))
+        amounts[row] += q * ci.rate
+    return lines, amounts
+
+# Merge the tables of several sources, each GlobalId once according to the policy (see the module docstring).
+# Cost items are merged by code (description, unit and rate of the first source using the code).
+def merge_element_tables(sources: Sequence[Tuple[str, ElementTable]], policy: str = "first") -> FederationResult:
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate policy {policy!r}, expected one of {', '.join(DUPLICATE_POLICIES)}")
+
+    per_source = [_row_lines(table) for _, table in sources]
+
+    # Winning copy (source, row) of every GlobalId
+    winner: Dict[str, Tuple[int, int]] = {}
+    duplicates = [0] * len(sources)
+    conflicts = set()
+    for s, (name, table) in enumerate(sources):
+        lines, amounts = per_source[s]
+        for row, gid in enumerate(table.global_ids):
+            kept = winner.get(gid)
+            if kept is None:
+                winner[gid] = (s, row)
+                continue
+            if policy == "error":
+                raise ValueError(f"GlobalId {gid} is in both {sources[kept[0]][0]} and {name}")
+            k_lines, k_amounts = per_source[kept[0]]
+            if sorted(lines.get(row, ())) != sorted(k_lines.get(kept[1], ())):
+                conflicts.add(gid)
+            if policy == "last" or (policy == "max" and amounts.get(row, 0.0) > k_amounts.get(kept[1], 0.0)):
+                winner[gid] = (s, row)
+                duplicates[kept[0]] += 1
+            else:
+                duplicates[s] += 1
+
+    schemas = {table.schema for _, table in sources}
+    merged = ElementTable(schema=sources[0][1].schema if len(schemas) == 1 and sources else None)
+    source_of = array("i")
+    items: Dict[str, int] = {}
+    for s, (_, table) in enumerate(sources):
+        strings = table.strings
+        lines = per_source[s][0]
+        item_of = {ci.code: ci for ci in table.items}
+        for row, gid in enumerate(table.global_ids):
+            if winner[gid] != (s, row):
+                continue
+            tc = table.type_class[row]
+            new_row = merged.add_element(
+                gid,
+                strings[table.ifc_class[row]],
+                strings[tc] if tc != UNTYPED else None,
+                strings[table.type_name[row]] if tc != UNTYPED else None,
+                strings[table.level[row]],
+            )
+            source_of.append(s)
+            for code, q in lines.get(row, ()):
+                item = items.get(code)
+                if item is None:
+                    ci = item_of[code]
+                    item = items[code] = merged.add_item(ci.code, ci.description, ci.unit, ci.rate, ci.has_rate)
+                merged.add_line(new_row, item, q)
+
+    return FederationResult(
+        table=merged,
+        policy=policy,
+        sources=tuple(name for name, _ in sources),
+        source_of=source_of,
+        elements=tuple(len(table) for _, table in sources),
+        duplicates=tuple(duplicates),
+        conflicts=len(conflicts),
+    )
+
+# Source names from the model file names (stem, then the whole path when two stems collide).
+def _source_names(model_paths: Sequence[str]) -> List[str]:
+    stems = [os.path.splitext(os.path.basename(str(p)))[0] for p in model_paths]
+    return [stem if stems.count(stem) == 1 else str(p) for stem, p in zip(stems, model_paths)]
+
+# Estimate every model in a worker process (max_workers=1: in this process) and merge the tables.
+def federate(model_paths: Sequence[str], csv_path: str, *, policy: str = "first",
+             price_format: PriceListFormat = PriceListFormat(), max_workers: Optional[int] = None) -> FederationResult:
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate policy {policy!r}, expected one of {', '.join(DUPLICATE_POLICIES)}")
+    paths = [str(p) for p in model_paths]
+    workers = max_workers or min(len(paths), os.cpu_count() or 1)
+    if workers <= 1 or len(paths) <= 1:
+        tables = [estimate_source(p, csv_path, price_format) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tables = list(pool.map(estimate_source, paths, [csv_path] * len(paths), [price_format] * len(paths)))
+    return merge_element_tables(list(zip(_source_names(paths), tables)), policy)
+
+# Sum quantities and amounts per cost item and source model: (item index, source name, quantity, amount),
+# sources in their given order within an item.
+def aggregate_boq_by_source(result: FederationResult) -> List[Tuple[int, str, float, float]]:
+    table = result.table
+    qty = defaultdict(float)
+    for row, item, q in zip(table.line_element, table.line_item, table.line_quantity):
+        qty[(item, result.source_of[row])] += q
+    return [(item, result.sources[s], q, table.items[item].rate * q) for (item, s), q in sorted(qty.items())]
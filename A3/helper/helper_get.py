@@ -10,17 +10,26 @@ Functions:
 - _get_base_quantities: Get base quantities from IfcElementQuantity (AREA, VOLUME, LENGTH, HEIGHT)
 - _norm_unit: Normalize unit strings for comparison, handling variants (m, m2, m3, count, etc.)
 - get_project_units: Return a dict with the project's units for LENGTH, AREA, VOLUME from IFC schema
+- get_source_units: Return the model unit (m/cm/mm variants) per base quantity kind
+- _get_base_quantity: Get one base quantity kind from IfcElementQuantity
+- get_material_densities: Map element id -> mass density (kg/m3) from the associated materials, in one pass
+- QuantityProvider: Lazy quantities by price list unit, extracting only the kind each unit needs (mass = volume x density)
 - get_quantity_for_unit: Compute element quantity according to pricelist unit with unit conversion
+- get_required_quantity: Return the base quantity (LENGTH, AREA, VOLUME, HEIGHT, MASS) a price list unit needs
 - collect_candidates_by_classes: Collect elements by specific IFC classes or all IfcElement if empty
-- map_elements_to_price_rows_by_type_name: Map elements to CSV rows using type names, producing quantity and cost lines
+- map_elements_to_price_rows_by_type_name: Map elements to CSV rows using type names, producing compact PriceLineRecord lines
+- get_relating_type: Return the IfcTypeObject of an element (IsTypedBy or IsDefinedBy), else None
+- get_level_name: Return the IfcBuildingStorey name containing the element
+- get_storey_names: Map element id -> storey name in one pass over the containment relations
+- get_cost_item_rate: Return the unit rate (AppliedValue of the first IfcCostValue) of a cost item
+- get_cost_item_unit: Return the unit of a cost item from the price list unit map or its IfcCostValue
 """
 from collections import defaultdict, Counter
 from typing import Dict, List, Tuple, Optional
 import os
-import ifcopenshell as ifc
-import ifcopenshell.api
+import sys
 
-from .helper_read import build_price_index_by_text, normalize_text, parse_decimal_eu
+from .helper_read import build_price_index_by_text, normalize_text, parse_decimal_eu, row_density
 
 # Writes for each IfcElement (e.g. IfcBeam) the related Ifc...Type (e.g. IfcBeamType),
 # number of instances linked to each Type, number of elements without Type, and totals.
@@ -133,7 +142,7 @@ def get_all_struct_elements(
 
 # Get the type name of an element from its Type, PredefinedType, or Name attribute.
 def get_element_type_name(element) -> str:
-    import ifcopenshell.util
+    import ifcopenshell.util.element
     t = ifcopenshell.util.element.get_type(element)
     if t and hasattr(t, "Name"):
         return str(t.Name)
@@ -146,8 +155,9 @@ def get_element_type_name(element) -> str:
 # Get base quantities from element's QTO using ifcopenshell utilities
 # #Returns dictionary with numeric quantity values.
 def get_base_quantities(element) -> Dict[str, float]:
+    import ifcopenshell.util.element
     out = {}
-    qto = ifc.util.element.get_qto(element)
+    qto = ifcopenshell.util.element.get_qto(element)
     for k, v in qto.items():
         if isinstance(v, (int, float)):
             out[k] = float(v)
@@ -264,96 +274,261 @@ def get_project_units(model):
     
     return unit_map
 
-# Compute element quantity according to pricelist unit with automatic unit conversion.
-# Converts from model units (mm, cm, m) to target unit based on IFC schema detection.
-def get_quantity_for_unit(e, unit: str, model=None) -> Optional[float]:
-    """
-    Compute element quantity according to the pricelist unit,
-    converting if necessary based on model project units.
-    """
-    u = _norm_unit(unit)
-
-    if u in {"-", ""}:
-        return 1.0
+# Conversion factors from model units to price list units
+_UNIT_FACTORS = {
+    ("mm", "m"): 0.001,
+    ("cm", "m"): 0.01,
+    ("m",  "m"): 1.0,
+
+    ("mm2", "m2"): 1e-6,
+    ("cm2", "m2"): 1e-4,
+    ("m2",  "m2"): 1.0,
+
+    ("mm3", "m3"): 1e-9,
+    ("cm3", "m3"): 1e-6,
+    ("m3",  "m3"): 1.0,
+}
+
+# Normalized price list unit -> (base quantity kind, target unit); units not listed need no quantity walk.
+_UNIT_KINDS = {
+    "m": ("LENGTH", "m"),
+    "m2": ("AREA", "m2"),
+    "m3": ("VOLUME", "m3"),
+    "height": ("HEIGHT", "m"),
+}
+
+# Mass units: kilograms per unit of mass (mass = volume in m3 x density in kg/m3 x factor)
+_MASS_FACTORS = {"kg": 1.0, "g": 1000.0, "ton": 0.001}
+
+# Normalized units that need no quantity: each element counts as 1
+_COUNT_UNITS = {"-", "", "count"}
+
+# Mass density (kg/m3) of an IfcMaterialProperties: Pset_MaterialCommon.MassDensity (IFC4)
+# or the MassDensity attribute of IfcGeneralMaterialProperties (IFC2X3), else None.
+def _properties_density(props) -> Optional[float]:
+    value = getattr(props, "MassDensity", None)
+    if value is None:
+        for p in getattr(props, "Properties", None) or []:
+            if getattr(p, "Name", None) == "MassDensity" and p.is_a("IfcPropertySingleValue"):
+                value = getattr(p, "NominalValue", None)
+                break
+    value = getattr(value, "wrappedValue", value)
+    try:
+        return float(value) if value is not None and float(value) > 0 else None
+    except (TypeError, ValueError):
+        return None
 
-    q = _get_base_quantities(e)
+# Density of an associated material (IfcMaterial, layer/profile/constituent sets and their usages, lists):
+# composites use the mean of their known densities, weighted by layer thickness or constituent fraction.
+def _material_density(material, densities: Dict[int, float]) -> Optional[float]:
+    if material is None:
+        return None
+    if material.is_a("IfcMaterial"):
+        return densities.get(material.id())
+
+    parts: List[Tuple[object, float]] = []
+    if material.is_a("IfcMaterialLayerSetUsage"):
+        return _material_density(material.ForLayerSet, densities)
+    if material.is_a("IfcMaterialProfileSetUsage"):
+        return _material_density(material.ForProfileSet, densities)
+    if material.is_a("IfcMaterialLayerSet"):
+        parts = [(l.Material, float(l.LayerThickness or 0.0)) for l in material.MaterialLayers or []]
+    elif material.is_a("IfcMaterialProfileSet"):
+        parts = [(p.Material, 1.0) for p in material.MaterialProfiles or []]
+    elif material.is_a("IfcMaterialConstituentSet"):
+        parts = [(c.Material, float(getattr(c, "Fraction", None) or 1.0)) for c in material.MaterialConstituents or []]
+    elif material.is_a("IfcMaterialList"):
+        parts = [(m, 1.0) for m in material.Materials or []]
+
+    known = [(densities.get(m.id()), w) for m, w in parts if m is not None and m.id() in densities]
+    weight = sum(w for _, w in known)
+    if not known:
+        return None
+    if weight <= 0:
+        return sum(d for d, _ in known) / len(known)
+    return sum(d * w for d, w in known) / weight
+
+# Map element id -> mass density (kg/m3) from the associated materials, in one pass over the material
+# properties, IfcRelAssociatesMaterial and (for materials associated with types) IfcRelDefinesByType.
+# Materials associated with the element itself win over the ones of its type.
+def get_material_densities(model) -> Dict[int, float]:
+    densities: Dict[int, float] = {}
+    for props in model.by_type("IfcMaterialProperties"):
+        material = getattr(props, "Material", None)
+        value = _properties_density(props)
+        if material is not None and value is not None:
+            densities.setdefault(material.id(), value)
+
+    out: Dict[int, float] = {}
+    by_type: Dict[int, float] = {}
+    per_material: Dict[int, Optional[float]] = {}
+    for rel in model.by_type("IfcRelAssociatesMaterial"):
+        material = rel.RelatingMaterial
+        if material is None:
+            continue
+        if material.id() not in per_material:
+            per_material[material.id()] = _material_density(material, densities)
+        value = per_material[material.id()]
+        if value is None:
+            continue
+        for obj in rel.RelatedObjects or []:
+            if obj.is_a("IfcTypeObject"):
+                by_type[obj.id()] = value
+            else:
+                out[obj.id()] = value
+
+    if by_type:
+        for rel in model.by_type("IfcRelDefinesByType"):
+            value = by_type.get(rel.RelatingType.id()) if rel.RelatingType else None
+            if value is None:
+                continue
+            for obj in rel.RelatedObjects or []:
+                out.setdefault(obj.id(), value)
+    return out
 
-    # Default project units
+# Model unit per base quantity kind (m, m2, m3 by default; mm/cm variants from the IFC project units).
+def get_source_units(model=None) -> Dict[str, str]:
     source_units = {"LENGTH": "m", "AREA": "m2", "VOLUME": "m3", "HEIGHT": "m"}
+    if model is None:
+        return source_units
+
+    detected = get_project_units(model)
+    for k in detected:
+        unit_name = detected[k].lower()
+
+        # Check for millimeters
+        if "milli" in unit_name or unit_name.startswith("mm"):
+            source_units[k] = "mm" if k in {"LENGTH", "HEIGHT"} else ("mm2" if k == "AREA" else "mm3")
+        # Check for centimeters
+        elif "centi" in unit_name or unit_name.startswith("cm"):
+            source_units[k] = "cm" if k in {"LENGTH", "HEIGHT"} else ("cm2" if k == "AREA" else "cm3")
+        # Check for meters
+        elif "metre" in unit_name or unit_name.startswith("m"):
+            source_units[k] = "m" if k in {"LENGTH", "HEIGHT"} else ("m2" if k == "AREA" else "m3")
+    return source_units
+
+# Get one base quantity (AREA, VOLUME, LENGTH or HEIGHT) from IfcElementQuantity, None when absent.
+# Same rules as _get_base_quantities (the last value found wins); other quantity kinds are not converted.
+def _get_base_quantity(e, kind: str) -> Optional[float]:
+    value = None
+    found = False
 
-    # Detect IFC schema project units
-    if model is not None:
-        detected = get_project_units(model)
-        for k in detected:
-            unit_name = detected[k].lower()
-            
-            # Check for millimeters
-            if "milli" in unit_name or unit_name.startswith("mm"):
-                source_units[k] = "mm" if k in {"LENGTH", "HEIGHT"} else ("mm2" if k == "AREA" else "mm3")
-            # Check for centimeters
-            elif "centi" in unit_name or unit_name.startswith("cm"):
-                source_units[k] = "cm" if k in {"LENGTH", "HEIGHT"} else ("cm2" if k == "AREA" else "cm3")
-            # Check for meters
-            elif "metre" in unit_name or unit_name.startswith("m"):
-                source_units[k] = "m" if k in {"LENGTH", "HEIGHT"} else ("m2" if k == "AREA" else "m3")
-
-    # Conversion factors
-    unit_factors = {
-        ("mm", "m"): 0.001,
-        ("cm", "m"): 0.01,
-        ("m",  "m"): 1.0,
-
-        ("mm2", "m2"): 1e-6,
-        ("cm2", "m2"): 1e-4,
-        ("m2",  "m2"): 1.0,
-
-        ("mm3", "m3"): 1e-9,
-        ("cm3", "m3"): 1e-6,
-        ("m3",  "m3"): 1.0,
-    }
+    for rel in getattr(e, "IsDefinedBy", []) or []:
+        if not rel or not rel.is_a("IfcRelDefinesByProperties"):
+            continue
 
-    # ----- LENGTH -----
-    if u == "m":
-        val = q["LENGTH"]
-        factor = unit_factors.get((source_units["LENGTH"], "m"), 1.0)
-        return val * factor if val is not None else None
+        pset = rel.RelatingPropertyDefinition
+        if not pset or not pset.is_a("IfcElementQuantity"):
+            continue
 
-    # ----- AREA -----
-    if u == "m2":
-        val = q["AREA"]
-        factor = unit_factors.get((source_units["AREA"], "m2"), 1.0)
-        return val * factor if val is not None else None
+        found = True
 
-    # ----- VOLUME -----
-    if u == "m3":
-        val = q["VOLUME"]
-        factor = unit_factors.get((source_units["VOLUME"], "m3"), 1.0)
-        return val * factor if val is not None else None
+        for it in getattr(pset, "Quantities", []) or []:
+            if kind == "VOLUME":
+                if it.is_a("IfcQuantityVolume"):
+                    value = float(getattr(it, "VolumeValue", 0.0) or 0.0)
+            elif kind == "AREA":
+                if it.is_a("IfcQuantityArea"):
+                    value = float(getattr(it, "AreaValue", 0.0) or 0.0)
+            elif it.is_a("IfcQuantityLength"):
+                if kind == "LENGTH" or getattr(it, "Name", "").lower() == "height":
+                    value = float(getattr(it, "LengthValue", 0.0) or 0.0)
 
-    # ----- HEIGHT -----
-    if u == "height":
-        val = q["HEIGHT"]
-        factor = unit_factors.get((source_units["HEIGHT"], "m"), 1.0)
-        return val * factor if val is not None else None
+    if not found:
+        print(f"[WARNING] IfcElementQuantity mancante per {e.GlobalId} ({e.is_a()})")
 
-    # ----- COUNT -----
-    if u == "count":
-        return 1.0  # each element counts as 1
+    return value
 
-    # ----- MASS -----
-    if u == "kg":
-        print("[WARNING] Quantity in kg not available from IfcElementQuantity")
-        return None
-    if u == "g":
-        print("[WARNING] Quantity in g not available from IfcElementQuantity")
-        return None
-    if u == "ton":
-        print("[WARNING] Quantity in ton not available from IfcElementQuantity")
+class QuantityProvider:
+    """
+    Lazy element quantities by price list unit for one model:
+    - project units are read once, as a conversion factor per base quantity kind
+    - every unit is normalized once and compiled to the quantity kind it needs (see plan)
+    - only that kind is read from the element; count and empty units skip the property set walk
+    - mass units (kg, g, ton) are volume x density: the density given with the price list row when
+      present, else the one of the element material (get_material_densities, built on first use)
+    """
+
+    def __init__(self, model=None, units=()):
+        self.model = model
+        source_units = get_source_units(model)
+        self.factors = {
+            kind: _UNIT_FACTORS.get((source_units[kind], target), 1.0) for kind, target in _UNIT_KINDS.values()
+        }
+        self._densities: Optional[Dict[int, float]] = None
+        self.plans: Dict[str, Tuple[str, Optional[str], float]] = {}
+        for unit in units:
+            self.plan(unit)
+
+    # Compile a price list unit: (normalized unit, quantity kind or None, conversion factor).
+    def plan(self, unit: str) -> Tuple[str, Optional[str], float]:
+        p = self.plans.get(unit)
+        if p is None:
+            u = _norm_unit(unit)
+            if u in _MASS_FACTORS:
+                p = (u, "MASS", self.factors["VOLUME"] * _MASS_FACTORS[u])
+            else:
+                kind = _UNIT_KINDS[u][0] if u in _UNIT_KINDS else None
+                p = (u, kind, self.factors[kind] if kind else 1.0)
+            self.plans[unit] = p
+        return p
+
+    # Element id -> material density (kg/m3), built once per model on first use.
+    @property
+    def densities(self) -> Dict[int, float]:
+        if self._densities is None:
+            self._densities = get_material_densities(self.model) if self.model is not None else {}
+        return self._densities
+
+    # Quantity of an element in the price list unit (None when not available, as get_quantity_for_unit).
+    # density: kg/m3 given with the price list row, used for mass units before the material density.
+    def quantity(self, e, unit: str, density: Optional[float] = None) -> Optional[float]:
+        u, kind, factor = self.plan(unit)
+
+        # ----- MASS -----
+        if kind == "MASS":
+            density = density or self.densities.get(e.id())
+            if not density:
+                print(f"[WARNING] Quantity in {u} not available: no density for {e.GlobalId} ({e.is_a()})")
+                return None
+            val = _get_base_quantity(e, "VOLUME")
+            return val * factor * density if val is not None else None
+
+        if kind is not None:
+            val = _get_base_quantity(e, kind)
+            return val * factor if val is not None else None
+
+        if u in _COUNT_UNITS:
+            return 1.0  # no unit, or each element counts as 1
+
+        # Unknown unit
+        print(f"[WARNING] Unit not recognized: '{unit}' normalized as '{u}'")
         return None
 
-    # Unknown unit
-    print(f"[WARNING] Unit not recognized: '{unit}' normalized as '{u}'")
-    return None
+# Compute element quantity according to pricelist unit with automatic unit conversion.
+# Converts from model units (mm, cm, m) to target unit based on IFC schema detection.
+# For many elements, build one QuantityProvider and reuse it (project units and unit rules compiled once).
+def get_quantity_for_unit(e, unit: str, model=None, density: Optional[float] = None) -> Optional[float]:
+    """
+    Compute element quantity according to the pricelist unit,
+    converting if necessary based on model project units.
+    Mass units (kg, g, ton) need a density: the given one (kg/m3) or the material density of the element.
+    """
+    if _norm_unit(unit) in _COUNT_UNITS:
+        return 1.0
+    return QuantityProvider(model).quantity(e, unit, density)
+
+# Unit plans without a model: only their quantity kinds are used (plans are cached per unit)
+_UNIT_PLANS = QuantityProvider()
+
+# Return the base quantity a price list unit is computed from: "LENGTH", "AREA", "VOLUME", "HEIGHT",
+# "MASS" (kg, g, ton), None when no quantity is needed (count, no unit) or "UNKNOWN" (unit not recognized).
+# Compiled by QuantityProvider.plan, so the pre-flight check and the estimate read the same quantities.
+def get_required_quantity(unit: str) -> Optional[str]:
+    u, kind, _ = _UNIT_PLANS.plan(unit)
+    if kind is None and u not in _COUNT_UNITS:
+        return "UNKNOWN"
+    return kind
 
 # Collect elements by specific IFC classes or all IfcElement if tuple is empty.
 def collect_candidates_by_classes(model, ifc_classes: Tuple[str, ...]) -> List[object]:
@@ -366,6 +541,7 @@ def collect_candidates_by_classes(model, ifc_classes: Tuple[str, ...]) -> List[o
 
 # Map elements to CSV rows using type names, producing quantity and cost lines.
 # Auto-detects IFC classes present in model if not specified.
+# Returns compact PriceLineRecord objects (GlobalId and interned strings only, no entity or CSV row kept).
 def map_elements_to_price_rows_by_type_name(
     model,
     rows: List[Dict[str, str]],
@@ -374,7 +550,10 @@ def map_elements_to_price_rows_by_type_name(
     unit_col: str = "Unit",
     unit_cost_col: str = "Unit Cost",
     filter_ifc_classes: Tuple[str, ...] = None,
-) -> List[Dict[str, object]]:
+) -> List[object]:
+    import ifcopenshell.util.element
+    from .helper_records import PriceLineRecord
+
     idx = build_price_index_by_text(rows, text_col=text_col)
 
     # Dynamically detect present IFC classes if not provided
@@ -385,7 +564,8 @@ def map_elements_to_price_rows_by_type_name(
         filter_ifc_classes = tuple(sorted(present_classes))
 
     elements = collect_candidates_by_classes(model, filter_ifc_classes)
-    out: List[Dict[str, object]] = []
+    quantities = QuantityProvider(model)
+    out: List[object] = []
 
     for el in elements:
         tname = get_element_type_name(el)
@@ -395,7 +575,7 @@ def map_elements_to_price_rows_by_type_name(
             continue
 
         unit = (row.get(unit_col) or "-").strip()
-        qty = get_quantity_for_unit(el, unit, model=model)
+        qty = quantities.quantity(el, unit, row_density(row))
         if qty is None:
             continue
 
@@ -405,16 +585,110 @@ def map_elements_to_price_rows_by_type_name(
             continue
 
         out.append(
-            {
-                "element": el,
-                "global_id": ifc.util.element.get_guid(el),
-                "type_name": tname,
-                "row": row,
-                "unit": unit,
-                "quantity": float(qty),
-                "unit_cost": float(unit_cost),
-                "line_total": float(qty) * float(unit_cost),
-            }
+            PriceLineRecord(
+                ifcopenshell.util.element.get_guid(el),
+                sys.intern(tname),
+                sys.intern(row.get(text_col, "")),
+                sys.intern(unit),
+                float(qty),
+                float(unit_cost),
+            )
         )
 
     return out
+
+# Return the IfcTypeObject of an element (IsTypedBy preferred, then IsDefinedBy), else None.
+def get_relating_type(e):
+    if getattr(e, "IsTypedBy", None):
+        for rel in e.IsTypedBy:
+            if rel and rel.is_a("IfcRelDefinesByType") and rel.RelatingType:
+                return rel.RelatingType
+    for rel in getattr(e, "IsDefinedBy", []) or []:
+        if rel and rel.is_a("IfcRelDefinesByType") and rel.RelatingType:
+            return rel.RelatingType
+    return None
+
+# Return the IfcBuildingStorey name containing the element, else '(no level)'.
+# Traverses spatial containment hierarchy to find building storey.
+def get_level_name(e) -> str:
+    try:
+        import ifcopenshell.util.element as uel
+        container = uel.get_container(e)
+        cur = container
+        while cur:
+            if cur.is_a("IfcBuildingStorey"):
+                name = getattr(cur, "Name", None)
+                return name if name else cur.GlobalId
+            rels = getattr(cur, "Decomposes", []) or []
+            cur = rels[0].RelatingObject if rels else None
+    except Exception:
+        pass
+    # Fallback: direct spatial containment
+    for rel in getattr(e, "ContainedInStructure", []) or []:
+        cur = getattr(rel, "RelatingStructure", None)
+        while cur:
+            if cur.is_a("IfcBuildingStorey"):
+                name = getattr(cur, "Name", None)
+                return name if name else cur.GlobalId
+            rels = getattr(cur, "Decomposes", []) or []
+            cur = rels[0].RelatingObject if rels else None
+    return "(no level)"
+
+# Return the unit rate of a cost item: AppliedValue of its first IfcCostValue, 0.0 if missing.
+def get_cost_item_rate(ci) -> float:
+    vals = getattr(ci, "CostValues", None) or []
+    if not vals:
+        return 0.0
+    v = vals[0].AppliedValue
+    try:
+        return float(getattr(v, "wrappedValue", v))
+    except Exception:
+        s = str(v)
+        if "(" in s and ")" in s:
+            try:
+                return float(s.split("(")[1].split(")")[0])
+            except Exception:
+                return 0.0
+    return 0.0
+
+# Return the unit of a cost item: price list unit by Identification when known, else the IfcCostValue unit.
+def get_cost_item_unit(ci, csv_unit_map: Dict[str, str]) -> str:
+    ident = getattr(ci, "Identification", "") or ""
+    if ident in csv_unit_map:
+        return csv_unit_map[ident]
+    vals = getattr(ci, "CostValues", None) or []
+    if vals:
+        u = getattr(vals[0], "Unit", None)
+        return getattr(u, "Name", "") if u else "-"
+    return "-"
+
+# Name of a storey (GlobalId when unnamed), walking up the decomposition from a spatial structure element.
+def _storey_of(structure, cache: Dict[int, str]) -> str:
+    key = structure.id()
+    if key not in cache:
+        cur, name = structure, "(no level)"
+        while cur:
+            if cur.is_a("IfcBuildingStorey"):
+                name = getattr(cur, "Name", None) or cur.GlobalId
+                break
+            rels = getattr(cur, "Decomposes", []) or []
+            cur = rels[0].RelatingObject if rels else None
+        cache[key] = name
+    return cache[key]
+
+# Map element id -> storey name in one pass over IfcRelContainedInSpatialStructure;
+# elements not contained directly (e.g. parts of assemblies) fall back to get_level_name.
+def get_storey_names(model, elements) -> Dict[int, str]:
+    names: Dict[int, str] = {}
+    cache: Dict[int, str] = {}
+    for rel in model.by_type("IfcRelContainedInSpatialStructure"):
+        structure = rel.RelatingStructure
+        if structure is None:
+            continue
+        name = _storey_of(structure, cache)
+        for e in rel.RelatedElements or []:
+            names[e.id()] = name
+    for e in elements:
+        if e.id() not in names:
+            names[e.id()] = get_level_name(e)
+    return names
@@ -0,0 +1,264 @@
+"""
+Estimate history: one SQLite database collecting the results of many runs (e.g. every revision of a project):
+- Every run appends its metadata (revision label, time, model and price list with their SHA-256, element count,
+  total, options), its totals per cost item, per storey and per storey and cost item, in one transaction
+- Every query is a primary key lookup or range scan (run, item / storey), so trends over hundreds of
+  revisions and the movers between two runs answer without reading old reports
+- Items missing from a run count as zero in trends and movers (added or removed items are movers too)
+
+Functions / classes:
+- RunInfo: Metadata of a recorded run
+- TrendPoint: Quantity and amount of an item (or a storey) in one run
+- Mover: Amount of an item in two runs and the difference
+- EstimateHistory: The history database (record_run, runs, run_id, total_trend, item_trend, storey_trend, movers)
+
+Usage: python -m helper.helper_history <history.sqlite> runs | trend <code> [storey] | storey <storey>
+       | movers <run or revision> <run or revision> [N]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+
+from .helper_checkpoint import file_digest
+from .helper_records import ReportSnapshot
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    models TEXT NOT NULL,
+    model_sha256 TEXT NOT NULL,
+    price_list TEXT NOT NULL,
+    price_list_sha256 TEXT NOT NULL,
+    elements INTEGER NOT NULL,
+    total REAL NOT NULL,
+    options TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_revision ON runs (revision, id);
+CREATE TABLE IF NOT EXISTS items (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    code TEXT NOT NULL,
+    description TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    rate REAL NOT NULL,
+    quantity REAL NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (run_id, code)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS storeys (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    storey TEXT NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (run_id, storey)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS storey_items (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    storey TEXT NOT NULL,
+    code TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (run_id, storey, code)
+) WITHOUT ROWID;
+"""
+
+class RunInfo(NamedTuple):
+    """Metadata of a recorded run (models: paths of the estimated models, several for a federation)."""
+
+    id: int
+    recorded_at: str
+    revision: str
+    models: List[str]
+    price_list: str
+    elements: int
+    total: float
+
+class TrendPoint(NamedTuple):
+    """Quantity (None for storey totals, which mix units) and amount in one run."""
+
+    run_id: int
+    revision: str
+    recorded_at: str
+    quantity: Optional[float]
+    amount: float
+
+class Mover(NamedTuple):
+    """Amount of a cost item in two runs (0.0 where it is missing) and the difference b - a."""
+
+    code: str
+    description: str
+    amount_a: float
+    amount_b: float
+    delta: float
+
+class EstimateHistory:
+    """
+    SQLite history of estimate runs (created on first use; WAL journal, so readers never wait for a recording run).
+    Runs are referenced by id, or by revision label (the latest run with that label).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.execute("PRAGMA journal_mode = WAL")
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            self._db.close()
+            raise ValueError(f"{path} was written by a newer version of the history (schema {version})")
+        with self._db:
+            self._db.executescript(_SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self) -> "EstimateHistory":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+
+    # Append a run: metadata, totals per item, per storey and per storey and item. Returns the run id.
+    # digests: known SHA-256 by absolute path (e.g. from the checkpoint fingerprint), the others are computed.
+    def record_run(self, snapshot: ReportSnapshot, *, revision: str, model_paths: Iterable[str], price_list: str,
+                   options: Optional[Dict[str, object]] = None, digests: Optional[Dict[str, str]] = None) -> int:
+        digests = digests or {}
+        models = [os.path.abspath(str(p)) for p in model_paths]
+        price_list = os.path.abspath(str(price_list))
+        sha = {p: digests.get(p) or file_digest(p) for p in models + [price_list]}
+
+        # Totals by item code (a code listed twice in the price list is one item of the history)
+        items: Dict[str, List[object]] = {}
+        for item, _, quantity, amount in snapshot.boq_totals:
+            info = snapshot.items[item]
+            row = items.setdefault(info.code or "", [info.description, info.unit, info.rate, 0.0, 0.0])
+            row[3] += quantity
+            row[4] += amount
+        storeys: Dict[str, float] = defaultdict(float)
+        storey_items: Dict[tuple, List[float]] = defaultdict(lambda: [0.0, 0.0])
+        for item, storey, quantity, amount in snapshot.boq_by_level:
+            storey = storey or ""
+            storeys[storey] += amount
+            row = storey_items[(storey, snapshot.items[item].code or "")]
+            row[0] += quantity
+            row[1] += amount
+
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO runs (recorded_at, revision, models, model_sha256, price_list, price_list_sha256, "
+                "elements, total, options) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), revision, json.dumps(models),
+                 json.dumps([sha[p] for p in models]), price_list, sha[price_list], snapshot.total_elements,
+                 sum(row[4] for row in items.values()), json.dumps(options or {}, sort_keys=True, default=repr)),
+            )
+            run_id = cursor.lastrowid
+            self._db.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 [(run_id, code, *row) for code, row in items.items()])
+            self._db.executemany("INSERT INTO storeys VALUES (?, ?, ?)",
+                                 [(run_id, storey, amount) for storey, amount in storeys.items()])
+            self._db.executemany("INSERT INTO storey_items VALUES (?, ?, ?, ?, ?)",
+                                 [(run_id, storey, code, q, a) for (storey, code), (q, a) in storey_items.items()])
+        return run_id
+
+    # Recorded runs, oldest first.
+    def runs(self) -> List[RunInfo]:
+        rows = self._db.execute(
+            "SELECT id, recorded_at, revision, models, price_list, elements, total FROM runs ORDER BY id")
+        return [RunInfo(i, at, rev, json.loads(models), price_list, elements, total)
+                for i, at, rev, models, price_list, elements, total in rows]
+
+    # Run id of a run reference: an id, or a revision label (its latest run).
+    def run_id(self, run: Union[int, str]) -> int:
+        if isinstance(run, int):
+            row = self._db.execute("SELECT id FROM runs WHERE id = ?", (run,)).fetchone()
+        else:
+            row = self._db.execute("SELECT MAX(id) FROM runs WHERE revision = ?", (run,)).fetchone()
+        if row is None or row[0] is None:
+            raise KeyError(f"No run {run!r} in {self.path}")
+        return row[0]
+
+    # Total amount of every run.
+    def total_trend(self) -> List[TrendPoint]:
+        rows = self._db.execute("SELECT id, revision, recorded_at, total FROM runs ORDER BY id")
+        return [TrendPoint(i, rev, at, None, total) for i, rev, at, total in rows]
+
+    # Quantity and amount of a cost item in every run (of one storey when given), 0.0 where it is missing.
+    def item_trend(self, code: str, storey: Optional[str] = None) -> List[TrendPoint]:
+        if storey is None:
+            sql = ("SELECT r.id, r.revision, r.recorded_at, COALESCE(i.quantity, 0.0), COALESCE(i.amount, 0.0) "
+                   "FROM runs r LEFT JOIN items i ON i.run_id = r.id AND i.code = ? ORDER BY r.id")
+            params = (code,)
+        else:
+            sql = ("SELECT r.id, r.revision, r.recorded_at, COALESCE(i.quantity, 0.0), COALESCE(i.amount, 0.0) "
+                   "FROM runs r LEFT JOIN storey_items i ON i.run_id = r.id AND i.storey = ? AND i.code = ? "
+                   "ORDER BY r.id")
+            params = (storey, code)
+        return [TrendPoint(*row) for row in self._db.execute(sql, params)]
+
+    # Total amount of a storey in every run, 0.0 where it is missing.
+    def storey_trend(self, storey: str) -> List[TrendPoint]:
+        rows = self._db.execute(
+            "SELECT r.id, r.revision, r.recorded_at, COALESCE(s.amount, 0.0) "
+            "FROM runs r LEFT JOIN storeys s ON s.run_id = r.id AND s.storey = ? ORDER BY r.id", (storey,))
+        return [TrendPoint(i, rev, at, None, amount) for i, rev, at, amount in rows]
+
+    # Cost items with the largest absolute change of amount from run a to run b (of one storey when given).
+    # Changes below half a cent (float noise of the summed amounts) are not movers.
+    def movers(self, a: Union[int, str], b: Union[int, str], *, limit: Optional[int] = 10,
+               storey: Optional[str] = None) -> List[Mover]:
+        a, b = self.run_id(a), self.run_id(b)
+        if storey is None:
+            source, params = "items WHERE run_id IN (?, ?)", (a, b)
+        else:
+            source, params = "storey_items WHERE run_id IN (?, ?) AND storey = ?", (a, b, storey)
+        rows = self._db.execute(
+            "SELECT m.code, COALESCE(i.description, ''), m.amount_a, m.amount_b, m.amount_b - m.amount_a AS delta "
+            "FROM (SELECT code, SUM(CASE WHEN run_id = ? THEN amount ELSE 0.0 END) AS amount_a, "
+            f"SUM(CASE WHEN run_id = ? THEN amount ELSE 0.0 END) AS amount_b, MAX(run_id) AS last FROM {source} "
+            "GROUP BY code) m LEFT JOIN items i ON i.run_id = m.last AND i.code = m.code "
+            "WHERE ROUND(delta, 2) != 0 ORDER BY ABS(delta) DESC, m.code LIMIT ?",
+            (a, b, *params, -1 if limit is None else limit),
+        )
+        return [Mover(*row) for row in rows]
+
+
+# Run reference from the command line: digits are a run id, anything else a revision label.
+def _run_arg(text: str) -> Union[int, str]:
+    return int(text) if text.isdigit() else text
+
+def _print_trend(points: List[TrendPoint]) -> None:
+    for p in points:
+        quantity = "" if p.quantity is None else f"{p.quantity:>16.3f}"
+        print(f"{p.run_id:>6}  {p.recorded_at:<19}  {p.revision:<30}{quantity}{p.amount:>18.2f}")
+
+
+if __name__ == "__main__":
+    usage = ("Usage: python -m helper.helper_history <history.sqlite> runs | trend <code> [storey] "
+             "| storey <storey> | movers <run or revision> <run or revision> [N]")
+    args = sys.argv[1:]
+    if len(args) < 2 or not os.path.isfile(args[0]):
+        raise SystemExit(usage)
+    with EstimateHistory(args[0]) as history:
+        command = args[1]
+        if command == "runs" and len(args) == 2:
+            for r in history.runs():
+                print(f"{r.id:>6}  {r.recorded_at:<19}  {r.revision:<30}{r.elements:>10}{r.total:>18.2f}")
+        elif command == "trend" and len(args) in (3, 4):
+            _print_trend(history.item_trend(args[2], args[3] if len(args) == 4 else None))
+        elif command == "storey" and len(args) == 3:
+            _print_trend(history.storey_trend(args[2]))
+        elif command == "movers" and len(args) in (4, 5):
+            for m in history.movers(_run_arg(args[2]), _run_arg(args[3]), limit=int(args[4]) if len(args) == 5 else 10):
+                print(f"{m.code:<16}{m.description[:40]:<42}{m.amount_a:>16.2f}{m.amount_b:>16.2f}{m.delta:>+16.2f}")
+        else:
+            raise SystemExit(usage)
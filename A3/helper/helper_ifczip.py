@@ -0,0 +1,130 @@
+"""
+Compressed IFC models (.ifczip: a zip archive with one .ifc file):
+- Read: inflate the .ifc member in memory and parse it from the string (no temporary file); members larger
+  than IN_MEMORY_MAX_BYTES (or not UTF-8) are inflated in chunks to a temporary file first
+- Write: the IFC serializer writes into a named pipe and a child process deflates the stream into the archive,
+  so the uncompressed model never touches the disk; without named pipes (Windows) or when the child process
+  cannot start, the model is written to a temporary .ifc next to the target and deflated from there
+- Plain .ifc (and .ifcXML) paths go through ifcopenshell unchanged
+
+Functions:
+- is_ifczip: True for a .ifczip path
+- open_ifc: Open a .ifc or .ifczip model
+- write_ifc: Write a model to a .ifc or .ifczip path
+"""
+
+import os
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+import ifcopenshell
+
+# Largest .ifc member parsed from memory (the inflated text and the model are in memory at the same time)
+IN_MEMORY_MAX_BYTES = 512 << 20
+# Deflate level of the written archives (6: zlib default, good ratio for STEP text at a fraction of level 9 time)
+ZIP_LEVEL = 6
+# Seconds to wait for the compressing child process to be ready before falling back to a temporary file
+CHILD_READY_TIMEOUT = 30.0
+
+# Child process: open the pipe for reading (non-blocking, so the parent never waits for a reader), report ready,
+# wait until the parent holds a write end (a pipe without writers reads as end of file), then deflate
+# everything written into the pipe until the last writer closes it.
+_DEFLATE_PIPE = r"""
+import os, shutil, sys, zipfile
+fifo, out_path, member, level = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+sys.stdout.write("ready\n")
+sys.stdout.flush()
+sys.stdin.readline()
+os.set_blocking(fd, True)
+with os.fdopen(fd, "rb") as src:
+    with zipfile.ZipFile(out_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=level) as zf:
+        with zf.open(member, "w", force_zip64=True) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+"""
+
+# True for a .ifczip path (any case).
+def is_ifczip(path) -> bool:
+    return Path(str(path)).suffix.lower() == ".ifczip"
+
+# First .ifc member of an archive, None if there is none.
+def _ifc_member(zf: zipfile.ZipFile) -> Optional[zipfile.ZipInfo]:
+    for info in zf.infolist():
+        if Path(info.filename).suffix.lower() == ".ifc":
+            return info
+    return None
+
+# Open a .ifc model, or the .ifc member of a .ifczip (in memory up to IN_MEMORY_MAX_BYTES, else via a temporary file).
+def open_ifc(path):
+    if not is_ifczip(path):
+        return ifcopenshell.open(str(path))
+    with zipfile.ZipFile(str(path)) as zf:
+        info = _ifc_member(zf)
+        if info is None:
+            # .ifcXML archives: ifcopenshell extracts and parses them
+            return ifcopenshell.open(str(path))
+        if info.file_size <= IN_MEMORY_MAX_BYTES:
+            try:
+                return ifcopenshell.file.from_string(zf.read(info).decode("utf-8"))
+            except UnicodeDecodeError:
+                pass
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = os.path.join(tmp_dir, "model.ifc")
+            with zf.open(info) as src, open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            return ifcopenshell.open(tmp_path)
+
+# Stream the serializer into a named pipe read by a deflating child process; False if the child did not start.
+def _write_through_pipe(model, path: str, member: str) -> bool:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fifo = os.path.join(tmp_dir, "model.ifc")
+        os.mkfifo(fifo)
+        child = subprocess.Popen([sys.executable, "-c", _DEFLATE_PIPE, fifo, path, member, str(ZIP_LEVEL)],
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        # Without a reader the serializer would block forever on the pipe: wait for the child first
+        readable, _, _ = select.select([child.stdout], [], [], CHILD_READY_TIMEOUT)
+        if not readable or child.stdout.readline().strip() != "ready":
+            child.kill()
+            child.wait()
+            return False
+        # The parent holds a write end for the whole serialization, so the pipe has a writer from the moment
+        # the child starts reading until the serializer is done
+        hold = os.open(fifo, os.O_WRONLY)
+        child.stdin.write("go\n")
+        child.stdin.close()
+        try:
+            model.wrapped_data.write(fifo)
+        except BaseException:
+            child.kill()
+            raise
+        finally:
+            os.close(hold)
+            code = child.wait()
+            child.stdout.close()
+        if code:
+            raise OSError(f"Compressing the IFC into {path} failed (exit code {code})")
+    return True
+
+# Write a model to a .ifc path (ifcopenshell) or a .ifczip path (member: name of the .ifc inside the archive,
+# default <stem>.ifc), streaming the serialization through the deflater when possible.
+def write_ifc(model, path, member: Optional[str] = None) -> str:
+    path = str(path)
+    if not is_ifczip(path):
+        model.write(path)
+        return path
+    member = member or f"{Path(path).stem}.ifc"
+    if hasattr(os, "mkfifo") and _write_through_pipe(model, path, member):
+        return path
+    # Fallback: temporary .ifc next to the target, deflated in chunks by zipfile
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, member)
+        model.write(tmp_path)
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=ZIP_LEVEL) as zf:
+            zf.write(tmp_path, member)
+    return path
@@ -0,0 +1,71 @@
+"""
+Fuzzy matching of unique (IFC class, element name) keys against the price list names:
+- Same rule everywhere: highest difflib.SequenceMatcher ratio on the lowercased, stripped names, first row on ties
+- Large work lists are split in chunks and matched on a process pool; the candidate names per class are sent
+  once to every worker (pool initializer), each task carries only its keys and returns row indexes
+- Chunks are merged in work list order, so the result does not depend on the worker count or the scheduling
+
+Functions:
+- best_index: Index of the best candidate for one name (-1 without candidates)
+- match_keys: Best candidate index of every (class, name) key, serially or on a process pool
+"""
+
+import difflib
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Auto mode matches on a pool from this many name comparisons (about a second of serial work)
+PARALLEL_MIN_COMPARISONS = 200_000
+# Chunks per worker: small enough to balance uneven class buckets, large enough to amortize the task overhead
+CHUNKS_PER_WORKER = 4
+
+# Candidate matchers per class of the worker process (built once by _init_worker)
+_MATCHERS: Dict[str, List[difflib.SequenceMatcher]] = {}
+
+# One SequenceMatcher per candidate name: the candidate is the second sequence, whose index
+# (b2j) is built once and reused for every element name compared to it.
+def _matchers(texts: Sequence[str]) -> List[difflib.SequenceMatcher]:
+    return [difflib.SequenceMatcher(None, "", text) for text in texts]
+
+# Index of the candidate matcher with the highest ratio to base (first on ties), -1 without candidates.
+def _best(base: str, matchers: Sequence[difflib.SequenceMatcher]) -> int:
+    best, best_score = -1, -1.0
+    for i, matcher in enumerate(matchers):
+        matcher.set_seq1(base)
+        score = matcher.ratio()
+        if score > best_score:
+            best, best_score = i, score
+    return best
+
+# Index of the candidate with the highest ratio to base (first on ties), -1 without candidates.
+def best_index(base: str, texts: Sequence[str]) -> int:
+    return _best(base, _matchers(texts))
+
+def _init_worker(buckets: Dict[str, List[str]]) -> None:
+    global _MATCHERS
+    _MATCHERS = {cls: _matchers(texts) for cls, texts in buckets.items()}
+
+def _match_chunk(keys: List[Tuple[str, str]]) -> List[int]:
+    return [_best(name, _MATCHERS.get(cls, ())) for cls, name in keys]
+
+# Best candidate index in buckets[class] of every (class, lowercased name) key, in key order.
+# workers: None = automatic (a pool of up to os.cpu_count() processes for large work lists), 1 = serial.
+def match_keys(buckets: Dict[str, List[str]], keys: Sequence[Tuple[str, str]], *,
+               workers: Optional[int] = None) -> List[int]:
+    keys = list(keys)
+    comparisons = sum(len(buckets.get(cls, ())) for cls, _ in keys)
+    if workers is None:
+        workers = (os.cpu_count() or 1) if comparisons >= PARALLEL_MIN_COMPARISONS else 1
+    chunk_size = max(1, math.ceil(len(keys) / (workers * CHUNKS_PER_WORKER)))
+    chunks = [keys[i:i + chunk_size] for i in range(0, len(keys), chunk_size)]
+    workers = min(workers, len(chunks))
+    # Only the buckets of the classes to match are used (and shipped to the workers)
+    needed = {cls: buckets[cls] for cls in {cls for cls, _ in keys} if cls in buckets}
+    if workers <= 1:
+        matchers = {cls: _matchers(texts) for cls, texts in needed.items()}
+        return [_best(name, matchers.get(cls, ())) for cls, name in keys]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(needed,)) as pool:
+        return [i for part in pool.map(_match_chunk, chunks) for i in part]
@@ -0,0 +1,207 @@
+"""
+Monte Carlo cost uncertainty:
+- Sample the unit cost and the quantity of every cost item from triangular (or uniform) distributions
+  around the BOQ values, relative ranges per item or by default
+- Evaluate all the samples with NumPy in one vectorized pass per block of items (samples x items matrix,
+  blocks on a thread pool), so memory stays bounded while the grand total samples are accumulated
+- Report mean and P10/P50/P90 per item and for the grand total; a seed makes runs reproducible
+
+Per-item ranges can be read from a CSV (see read_uncertainty_csv):
+Identification Code;Rate Min %;Rate Max %;Quantity Min %;Quantity Max %
+
+Functions / classes:
+- Uncertainty: Relative ranges of unit cost and quantity (e.g. -0.10, +0.15) and the distribution kind
+- read_uncertainty_csv: Read per-item ranges (percent) from a CSV
+- MonteCarloResult: Deterministic amounts, sample statistics per item and of the grand total
+- simulate_costs: Run the simulation on a BOQ (IFC model with csv_path, ElementTable or ReportSnapshot)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .helper_read import parse_decimal_eu, read_price_list
+from .helper_records import ItemInfo, as_report_snapshot
+
+PERCENTILES = (10, 50, 90)
+
+class Uncertainty(NamedTuple):
+    """Relative ranges around the BOQ value: rate and quantity in [1 + min, 1 + max], mode at 1."""
+
+    rate_min: float = -0.10
+    rate_max: float = 0.15
+    quantity_min: float = -0.05
+    quantity_max: float = 0.05
+    kind: str = "triangular"
+
+# Read per-item ranges from a CSV (percent values, EU decimals allowed); missing values keep the default.
+# A minimum above its maximum raises ValueError.
+def read_uncertainty_csv(
+    csv_path: str,
+    default: Uncertainty = Uncertainty(),
+    *,
+    ident_col: str = "Identification Code",
+    delimiter: str = ";",
+    encoding: str = "cp1252",
+) -> Dict[str, Uncertainty]:
+    columns = {
+        "rate_min": "Rate Min %",
+        "rate_max": "Rate Max %",
+        "quantity_min": "Quantity Min %",
+        "quantity_max": "Quantity Max %",
+    }
+    out: Dict[str, Uncertainty] = {}
+    for r in read_price_list(csv_path, delimiter=delimiter, encoding=encoding):
+        code = (r.get(ident_col) or "").strip()
+        if not code:
+            continue
+        values = {}
+        for field, col in columns.items():
+            raw = (r.get(col) or "").strip()
+            if raw:
+                values[field] = parse_decimal_eu(raw) / 100.0
+        ranges = default._replace(**values)
+        if ranges.rate_min > ranges.rate_max or ranges.quantity_min > ranges.quantity_max:
+            raise ValueError(f"{csv_path}: minimum above maximum for {code}")
+        out[code] = ranges
+    return out
+
+# Sample n x len(lo) multiplicative factors 1 + x (float32), x triangular on [lo, hi] with the mode at 0 clamped
+# into the range (uniform where flagged). Inverse CDF with one square root per sample; a zero-width range gives
+# exactly the constant 1 + lo (both square roots are of 0).
+def _sample(rng: np.random.Generator, n: int, lo: np.ndarray, hi: np.ndarray, uniform: np.ndarray) -> np.ndarray:
+    lo = lo.astype(np.float32)
+    hi = hi.astype(np.float32)
+    width = hi - lo
+    mode = np.clip(np.float32(0.0), lo, hi)
+    left = mode - lo
+    right = hi - mode
+    safe = np.where(width > 0, width, np.float32(1.0))
+    split = np.where(width > 0, left / safe, np.float32(0.5))  # CDF at the mode
+
+    u = rng.random((n, lo.size), dtype=np.float32)
+    # Branches blended with a 0/1 mask m (masked ufuncs are much slower than plain arithmetic):
+    # u < split: lo + sqrt(u * w * left); else: hi - sqrt((1 - u) * w * right)
+    m = (u < split).astype(np.float32)
+    x = 2.0 * u - 1.0
+    x *= m
+    x += 1.0 - u                                   # u where m, 1 - u elsewhere
+    x *= (safe * right) + m * (safe * left - safe * right)
+    np.sqrt(x, out=x)
+    x *= 2.0 * m - 1.0                             # +sqrt on the left branch, -sqrt on the right
+    x += hi + m * (lo - hi)
+    x += 1.0
+    if uniform.any():
+        x = np.where(uniform, 1.0 + lo + u * width, x)
+    return x
+
+class MonteCarloResult(NamedTuple):
+    """
+    Simulation results (percentiles in PERCENTILES order):
+    - base: deterministic BOQ amount per item; base_total: deterministic grand total
+    - mean / percentiles: (items,) and (items, 3) sample statistics of the item amounts
+    - total_mean / total_percentiles: sample statistics of the grand total
+    """
+
+    samples: int
+    seed: Optional[int]
+    items: Tuple[ItemInfo, ...]
+    uncertainty: Tuple[Uncertainty, ...]
+    base: np.ndarray
+    base_total: float
+    mean: np.ndarray
+    percentiles: np.ndarray
+    total_mean: float
+    total_percentiles: np.ndarray
+
+# Run the Monte Carlo simulation: per sample, amount_i = base_i * f_rate_i * f_quantity_i, total = sum_i amount_i.
+# Items are processed in blocks of about block_cells / samples columns, on a thread pool (NumPy releases the GIL);
+# every block has its own random stream spawned from the seed, so results do not depend on the thread count.
+# The amount of an item is base_i * F with F depending only on its ranges: item statistics are computed once per
+# distinct Uncertainty (from one representative column), the total from all the joint samples.
+def simulate_costs(
+    model,
+    *,
+    samples: int = 100_000,
+    seed: Optional[int] = None,
+    default: Uncertainty = Uncertainty(),
+    per_item: Optional[Dict[str, Uncertainty]] = None,
+    csv_path: Optional[str] = None,
+    block_cells: int = 1 << 23,
+    max_workers: Optional[int] = None,
+) -> MonteCarloResult:
+    snapshot = as_report_snapshot(model, csv_path=csv_path)
+    items = snapshot.items
+    per_item = per_item or {}
+
+    quantities = np.zeros(len(items))
+    for item, _, qty, _ in snapshot.boq_totals:
+        quantities[item] = qty
+    rates = np.array([ci.rate for ci in items], dtype=float)
+    base = quantities * rates
+
+    ranges = tuple(per_item.get(ci.code, default) for ci in items)
+    r_lo = np.array([u.rate_min for u in ranges], dtype=float)
+    r_hi = np.array([u.rate_max for u in ranges], dtype=float)
+    q_lo = np.array([u.quantity_min for u in ranges], dtype=float)
+    q_hi = np.array([u.quantity_max for u in ranges], dtype=float)
+    uniform = np.array([u.kind == "uniform" for u in ranges], dtype=bool)
+
+    # One representative column per distinct Uncertainty
+    representative: Dict[Uncertainty, int] = {}
+    for i, u in enumerate(ranges):
+        representative.setdefault(u, i)
+    rep_columns = set(representative.values())
+
+    # Percentiles of F and of the mirrored side (amounts with a negative base reverse the order)
+    pcts = list(PERCENTILES) + [100 - p for p in PERCENTILES]
+    block = max(1, block_cells // max(samples, 1))
+    starts = list(range(0, len(items), block))
+    streams = np.random.SeedSequence(seed).spawn(len(starts))
+
+    def _run_block(start: int, stream) -> Tuple[np.ndarray, Dict[int, Tuple[float, np.ndarray]]]:
+        rng = np.random.default_rng(stream)
+        cols = slice(start, start + block)
+        factors = _sample(rng, samples, r_lo[cols], r_hi[cols], uniform[cols])
+        factors *= _sample(rng, samples, q_lo[cols], q_hi[cols], uniform[cols])
+        stats = {}
+        for i in rep_columns:
+            if start <= i < start + block:
+                column = factors[:, i - start]
+                stats[i] = (float(column.mean(dtype=np.float64)), np.percentile(column, pcts))
+        # Grand total per sample: one matrix-vector product over the block
+        return factors @ base[cols].astype(np.float32), stats
+
+    totals = np.zeros(samples)
+    rep_stats: Dict[int, Tuple[float, np.ndarray]] = {}
+    if samples and starts:
+        workers = max_workers or min(len(starts), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="montecarlo") as pool:
+            for partial, stats in pool.map(_run_block, starts, streams):
+                totals += partial
+                rep_stats.update(stats)
+
+    mean = np.zeros(len(items))
+    percentiles = np.zeros((len(items), len(PERCENTILES)))
+    k = len(PERCENTILES)
+    for i, u in enumerate(ranges):
+        if i not in rep_stats and representative[u] not in rep_stats:
+            continue
+        f_mean, f_pct = rep_stats[representative[u]]
+        mean[i] = base[i] * f_mean
+        percentiles[i] = base[i] * (f_pct[:k] if base[i] >= 0 else f_pct[k:])
+
+    return MonteCarloResult(
+        samples=samples,
+        seed=seed,
+        items=items,
+        uncertainty=ranges,
+        base=base,
+        base_total=float(base.sum()),
+        mean=mean,
+        percentiles=percentiles,
+        total_mean=float(totals.mean()) if samples else 0.0,
+        total_percentiles=np.percentile(totals, PERCENTILES) if samples else np.zeros(len(PERCENTILES)),
+    )
@@ -0,0 +1,143 @@
+"""
+Output stage:
+- Render QTO, BOQ, their totals variants and the JSON (optionally the NDJSON stream and the
+  Parquet/Arrow tables, the scenario comparison, the Monte Carlo ranges, the zone and per-source BOQs) concurrently on a thread pool
+  from one immutable ReportSnapshot
+- Write the cost-enriched IFC (or the cost overlay) in parallel with the reports
+- Every file is written to a temporary name and renamed, so partial outputs never appear
+
+Functions:
+- write_model_atomic: Write the IFC model to a temporary file and rename it onto the target
+- write_outputs_concurrently: Run all the output writers in parallel and return {output name: path}
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Optional, Sequence
+
+from .helper_records import build_report_snapshot
+from .helper_write import (
+    atomic_path,
+    write_qto_types_no_cost,
+    write_boq_report,
+    write_qto_types_no_cost_totals,
+    write_boq_report_totals,
+    write_qto_elements,
+)
+from .helper_JSON import output_to_json, stream_json
+from .helper_ifczip import write_ifc
+
+# Write the IFC model to a temporary file in the same folder and rename it onto the target.
+# A .ifczip target is compressed while it is serialized (helper_ifczip.write_ifc), the member named after the target.
+def write_model_atomic(model, out_path: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with atomic_path(out_path) as tmp_path:
+        write_ifc(model, tmp_path, member=f"{os.path.splitext(os.path.basename(out_path))[0]}.ifc")
+    return out_path
+
+# Evaluate the price scenarios on the snapshot quantities and write the comparison BOQ.
+def _write_scenarios(snapshot, scenarios, output_dir: str) -> str:
+    from .helper_scenario import compare_scenarios
+    from .helper_write import write_boq_scenarios
+    return write_boq_scenarios(compare_scenarios(snapshot, scenarios), output_dir=output_dir)
+
+# Run the Monte Carlo simulation on the snapshot and write the percentile BOQ.
+def _write_montecarlo(snapshot, options: Dict[str, object], output_dir: str) -> str:
+    from .helper_montecarlo import simulate_costs
+    from .helper_write import write_boq_montecarlo
+    return write_boq_montecarlo(simulate_costs(snapshot, **options), output_dir=output_dir)
+
+# Aggregate the table by zone and write the zone BOQ.
+def _write_zones(table, assignment, output_dir: str) -> str:
+    from .helper_zones import aggregate_boq_by_zone
+    from .helper_write import write_boq_zones
+    return write_boq_zones(table, aggregate_boq_by_zone(table, assignment), output_dir=output_dir)
+
+# Run all the output writers in parallel and return {output name: path} in a fixed order.
+# model + ifc_path: write the enriched IFC; overlay_path: write the cost overlay (from the table);
+# detailed: also stream the per-element report QTO_elements.txt;
+# stream_format ("ndjson" or "json"): also stream items and element lines to A3_TOOL.<format>[.gz];
+# columnar ("parquet" or "arrow"): also write the element and item tables (needs pyarrow);
+# scenarios (helper_scenario.Scenario): also write the scenario comparison BOQ_scenarios.txt;
+# montecarlo (simulate_costs keyword arguments, e.g. {"samples": 100000, "seed": 1}): also write BOQ_montecarlo.txt;
+# zones (helper_zones.ZoneAssignment of the table rows): also write BOQ_zones.txt;
+# sources (helper_federation.FederationResult whose table is being written): also write BOQ_sources.txt.
+# The reports and the JSON read only the snapshot, which is built once (or given) and never modified.
+# skip: names of the outputs not to write (already written by a checkpointed run);
+# on_written(name, result): called as soon as each output is written, e.g. to record it in a checkpoint.
+def write_outputs_concurrently(
+    table,
+    output_dir: str,
+    *,
+    model=None,
+    ifc_path: Optional[str] = None,
+    overlay_path: Optional[str] = None,
+    schedule_name: str = "Price List",
+    json_dir: str = "output",
+    detailed: bool = False,
+    stream_format: Optional[str] = None,
+    compress: bool = False,
+    columnar: Optional[str] = None,
+    scenarios: Sequence = (),
+    montecarlo: Optional[Dict[str, object]] = None,
+    zones=None,
+    sources=None,
+    snapshot=None,
+    skip: Sequence[str] = (),
+    on_written: Optional[Callable[[str, object], None]] = None,
+    max_workers: Optional[int] = None,
+) -> Dict[str, str]:
+    snapshot = snapshot if snapshot is not None else build_report_snapshot(table)
+
+    jobs = {}
+    if model is not None and ifc_path:
+        jobs["IFC"] = (write_model_atomic, (model, ifc_path), {})
+    if overlay_path:
+        from .helper_overlay import write_cost_overlay
+        jobs["IFC overlay"] = (write_cost_overlay, (table, overlay_path), {"schedule_name": schedule_name})
+    jobs["QTO"] = (write_qto_types_no_cost, (snapshot,), {"output_dir": output_dir, "filename": "QTO.txt"})
+    jobs["BOQ"] = (write_boq_report, (snapshot,), {"output_dir": output_dir, "filename": "BOQ.txt"})
+    jobs["QTO (totals)"] = (write_qto_types_no_cost_totals, (snapshot,), {"output_dir": output_dir, "filename": "QTO_total.txt"})
+    jobs["BOQ (totals)"] = (write_boq_report_totals, (snapshot,), {"output_dir": output_dir, "filename": "BOQ_total.txt"})
+    if detailed:
+        jobs["QTO (per element)"] = (write_qto_elements, (table,), {"output_dir": output_dir, "filename": "QTO_elements.txt",
+                                                                    "compress": compress})
+    jobs["JSON"] = (output_to_json, (snapshot,), {"output_dir": json_dir})
+    if stream_format:
+        jobs["JSON stream"] = (stream_json, (table,), {"output_dir": json_dir, "fmt": stream_format, "compress": compress})
+    if scenarios:
+        jobs["BOQ (scenarios)"] = (_write_scenarios, (snapshot, scenarios, output_dir), {})
+    if montecarlo is not None:
+        jobs["BOQ (Monte Carlo)"] = (_write_montecarlo, (snapshot, montecarlo, output_dir), {})
+    if zones is not None:
+        jobs["BOQ (zones)"] = (_write_zones, (table, zones, output_dir), {})
+    if sources is not None:
+        from .helper_write import write_boq_sources
+        jobs["BOQ (sources)"] = (write_boq_sources, (sources,), {"output_dir": output_dir})
+    if columnar:
+        from .helper_columnar import write_columnar
+        jobs["Columnar"] = (write_columnar, (table,), {"output_dir": output_dir, "fmt": columnar})
+    for name in skip:
+        jobs.pop(name, None)
+    if not jobs:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(jobs), thread_name_prefix="output") as pool:
+        futures = {name: pool.submit(fn, *args, **kwargs) for name, (fn, args, kwargs) in jobs.items()}
+        if on_written is not None:
+            # Report every output when it is done, so a later writer error does not lose the finished ones
+            names = {future: name for name, future in futures.items()}
+            for future in as_completed(futures.values()):
+                if future.exception() is None:
+                    on_written(names[future], future.result())
+        # result() re-raises the first writer error after all the writers have finished
+        written: Dict[str, str] = {}
+        for name, future in futures.items():
+            result = future.result()
+            if isinstance(result, dict):
+                # Writers with several files (columnar export): one entry per file
+                for part, path in result.items():
+                    written[f"{name} ({part})"] = path
+            else:
+                written[name] = result
+        return written
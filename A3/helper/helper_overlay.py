@@ -0,0 +1,119 @@
+"""
+Cost overlay IFC:
+- Write a small standalone IFC with only the cost data (IfcCostSchedule, IfcCostItem, IfcCostValue and
+  the IfcRelNests/IfcRelAssignsToControl relations) instead of re-serializing the whole model
+- Reference the original elements by GlobalId through stub entities of the same class (GlobalId only)
+- Merge an overlay back into the original model for consumers who need a single file
+
+Write time and file size scale with the number of cost items and assigned elements, not with the model size.
+
+Functions:
+- write_cost_overlay: Write the overlay IFC from an ElementTable (the model can be already released)
+- merge_cost_overlay: Copy the cost entities of an overlay into the original model, resolving stubs by GlobalId
+
+Usage (merge): python -m helper.helper_overlay <model.ifc> <overlay.ifc> <merged.ifc> (any of them may be .ifczip)
+"""
+
+import os
+import sys
+from typing import Dict, List
+
+import ifcopenshell
+from ifcopenshell.guid import new as new_guid
+
+from .helper_cost import ensure_cost_schedule, add_or_get_cost_item, add_unit_cost_value
+from .helper_ifczip import open_ifc, write_ifc
+
+# Write the overlay IFC from an ElementTable; returns the output path.
+# Every cost item gets one IfcRelAssignsToControl relating the stubs of all its elements.
+def write_cost_overlay(table, output_path: str, *, schedule_name: str = "Price List", schema: str = None) -> str:
+    overlay = ifcopenshell.file(schema=schema or table.schema or "IFC4")
+    schedule = ensure_cost_schedule(overlay, schedule_name)
+
+    # Cost items and unit costs
+    items: List[object] = []
+    for rec in table.items:
+        item = add_or_get_cost_item(overlay, schedule, name=rec.description, identification=rec.code)
+        if rec.has_rate:
+            add_unit_cost_value(overlay, item, amount=rec.rate, cost_type="UNIT")
+        items.append(item)
+
+    # Element stubs (same class and GlobalId as in the original model), created once per element
+    stubs: Dict[int, object] = {}
+    related: Dict[int, List[object]] = {}
+    for row, item in zip(table.line_element, table.line_item):
+        stub = stubs.get(row)
+        if stub is None:
+            stub = overlay.create_entity(table.strings[table.ifc_class[row]], GlobalId=table.global_ids[row])
+            stubs[row] = stub
+        related.setdefault(item, []).append(stub)
+
+    for item, objects in related.items():
+        overlay.create_entity(
+            "IfcRelAssignsToControl",
+            GlobalId=new_guid(),
+            RelatedObjects=objects,
+            RelatingControl=items[item],
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    write_ifc(overlay, output_path)
+    return output_path
+
+# Copy the cost entities of an overlay into the original model and write the merged file.
+# Stubs are resolved by GlobalId in the original model; missing elements are reported and skipped.
+# Every path may be a .ifc or a .ifczip (helper_ifczip).
+def merge_cost_overlay(model_path: str, overlay_path: str, output_path: str) -> Dict[str, int]:
+    model = open_ifc(model_path)
+    overlay = open_ifc(overlay_path)
+
+    # Cost schedule, cost items and their cost values (copied with their forward references)
+    copied: Dict[int, object] = {}
+    for cls in ("IfcCostSchedule", "IfcCostItem"):
+        for inst in overlay.by_type(cls):
+            copied[inst.id()] = model.add(inst)
+
+    # Nesting of cost items under the schedule
+    for rel in overlay.by_type("IfcRelNests"):
+        if rel.RelatingObject.id() not in copied:
+            continue
+        model.create_entity(
+            "IfcRelNests",
+            GlobalId=rel.GlobalId,
+            RelatingObject=copied[rel.RelatingObject.id()],
+            RelatedObjects=[copied[o.id()] for o in rel.RelatedObjects if o.id() in copied],
+        )
+
+    # Assignments: cost items -> schedule (copied entities) and stubs -> original elements by GlobalId
+    assigned = 0
+    missing = 0
+    for rel in overlay.by_type("IfcRelAssignsToControl"):
+        control = copied.get(rel.RelatingControl.id())
+        if control is None:
+            continue
+        objects = []
+        for obj in rel.RelatedObjects or []:
+            if obj.id() in copied:
+                objects.append(copied[obj.id()])
+                continue
+            try:
+                objects.append(model.by_guid(obj.GlobalId))
+                assigned += 1
+            except RuntimeError:
+                missing += 1
+        if not objects:
+            continue
+        model.create_entity("IfcRelAssignsToControl", GlobalId=rel.GlobalId, RelatedObjects=objects, RelatingControl=control)
+
+    if missing:
+        print(f"[WARNING] {missing} overlay elements not found in {model_path}")
+
+    write_ifc(model, output_path)
+    return {"assigned": assigned, "missing": missing}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        raise SystemExit("Usage: python -m helper.helper_overlay <model.ifc> <overlay.ifc> <merged.ifc>")
+    stats = merge_cost_overlay(sys.argv[1], sys.argv[2], sys.argv[3])
+    print(f"Merged overlay into {os.path.abspath(sys.argv[3])}: {stats}")
@@ -0,0 +1,117 @@
+"""
+Pre-flight check of quantity completeness (IDS-style, before the estimate):
+- Collect the base quantities every element has in one pass over IfcRelDefinesByProperties
+  (IfcElementQuantity sets are inspected once, however many elements share them)
+- Match every element to the price list (memoized per IFC class and name) and look up the quantity
+  its unit needs (m -> length, m2 -> area, m3 -> volume, kg/g/ton -> mass, pcs -> none); mass needs
+  the volume and a density (price list Density column or material density, see get_material_densities)
+- Report coverage by IFC class and storey: elements, priced, missing quantities (by kind), coverage
+  (written by helper_write.write_preflight_report)
+
+Elements reported as missing are the ones that the estimate would price with the default quantity 1.0.
+
+Functions / classes:
+- quantity_kinds: Map element id -> set of base quantity kinds (LENGTH, AREA, VOLUME, HEIGHT) it has
+- PreflightReport: Coverage counts overall and per (class, storey) stratum, and the first missing GlobalIds
+- run_preflight: Check a model against a compiled price list
+"""
+
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, NamedTuple, Optional, Set, Tuple
+
+from .helper_estimate import CompiledPriceList
+from .helper_get import get_material_densities, get_required_quantity, get_storey_names
+
+# Base quantity kinds of one IfcElementQuantity (same rules as _get_base_quantities).
+def _set_kinds(qset) -> FrozenSet[str]:
+    kinds: Set[str] = set()
+    for q in getattr(qset, "Quantities", []) or []:
+        if q.is_a("IfcQuantityVolume"):
+            kinds.add("VOLUME")
+        elif q.is_a("IfcQuantityArea"):
+            kinds.add("AREA")
+        elif q.is_a("IfcQuantityLength"):
+            kinds.add("LENGTH")
+            if (getattr(q, "Name", "") or "").lower() == "height":
+                kinds.add("HEIGHT")
+    return frozenset(kinds)
+
+# Map element id -> base quantity kinds, in one pass over IfcRelDefinesByProperties.
+def quantity_kinds(model) -> Dict[int, Set[str]]:
+    kinds: Dict[int, Set[str]] = defaultdict(set)
+    per_set: Dict[int, FrozenSet[str]] = {}
+    for rel in model.by_type("IfcRelDefinesByProperties"):
+        pdef = rel.RelatingPropertyDefinition
+        if pdef is None or not pdef.is_a("IfcElementQuantity"):
+            continue
+        found = per_set.get(pdef.id())
+        if found is None:
+            found = per_set[pdef.id()] = _set_kinds(pdef)
+        for obj in rel.RelatedObjects or []:
+            kinds[obj.id()].update(found)
+    return kinds
+
+class PreflightReport(NamedTuple):
+    """
+    Quantity coverage of a model for a price list:
+    - strata: (IFC class, storey, elements, priced, missing, Counter of missing kinds) per stratum
+    - missing_examples: (GlobalId, IFC class, storey, needed kind) of the first missing elements
+    - coverage: share of the priced elements with the quantity their unit needs (1.0 when none is priced)
+    """
+
+    elements: int
+    priced: int
+    missing: int
+    missing_by_kind: Dict[str, int]
+    strata: Tuple[Tuple[str, str, int, int, int, Counter], ...]
+    missing_examples: Tuple[Tuple[str, str, str, str], ...]
+
+    @property
+    def coverage(self) -> float:
+        return 1.0 - self.missing / self.priced if self.priced else 1.0
+
+# Check every element: price list match (memoized), unit -> needed quantity kind, kind present or not.
+# Mass is present with a volume and a density (reported as MASS when either is missing).
+def run_preflight(model, price_list: CompiledPriceList, *, examples: int = 20) -> PreflightReport:
+    elements = model.by_type("IfcElement")
+    levels = get_storey_names(model, elements)
+    kinds = quantity_kinds(model)
+    densities: Optional[Dict[int, float]] = None
+
+    counts: Dict[Tuple[str, str], list] = defaultdict(lambda: [0, 0, 0, Counter()])
+    missing_by_kind: Counter = Counter()
+    missing_examples = []
+    priced = missing = 0
+    for e in elements:
+        cls = e.is_a()
+        key = (cls, levels[e.id()])
+        stratum = counts[key]
+        stratum[0] += 1
+        m = price_list.match(cls, getattr(e, "Name", "") or "")
+        if m is None:
+            continue
+        stratum[1] += 1
+        priced += 1
+        need = get_required_quantity(m.unit)
+        if need == "MASS":
+            if densities is None:
+                densities = get_material_densities(model)
+            if "VOLUME" in kinds.get(e.id(), ()) and (m.density or e.id() in densities):
+                continue
+        elif need is None or need in kinds.get(e.id(), ()):
+            continue
+        stratum[2] += 1
+        stratum[3][need] += 1
+        missing += 1
+        missing_by_kind[need] += 1
+        if len(missing_examples) < examples:
+            missing_examples.append((e.GlobalId, cls, key[1], need))
+
+    return PreflightReport(
+        elements=len(elements),
+        priced=priced,
+        missing=missing,
+        missing_by_kind=dict(missing_by_kind),
+        strata=tuple((k[0], k[1], *counts[k]) for k in sorted(counts)),
+        missing_examples=tuple(missing_examples),
+    )
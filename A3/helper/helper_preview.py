@@ -0,0 +1,148 @@
+"""
+Preview estimate on a stratified sample:
+- Group the elements in strata by IFC class and storey (one pass over the spatial containment relations)
+- Draw a seeded random sample in every stratum (proportional allocation, at least min_per_stratum elements)
+- Match and extract quantities only for the sampled elements, without modifying the model
+- Extrapolate quantity and amount per cost item with the stratified estimator and a margin of error
+  at the given confidence (normal approximation, finite population correction)
+
+Functions / classes:
+- PreviewItem: Extrapolated quantity and amount of one cost item with its margin
+- PreviewEstimate: Sample description, strata and extrapolated items and total
+- preview_estimate: Draw the sample and extrapolate the estimate
+"""
+
+import math
+import random
+from collections import defaultdict
+from statistics import NormalDist
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .helper_estimate import CompiledPriceList
+from .helper_get import QuantityProvider, get_storey_names
+
+class PreviewItem(NamedTuple):
+    """Extrapolated cost item: quantity and amount with the margin of error of the amount."""
+
+    code: str
+    description: str
+    unit: str
+    rate: float
+    quantity: float
+    amount: float
+    margin: float
+    sampled: int
+
+class PreviewEstimate(NamedTuple):
+    """
+    Stratified preview:
+    - strata: (IFC class, storey, elements, sampled) per stratum
+    - items: PreviewItem per cost item found in the sample (order of first match)
+    - total / total_margin: extrapolated grand total and its margin at the confidence level
+    - unmatched: extrapolated number of elements without a matching price list row
+    """
+
+    population: int
+    sample: int
+    confidence: float
+    seed: Optional[int]
+    strata: Tuple[Tuple[str, str, int, int], ...]
+    items: Tuple[PreviewItem, ...]
+    total: float
+    total_margin: float
+    unmatched: float
+
+# Sample size per stratum: proportional to its size, at least min_per_stratum (or the whole stratum).
+def _allocate(sizes: List[int], sample_size: int, min_per_stratum: int) -> List[int]:
+    population = sum(sizes) or 1
+    return [min(n, max(min_per_stratum, round(sample_size * n / population))) for n in sizes]
+
+# Draw the stratified sample, match and measure the sampled elements and extrapolate per cost item.
+# For every stratum h (N_h elements, n_h sampled) and item k, with y = element amount for k (0 otherwise):
+# T_k = sum_h N_h * mean_h(y), Var(T_k) = sum_h N_h^2 * (1 - n_h / N_h) * s_h^2(y) / n_h.
+def preview_estimate(
+    model,
+    price_list: CompiledPriceList,
+    *,
+    sample_size: int = 2000,
+    min_per_stratum: int = 2,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+) -> PreviewEstimate:
+    elements = model.by_type("IfcElement")
+    levels = get_storey_names(model, elements)
+
+    # Strata by (class, storey)
+    strata: Dict[Tuple[str, str], List[object]] = defaultdict(list)
+    for e in elements:
+        strata[(e.is_a(), levels[e.id()])].append(e)
+    keys = sorted(strata)
+    allocation = _allocate([len(strata[k]) for k in keys], sample_size, min_per_stratum)
+
+    provider = QuantityProvider(model, price_list.units.values())
+    rng = random.Random(seed)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2.0)
+
+    matches: Dict[str, object] = {}
+    quantity = defaultdict(float)
+    amount = defaultdict(float)
+    variance = defaultdict(float)
+    sampled = defaultdict(int)
+    total_variance = 0.0
+    unmatched = 0.0
+    for key, n_h in zip(keys, allocation):
+        members = strata[key]
+        big_n = len(members)
+        chosen = rng.sample(members, n_h) if n_h < big_n else members
+        fpc = 1.0 - n_h / big_n
+
+        # Per item sums of amount, squared amount and quantity over the sampled elements of the stratum
+        sum_y = defaultdict(float)
+        sum_y2 = defaultdict(float)
+        sum_q = defaultdict(float)
+        per_element: List[float] = []
+        for e in chosen:
+            m = price_list.match(key[0], getattr(e, "Name", "") or "")
+            if m is None:
+                per_element.append(0.0)
+                unmatched += big_n / n_h
+                continue
+            q = provider.quantity(e, m.unit, m.density)
+            q = float(q) if q is not None else 1.0
+            y = q * m.rate
+            matches.setdefault(m.code, m)
+            sum_y[m.code] += y
+            sum_y2[m.code] += y * y
+            sum_q[m.code] += q
+            sampled[m.code] += 1
+            per_element.append(y)
+
+        weight = big_n / n_h
+        for code in sum_y:
+            quantity[code] += weight * sum_q[code]
+            amount[code] += weight * sum_y[code]
+            if n_h > 1:
+                s2 = (sum_y2[code] - sum_y[code] ** 2 / n_h) / (n_h - 1)
+                variance[code] += big_n * big_n * fpc * max(s2, 0.0) / n_h
+        # Grand total: element amounts across all items
+        if n_h > 1:
+            mean = sum(per_element) / n_h
+            s2 = sum((y - mean) ** 2 for y in per_element) / (n_h - 1)
+            total_variance += big_n * big_n * fpc * s2 / n_h
+
+    items = tuple(
+        PreviewItem(m.code, m.description, m.unit, m.rate, quantity[code], amount[code],
+                    z * math.sqrt(variance[code]), sampled[code])
+        for code, m in matches.items()
+    )
+    return PreviewEstimate(
+        population=len(elements),
+        sample=sum(allocation),
+        confidence=confidence,
+        seed=seed,
+        strata=tuple((k[0], k[1], len(strata[k]), n) for k, n in zip(keys, allocation)),
+        items=items,
+        total=sum(amount.values()),
+        total_margin=z * math.sqrt(total_variance),
+        unmatched=unmatched,
+    )
@@ -0,0 +1,152 @@
+"""
+In-process queries over an estimation result (no IFC rescan, no re-walk of IfcRelAssignsToControl):
+- Index an ElementTable once: GlobalId -> row, row -> lines, item code -> item
+- Group the lines by (cost item, storey, type name, IFC class) with their quantity and elements, and index the
+  groups by every dimension, so a filtered sub-total only visits the groups that match the filters
+- Answer "what does this GlobalId cost", "which elements make up this cost item on this storey",
+  "which items are on this storey / for this type" from the indexes
+
+Functions / classes:
+- ElementCost: Cost lines and amount of one element
+- ItemTotal: Quantity, amount and element count of one cost item under the filters of a query
+- EstimateQuery: Forward and reverse indexes over an ElementTable with lookups and filtered sub-totals
+"""
+
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .helper_records import ElementTable, UNTYPED
+
+# Group key: (item index, level ref, type name ref or UNTYPED, IFC class ref)
+GroupKey = Tuple[int, int, int, int]
+
+class ElementCost(NamedTuple):
+    """One element: its attributes, its (code, quantity, amount) lines and its total amount."""
+
+    global_id: str
+    ifc_class: str
+    type_name: Optional[str]
+    level: str
+    lines: Tuple[Tuple[str, float, float], ...]
+    amount: float
+
+class ItemTotal(NamedTuple):
+    """Sub-total of one cost item over the elements matching the filters of a query."""
+
+    code: str
+    description: str
+    unit: str
+    rate: float
+    quantity: float
+    amount: float
+    elements: int
+
+class EstimateQuery:
+    """
+    Indexes over an estimation result (the ElementTable is not copied and must not change afterwards):
+    - element -> lines: cost(global_id), element(global_id)
+    - item -> elements, storey -> items, type -> items: elements(code, ...), totals(level=...), totals(type_name=...)
+    Filters are combined (code, level, type_name, ifc_class; None = any) and unknown values match nothing.
+    """
+
+    def __init__(self, table: ElementTable):
+        self.table = table
+        self._row_of: Dict[str, int] = {gid: row for row, gid in enumerate(table.global_ids)}
+        self._item_of: Dict[str, int] = {}
+        for item, ci in enumerate(table.items):
+            self._item_of.setdefault(ci.code, item)
+
+        # Lines per element row, and quantity / rows per group
+        self._lines_of: Dict[int, List[int]] = defaultdict(list)
+        quantity: Dict[GroupKey, float] = defaultdict(float)
+        rows: Dict[GroupKey, List[int]] = defaultdict(list)
+        levels, types, classes = table.level, table.type_name, table.ifc_class
+        for line, (row, item, q) in enumerate(zip(table.line_element, table.line_item, table.line_quantity)):
+            self._lines_of[row].append(line)
+            key = (item, levels[row], types[row] if table.type_class[row] != UNTYPED else UNTYPED, classes[row])
+            quantity[key] += q
+            rows[key].append(row)
+        self._quantity = dict(quantity)
+        self._rows = dict(rows)
+
+        # Groups per value of every dimension (item, level, type, class)
+        self._by: Tuple[Dict[int, List[GroupKey]], ...] = tuple(defaultdict(list) for _ in range(4))
+        for key in self._quantity:
+            for dim, value in enumerate(key):
+                self._by[dim][value].append(key)
+
+    # Reference of a filter value per dimension: None = no filter, -2 = value not in the result (matches nothing).
+    def _filters(self, code, level, type_name, ifc_class) -> Tuple[Optional[int], ...]:
+        strings = self.table.strings
+        refs = [None if code is None else self._item_of.get(code, -2)]
+        for value in (level, type_name, ifc_class):
+            ref = None if value is None else strings.get(value)
+            refs.append(None if value is None else (-2 if ref is None else ref))
+        return tuple(refs)
+
+    # Groups matching the filters: the smallest indexed candidate list, checked against the other filters.
+    def _groups(self, code=None, level=None, type_name=None, ifc_class=None) -> List[GroupKey]:
+        refs = self._filters(code, level, type_name, ifc_class)
+        given = [(dim, ref) for dim, ref in enumerate(refs) if ref is not None]
+        if not given:
+            return list(self._quantity)
+        candidates = min((self._by[dim].get(ref, ()) for dim, ref in given), key=len)
+        return [key for key in candidates if all(key[dim] == ref for dim, ref in given)]
+
+    # Cost of one element: its lines and amount, None if the GlobalId is not in the result.
+    def element(self, global_id: str) -> Optional[ElementCost]:
+        row = self._row_of.get(global_id)
+        if row is None:
+            return None
+        table = self.table
+        lines = []
+        for line in self._lines_of.get(row, ()):
+            ci = table.items[table.line_item[line]]
+            q = table.line_quantity[line]
+            lines.append((ci.code, q, q * ci.rate))
+        rec = table.element(row)
+        return ElementCost(global_id, rec.ifc_class, rec.type_name, rec.level, tuple(lines), sum(l[2] for l in lines))
+
+    # Total amount of one element (0.0 when unpriced or not in the result).
+    def cost(self, global_id: str) -> float:
+        found = self.element(global_id)
+        return found.amount if found else 0.0
+
+    # GlobalIds of the elements of a cost item, optionally on one storey / of one type name / IFC class.
+    def elements(self, code: str, *, level: Optional[str] = None, type_name: Optional[str] = None,
+                 ifc_class: Optional[str] = None) -> List[str]:
+        gids = self.table.global_ids
+        return [gids[row] for key in self._groups(code, level, type_name, ifc_class) for row in self._rows[key]]
+
+    # Sub-total per cost item (table order) over the elements matching the filters.
+    def totals(self, code: Optional[str] = None, *, level: Optional[str] = None, type_name: Optional[str] = None,
+               ifc_class: Optional[str] = None) -> List[ItemTotal]:
+        quantity: Dict[int, float] = defaultdict(float)
+        count: Dict[int, int] = defaultdict(int)
+        for key in self._groups(code, level, type_name, ifc_class):
+            quantity[key[0]] += self._quantity[key]
+            count[key[0]] += len(self._rows[key])
+        items = self.table.items
+        return [
+            ItemTotal(items[i].code, items[i].description, items[i].unit, items[i].rate,
+                      quantity[i], quantity[i] * items[i].rate, count[i])
+            for i in sorted(quantity)
+        ]
+
+    # Total amount over the elements matching the filters.
+    def amount(self, code: Optional[str] = None, *, level: Optional[str] = None, type_name: Optional[str] = None,
+               ifc_class: Optional[str] = None) -> float:
+        return sum(t.amount for t in self.totals(code, level=level, type_name=type_name, ifc_class=ifc_class))
+
+    # Distinct values present in the priced lines (for dashboards: filter choices).
+    def codes(self) -> List[str]:
+        return [self.table.items[i].code for i in sorted(self._by[0])]
+
+    def levels(self) -> List[str]:
+        return sorted(self.table.strings[ref] for ref in self._by[1])
+
+    def type_names(self) -> List[str]:
+        return sorted(self.table.strings[ref] for ref in self._by[2] if ref != UNTYPED)
+
+    def ifc_classes(self) -> List[str]:
+        return sorted(self.table.strings[ref] for ref in self._by[3])
@@ -4,16 +4,34 @@ Read/parse helpers:
 - Text normalization
 - EU decimal parsing
 
-Functions:
+Functions / classes:
+- PriceListFormat: CSV dialect and column names of a price list
 - read_price_list: Read CSV into a list of dicts using provided delimiter and encoding
 - normalize_text: Lowercase, strip diacritics, collapse spaces for consistent text comparison
 - parse_decimal_eu: Parse strings with EU style decimals (1.234,56 -> 1234.56)
 - build_price_index_by_text: Create a normalized index by description text for fast lookup
+- read_unit_map: Map Identification Code -> unit from the price list CSV (empty dict if not readable)
+- read_rate_map: Map Identification Code -> unit cost from the price list CSV
+- row_density: Mass density (kg/m3) of a price list row from its optional Density column, else None
+- read_density_map: Map Identification Code -> density from the price list CSV (empty dict if not readable)
 """
 from collections import defaultdict
 import csv
 import unicodedata
-from typing import Dict, List
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+class PriceListFormat(NamedTuple):
+    """CSV dialect and column names of a price list (defaults: the documented format)."""
+
+    delimiter: str = ";"
+    encoding: str = "cp1252"
+    ident_col: str = "Identification Code"
+    text_col: str = "Name"
+    ifc_match_col: str = "Ifc Match"
+    unit_cost_col: str = "IfcCostValue"
+    unit_col: str = "Unit"
+    density_col: str = "Density"
 
 # Read CSV into a list of dicts using provided delimiter and encoding.
 def read_price_list(csv_path: str, delimiter: str = ";", encoding: str = "cp1252") -> List[Dict[str, str]]:
@@ -50,3 +68,68 @@ def build_price_index_by_text(rows: List[Dict[str, str]], text_col: str = "Text"
         if key:
             idx[key] = r
     return idx
+
+
+# Map Identification Code -> unit from the price list CSV.
+# Accepts both "Identification Code"/"Identification" and "Unit"/"Measurement Unit" headers (or the given columns);
+# empty dict if not readable.
+def read_unit_map(csv_path: Optional[str], delimiter: str = ";", encoding: str = "cp1252", *,
+                  ident_col: str = "Identification Code", unit_col: str = "Unit") -> Dict[str, str]:
+    unit_map: Dict[str, str] = {}
+    if csv_path and os.path.isfile(csv_path):
+        try:
+            for r in read_price_list(csv_path, delimiter=delimiter, encoding=encoding):
+                ident = r.get(ident_col) or r.get("Identification Code") or r.get("Identification") or ""
+                unit = r.get(unit_col) or r.get("Unit") or r.get("Measurement Unit") or ""
+                if ident:
+                    unit_map[ident] = unit
+        except Exception:
+            pass
+    return unit_map
+
+# Map Identification Code -> unit cost (EU decimals) from the price list CSV; rows without a valid cost are skipped.
+def read_rate_map(
+    csv_path: str,
+    *,
+    ident_col: str = "Identification Code",
+    unit_cost_col: str = "IfcCostValue",
+    delimiter: str = ";",
+    encoding: str = "cp1252",
+) -> Dict[str, float]:
+    rate_map: Dict[str, float] = {}
+    for r in read_price_list(csv_path, delimiter=delimiter, encoding=encoding):
+        code = (r.get(ident_col) or "").strip()
+        uc_raw = r.get(unit_cost_col)
+        if not code or code in rate_map or uc_raw is None:
+            continue
+        try:
+            rate_map[code] = parse_decimal_eu(uc_raw)
+        except ValueError:
+            continue
+    return rate_map
+
+# Mass density (kg/m3, EU decimals) of a price list row from its optional Density column, else None.
+def row_density(row: Dict[str, str], density_col: str = "Density") -> Optional[float]:
+    raw = (row.get(density_col) or "").strip()
+    if not raw:
+        return None
+    try:
+        value = parse_decimal_eu(raw)
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+# Map Identification Code -> density (kg/m3) for the rows with a Density column value.
+def read_density_map(csv_path: Optional[str], delimiter: str = ";", encoding: str = "cp1252", *,
+                     ident_col: str = "Identification Code", density_col: str = "Density") -> Dict[str, float]:
+    density_map: Dict[str, float] = {}
+    if csv_path and os.path.isfile(csv_path):
+        try:
+            for r in read_price_list(csv_path, delimiter=delimiter, encoding=encoding):
+                ident = r.get(ident_col) or r.get("Identification Code") or r.get("Identification") or ""
+                density = row_density(r, density_col)
+                if ident and density is not None:
+                    density_map[ident] = density
+        except Exception:
+            pass
+    return density_map
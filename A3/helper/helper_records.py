@@ -0,0 +1,311 @@
+"""
+Compact element records:
+- Intern repeated strings (IFC class, type, storey) into one shared string table
+- Keep per-element and per-assignment columns in typed arrays instead of entity_instance objects
+- Extract everything the reports need in one walk, so the IFC model can be closed afterwards
+
+Functions / classes:
+- StringTable: Intern strings and hand out small integer references
+- CostItemRecord: __slots__ record of one cost item (code, description, unit, rate, whether it has a unit cost)
+- ElementRecord: __slots__ view of one element row (GlobalId, class, type, level)
+- PriceLineRecord: __slots__ record of one element priced by type name (see map_elements_to_price_rows_by_type_name)
+- ElementTable: Column store of elements, cost items and element -> cost item lines
+- extract_element_table: Walk the model once and fill an ElementTable
+- add_model_elements: Append IfcElements (class, type, level) to a table and return {entity id: row}
+- as_element_table: Return the argument if it is already an ElementTable, else extract one from the model
+- aggregate_boq: Sum quantities and amounts per cost item, optionally split by level
+- ItemInfo / ReportSnapshot: Immutable aggregated view of a table (what the reports print)
+- build_report_snapshot: Aggregate a table once into a ReportSnapshot
+- as_report_snapshot: Return the argument if it is already a ReportSnapshot, else build one (from a table or model)
+"""
+
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .helper_read import PriceListFormat, read_density_map, read_unit_map
+from .helper_get import (
+    get_cost_item_rate,
+    get_cost_item_unit,
+    get_level_name,
+    get_relating_type,
+    QuantityProvider,
+)
+
+UNTYPED = -1
+
+class StringTable:
+    """Interned strings: each distinct value is stored once and referenced by its index."""
+
+    __slots__ = ("values", "_index")
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, ref: int) -> str:
+        return self.values[ref]
+
+    # Return the reference of a string, adding it to the table if new.
+    def intern(self, value: str) -> int:
+        ref = self._index.get(value)
+        if ref is None:
+            ref = len(self.values)
+            self.values.append(value)
+            self._index[value] = ref
+        return ref
+
+    # Return the reference of a string already in the table, None if absent (the table is not changed).
+    def get(self, value: str) -> Optional[int]:
+        return self._index.get(value)
+
+    def __getstate__(self):
+        return self.values
+
+    def __setstate__(self, values):
+        self.values = list(values)
+        self._index = {v: i for i, v in enumerate(self.values)}
+
+class CostItemRecord:
+    """
+    One cost item: identification code, description, price list unit and unit rate.
+    has_rate is False when the price list cost did not parse (rate 0.0, no unit cost value in the IFC).
+    """
+
+    __slots__ = ("code", "description", "unit", "rate", "has_rate")
+
+    def __init__(self, code: str, description: str, unit: str, rate: float, has_rate: bool = True):
+        self.code = code
+        self.description = description
+        self.unit = unit
+        self.rate = rate
+        self.has_rate = has_rate
+
+class ElementRecord:
+    """Read-only view of one element row (strings resolved from the table)."""
+
+    __slots__ = ("global_id", "ifc_class", "type_class", "type_name", "level")
+
+    def __init__(self, global_id, ifc_class, type_class, type_name, level):
+        self.global_id = global_id
+        self.ifc_class = ifc_class
+        self.type_class = type_class
+        self.type_name = type_name
+        self.level = level
+
+class PriceLineRecord:
+    """One element priced through the price list text index (no entity or CSV row kept)."""
+
+    __slots__ = ("global_id", "type_name", "text", "unit", "quantity", "unit_cost", "line_total")
+
+    def __init__(self, global_id, type_name, text, unit, quantity, unit_cost):
+        self.global_id = global_id
+        self.type_name = type_name
+        self.text = text
+        self.unit = unit
+        self.quantity = quantity
+        self.unit_cost = unit_cost
+        self.line_total = quantity * unit_cost
+
+class ElementTable:
+    """
+    Column store of the estimation data:
+    - elements: GlobalId + string references (class, type class, type name, level) in int arrays
+    - items: one CostItemRecord per cost item, in IfcCostItem creation order
+    - lines: (element row, item index, quantity in the item unit) for every element -> cost item assignment
+    """
+
+    def __init__(self, schema: Optional[str] = None):
+        self.schema = schema
+        self.strings = StringTable()
+        # Elements
+        self.global_ids: List[str] = []
+        self.ifc_class = array("i")
+        self.type_class = array("i")
+        self.type_name = array("i")
+        self.level = array("i")
+        # Cost items
+        self.items: List[CostItemRecord] = []
+        # Assignment lines
+        self.line_element = array("i")
+        self.line_item = array("i")
+        self.line_quantity = array("d")
+
+    def __len__(self) -> int:
+        return len(self.global_ids)
+
+    # Append an element; type_class/type_name are None for untyped elements. Returns the row.
+    def add_element(self, global_id: str, ifc_class: str, type_class: Optional[str], type_name: Optional[str], level: str) -> int:
+        intern = self.strings.intern
+        self.global_ids.append(global_id)
+        self.ifc_class.append(intern(ifc_class))
+        self.type_class.append(intern(type_class) if type_class is not None else UNTYPED)
+        self.type_name.append(intern(type_name) if type_name is not None else UNTYPED)
+        self.level.append(intern(level))
+        return len(self.global_ids) - 1
+
+    # Append a cost item; returns its index. has_rate=False: the item has no unit cost value.
+    def add_item(self, code: str, description: str, unit: str, rate: float, has_rate: bool = True) -> int:
+        self.items.append(CostItemRecord(code, description, unit, float(rate), bool(has_rate)))
+        return len(self.items) - 1
+
+    # Append an element -> cost item line with the element quantity in the item unit.
+    def add_line(self, row: int, item: int, quantity: float) -> None:
+        self.line_element.append(row)
+        self.line_item.append(item)
+        self.line_quantity.append(float(quantity))
+
+    # Return a new table with the same elements (columns copied, string table shared) and no items or lines.
+    def copy_elements(self) -> "ElementTable":
+        other = ElementTable(schema=self.schema)
+        other.strings = self.strings
+        other.global_ids = list(self.global_ids)
+        other.ifc_class = array("i", self.ifc_class)
+        other.type_class = array("i", self.type_class)
+        other.type_name = array("i", self.type_name)
+        other.level = array("i", self.level)
+        return other
+
+    # Return the ElementRecord of a row.
+    def element(self, row: int) -> ElementRecord:
+        s = self.strings
+        tc = self.type_class[row]
+        return ElementRecord(
+            self.global_ids[row],
+            s[self.ifc_class[row]],
+            s[tc] if tc != UNTYPED else None,
+            s[self.type_name[row]] if tc != UNTYPED else None,
+            s[self.level[row]],
+        )
+
+    def __iter__(self) -> Iterator[ElementRecord]:
+        for row in range(len(self.global_ids)):
+            yield self.element(row)
+
+# Walk the model once and fill an ElementTable with everything the QTO/BOQ/JSON outputs need.
+# Units come from the price list CSV by Identification Code when available, else from the IfcCostValue.
+# Mass units use the Density of the price list row when given, else the material density of the element.
+# Missing quantities default to 1.0 (same rule as the reports).
+def extract_element_table(model, csv_path: Optional[str] = None,
+                          price_format: PriceListFormat = PriceListFormat()) -> ElementTable:
+    table = ElementTable(schema=model.schema)
+
+    # Elements: class, type and level
+    rows = add_model_elements(table, model.by_type("IfcElement"))
+
+    # Assignments: cost item -> elements
+    item_map = defaultdict(list)
+    for rel in model.by_type("IfcRelAssignsToControl"):
+        ci = getattr(rel, "RelatingControl", None)
+        if not ci or not ci.is_a("IfcCostItem"):
+            continue
+        for obj in rel.RelatedObjects or []:
+            if obj and obj.is_a("IfcElement"):
+                item_map[ci.id()].append(obj)
+
+    f = price_format
+    csv_unit_map = read_unit_map(csv_path, f.delimiter, f.encoding, ident_col=f.ident_col, unit_col=f.unit_col)
+    csv_density_map = read_density_map(csv_path, f.delimiter, f.encoding,
+                                       ident_col=f.ident_col, density_col=f.density_col)
+    quantities = QuantityProvider(model, csv_unit_map.values())
+    for cid, elems in sorted(item_map.items(), key=lambda x: x[0]):
+        ci = model[cid]
+        unit = get_cost_item_unit(ci, csv_unit_map) or "-"
+        density = csv_density_map.get(getattr(ci, "Identification", "") or "")
+        item = table.add_item(
+            getattr(ci, "Identification", "") or ci.GlobalId,
+            getattr(ci, "Name", "") or "(no name)",
+            unit,
+            get_cost_item_rate(ci),
+            has_rate=bool(getattr(ci, "CostValues", None)),
+        )
+        for e in elems:
+            q = quantities.quantity(e, unit, density)
+            if q is None:
+                q = 1.0
+            table.add_line(rows[e.id()], item, float(q))
+
+    return table
+
+# Append elements (class, type and level) to a table; returns {entity id: row}.
+def add_model_elements(table: ElementTable, elements) -> Dict[int, int]:
+    rows: Dict[int, int] = {}
+    for e in elements:
+        tobj = get_relating_type(e)
+        if tobj:
+            tclass, tname = tobj.is_a(), getattr(tobj, "Name", None) or "(unnamed type)"
+        else:
+            tclass, tname = None, None
+        rows[e.id()] = table.add_element(e.GlobalId, e.is_a(), tclass, tname, get_level_name(e))
+    return rows
+
+# Return the argument if it is already an ElementTable, else extract one from the model.
+def as_element_table(model_or_table, csv_path: Optional[str] = None) -> ElementTable:
+    if isinstance(model_or_table, ElementTable):
+        return model_or_table
+    return extract_element_table(model_or_table, csv_path=csv_path)
+
+# Sum quantities and amounts per cost item (items in table order), optionally split by level.
+# Returns a list of (item index, level or None, quantity, amount); levels are sorted by name within an item.
+def aggregate_boq(table: ElementTable, by_level: bool = False) -> List[Tuple[int, Optional[str], float, float]]:
+    qty = defaultdict(float)
+    levels = table.level
+    for row, item, q in zip(table.line_element, table.line_item, table.line_quantity):
+        key = (item, levels[row] if by_level else None)
+        qty[key] += q
+
+    out: List[Tuple[int, Optional[str], float, float]] = []
+    per_item = defaultdict(list)
+    for (item, lref), q in qty.items():
+        per_item[item].append((table.strings[lref] if lref is not None else None, q))
+    for item in range(len(table.items)):
+        rate = table.items[item].rate
+        for level, q in sorted(per_item.get(item, []), key=lambda x: (x[0] or "",)):
+            out.append((item, level, q, rate * q))
+    return out
+
+class ItemInfo(NamedTuple):
+    """Immutable cost item data of a ReportSnapshot."""
+
+    code: str
+    description: str
+    unit: str
+    rate: float
+
+class ReportSnapshot(NamedTuple):
+    """
+    Immutable aggregated view of an ElementTable, safe to share between threads:
+    - type_counts: (type class or None, type name or None, IFC class, level, count)
+    - boq_by_level / boq_totals: (item index, level or None, quantity, amount) as in aggregate_boq
+    """
+
+    total_elements: int
+    type_counts: Tuple[Tuple[Optional[str], Optional[str], str, str, int], ...]
+    items: Tuple[ItemInfo, ...]
+    boq_by_level: Tuple[Tuple[int, Optional[str], float, float], ...]
+    boq_totals: Tuple[Tuple[int, Optional[str], float, float], ...]
+
+# Aggregate a table once into a ReportSnapshot (counts per type/level, BOQ per item and per item/level).
+def build_report_snapshot(table: ElementTable) -> ReportSnapshot:
+    s = table.strings
+    counts = Counter(zip(table.type_class, table.type_name, table.ifc_class, table.level))
+    type_counts = tuple(
+        (s[tc] if tc != UNTYPED else None, s[tn] if tc != UNTYPED else None, s[base], s[lvl], c)
+        for (tc, tn, base, lvl), c in counts.items()
+    )
+    return ReportSnapshot(
+        total_elements=len(table),
+        type_counts=type_counts,
+        items=tuple(ItemInfo(i.code, i.description, i.unit, i.rate) for i in table.items),
+        boq_by_level=tuple(aggregate_boq(table, by_level=True)),
+        boq_totals=tuple(aggregate_boq(table)),
+    )
+
+# Return the argument if it is already a ReportSnapshot, else build one from an ElementTable or the model.
+def as_report_snapshot(model_or_table, csv_path: Optional[str] = None) -> ReportSnapshot:
+    if isinstance(model_or_table, ReportSnapshot):
+        return model_or_table
+    return build_report_snapshot(as_element_table(model_or_table, csv_path=csv_path))
@@ -0,0 +1,82 @@
+"""
+Class-aware scan planner for the element loops:
+- Expand IfcElement to its subtypes from the schema of the model (depth first, the order of by_type)
+- Keep the concrete classes named in the price list (optionally restricted to a class filter) and present
+  in the model; count the elements of the other classes instead of visiting them
+- Iterate only the planned classes (by_type without subtypes), in the same element order as
+  model.by_type("IfcElement"), so matching and cost item creation order are unchanged
+
+Price list classes are compared exactly with element.is_a(), as in the matching: classes the schema does not
+know, abstract classes and non-element classes can never match and are reported as unmatchable.
+
+Functions / classes:
+- ScanPlan: Classes to visit, skipped classes with their element counts and unmatchable price list classes
+- plan_element_scan: Plan the scan of a model for a set of price list classes
+- iter_planned_elements: Yield the elements of the planned classes in by_type("IfcElement") order
+"""
+
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import ifcopenshell
+import ifcopenshell.ifcopenshell_wrapper as wrapper
+
+class ScanPlan(NamedTuple):
+    """
+    Scan of the IfcElements of a model:
+    - classes / scanned: classes to visit (by_type order) and their number of elements
+    - skipped: (class, elements) of the element classes present in the model but not planned
+    - unmatchable: price list classes no element can have (unknown, abstract or not an IfcElement subtype)
+    """
+
+    classes: Tuple[str, ...]
+    scanned: int
+    skipped: Tuple[Tuple[str, int], ...]
+    unmatchable: Tuple[str, ...]
+
+    @property
+    def skipped_elements(self) -> int:
+        return sum(n for _, n in self.skipped)
+
+# Depth-first walk of an entity declaration and its subtypes (the order by_type returns instances in).
+def _subtypes(declaration) -> Iterator[object]:
+    yield declaration
+    for sub in declaration.subtypes():
+        yield from _subtypes(sub)
+
+# Plan the IfcElement scan of a model: the concrete classes of price_list_classes (intersected with
+# filter_classes when given) present in the model; every other element class present is counted as skipped.
+def plan_element_scan(model, price_list_classes: Iterable[str],
+                      filter_classes: Optional[Iterable[str]] = None) -> ScanPlan:
+    wanted = set(price_list_classes)
+    if filter_classes:
+        wanted &= set(filter_classes)
+    present = set(model.wrapped_data.types())
+
+    classes = []
+    scanned = 0
+    skipped = []
+    elements = set()
+    for declaration in _subtypes(wrapper.schema_by_name(model.schema).declaration_by_name("IfcElement")):
+        name = declaration.name()
+        if not declaration.is_abstract():
+            elements.add(name)
+        if name not in present:
+            continue
+        count = len(model.wrapped_data.by_type_excl_subtypes(name))
+        if name in wanted:
+            classes.append(name)
+            scanned += count
+        elif count:
+            skipped.append((name, count))
+
+    return ScanPlan(
+        classes=tuple(classes),
+        scanned=scanned,
+        skipped=tuple(sorted(skipped, key=lambda x: (-x[1], x[0]))),
+        unmatchable=tuple(sorted(wanted - elements)),
+    )
+
+# Yield the elements of the planned classes, in the order of model.by_type("IfcElement").
+def iter_planned_elements(model, plan: ScanPlan) -> Iterator[ifcopenshell.entity_instance]:
+    for name in plan.classes:
+        yield from model.by_type(name, include_subtypes=False)
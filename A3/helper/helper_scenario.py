@@ -0,0 +1,122 @@
+"""
+What-if price scenarios:
+- Reuse the quantities and cost item assignments of one estimate (matched once)
+- Evaluate N alternative price lists and/or escalation factors as one (items x scenarios) rate matrix:
+  amounts = quantities * rates, grand totals = quantities @ rates
+- Compare every scenario with the base estimate per item and in total (see write_boq_scenarios)
+
+Scenario specs (CLI --scenario=SPEC):
+- "prices_2026.csv" or "Name=prices_2026.csv": unit costs by Identification Code from another price list
+- "*1.05", "+5%", "-3%" or "Name=+5%": escalation factor on the base unit costs
+- "Name=prices_2026.csv*1.03" or "prices_2026.csv+3%": price list, then factor
+Items missing from a scenario price list keep the base unit cost (counted in ScenarioComparison.missing).
+
+Functions / classes:
+- Scenario: Name, optional rates by Identification Code and factor
+- parse_scenario: Parse one scenario spec (reads the price list, if any)
+- ScenarioComparison: Quantities, rate and amount matrices and grand totals of the base and every scenario
+- compare_scenarios: Build the rate matrix and evaluate all the scenarios at once
+"""
+
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .helper_read import read_rate_map
+from .helper_records import ItemInfo, as_report_snapshot
+
+_FACTOR = re.compile(r"^(?P<base>.*?)(?:\*(?P<mul>\d+(?:\.\d+)?)|(?P<pct>[+-]\d+(?:\.\d+)?)%)$")
+
+class Scenario(NamedTuple):
+    """Alternative prices: rates by Identification Code (None = base rates) times a factor."""
+
+    name: str
+    rates: Optional[Dict[str, float]]
+    factor: float = 1.0
+    source: str = ""
+
+# Parse one scenario spec ("[Name=]price_list.csv", "[Name=]*1.05", "[Name=]+5%", "[Name=]price_list.csv*1.03").
+def parse_scenario(spec: str, *, delimiter: str = ";", encoding: str = "cp1252",
+                   ident_col: str = "Identification Code", unit_cost_col: str = "IfcCostValue") -> Scenario:
+    name, sep, body = spec.partition("=")
+    if not sep:
+        name, body = "", spec
+    body = body.strip()
+
+    factor = 1.0
+    m = _FACTOR.match(body)
+    if m:
+        factor = float(m.group("mul")) if m.group("mul") else 1.0 + float(m.group("pct")) / 100.0
+        body = m.group("base").strip()
+
+    rates = None
+    if body:
+        if not os.path.isfile(body):
+            raise FileNotFoundError(f"Scenario price list not found: {body}")
+        rates = read_rate_map(body, ident_col=ident_col, unit_cost_col=unit_cost_col,
+                              delimiter=delimiter, encoding=encoding)
+
+    if not name:
+        name = os.path.splitext(os.path.basename(body))[0] if body else ""
+        if factor != 1.0:
+            name = f"{name} x{factor:g}".strip()
+    return Scenario(name.strip() or spec, rates, factor, spec.partition("=")[2] if sep else spec)
+
+class ScenarioComparison(NamedTuple):
+    """
+    Base estimate and scenarios side by side (column 0 = base, column s = scenarios[s - 1]):
+    - quantities: (items,) total quantity per cost item
+    - rates / amounts: (items, 1 + scenarios) unit costs and amounts
+    - totals: (1 + scenarios,) grand totals
+    - missing: per scenario, the number of items not found in its price list (base unit cost used)
+    """
+
+    scenarios: Tuple[Scenario, ...]
+    items: Tuple[ItemInfo, ...]
+    quantities: np.ndarray
+    rates: np.ndarray
+    amounts: np.ndarray
+    totals: np.ndarray
+    missing: Tuple[int, ...]
+
+    # Grand total differences of every scenario against the base.
+    def deltas(self) -> np.ndarray:
+        return self.totals[1:] - self.totals[0]
+
+# Evaluate all the scenarios on the quantities of one estimate (IFC model with csv_path, ElementTable or
+# ReportSnapshot). The rate matrix is built once; amounts and totals are two vectorized operations.
+def compare_scenarios(model, scenarios: Sequence[Scenario], csv_path: Optional[str] = None) -> ScenarioComparison:
+    snapshot = as_report_snapshot(model, csv_path=csv_path)
+    items = snapshot.items
+
+    # Quantity per cost item (items without lines keep 0)
+    quantities = np.zeros(len(items))
+    for item, _, qty, _ in snapshot.boq_totals:
+        quantities[item] = qty
+
+    base = np.array([ci.rate for ci in items], dtype=float)
+    rates = np.empty((len(items), 1 + len(scenarios)))
+    rates[:, 0] = base
+    missing: List[int] = []
+    for s, scenario in enumerate(scenarios, start=1):
+        if scenario.rates is None:
+            column, n_missing = base, 0
+        else:
+            column = np.array([scenario.rates.get(ci.code, np.nan) for ci in items], dtype=float)
+            gaps = np.isnan(column)
+            n_missing = int(gaps.sum())
+            column[gaps] = base[gaps]
+        rates[:, s] = column * scenario.factor
+        missing.append(n_missing)
+
+    return ScenarioComparison(
+        scenarios=tuple(scenarios),
+        items=items,
+        quantities=quantities,
+        rates=rates,
+        amounts=quantities[:, None] * rates,
+        totals=quantities @ rates,
+        missing=tuple(missing),
+    )
@@ -0,0 +1,349 @@
+"""
+Local estimation service (asyncio HTTP, JSON in/out):
+- Keep LRU caches of opened models (ModelIndex), compiled price lists (with their match memo) in memory,
+  so repeated estimates skip Python startup, ifcopenshell.open, CSV parsing and fuzzy matching
+- Run estimates on a thread pool behind a bounded request queue: a full queue answers 429 (backpressure)
+- Track jobs and expose their status; the cached models are never modified (helper_estimate)
+
+Endpoints:
+- POST /estimate   {"model", "price_list", "output_dir"?, "classes"?, "overlay"?, "wait"?} -> 202 {job} (200 with wait)
+                   price list format: any PriceListFormat field ("delimiter", "encoding", "ident_col", "text_col",
+                   "ifc_match_col", "unit_cost_col", "unit_col", "density_col"), defaults for the others
+- GET  /jobs       status of the recent jobs
+- GET  /jobs/<id>  status and result of a job
+- GET  /health     queue, workers and cache statistics
+- DELETE /cache    drop all the cached models and price lists
+
+Functions / classes:
+- LRUCache: Thread-safe LRU of loaded objects keyed by file identity (path, mtime, size)
+- Job: State of one estimate request
+- EstimationService: Queue, worker pool, caches and job registry
+- serve: Start the HTTP server and run until cancelled
+
+Usage: python -m helper.helper_service [--host 127.0.0.1] [--port 8765] [--workers 2] [--queue 16]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .helper_estimate import ModelIndex, compile_price_list, estimate_element_table
+from .helper_ifczip import open_ifc
+from .helper_JSON import json_items
+from .helper_read import PriceListFormat
+from .helper_records import build_report_snapshot
+
+MAX_BODY = 1 << 20
+
+# Identity of a file on disk: a changed file gets a new key and is loaded again.
+def _file_key(path: str) -> Tuple[str, int, int]:
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+# Price list format of a request: the PriceListFormat fields given in the body, the defaults for the others.
+def _price_format(params: Dict[str, object]) -> PriceListFormat:
+    return PriceListFormat(**{name: str(params[name]) for name in PriceListFormat._fields if params.get(name)})
+
+class LRUCache:
+    """Thread-safe LRU cache; concurrent loads of the same key wait for the first one."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[object, object]" = OrderedDict()
+        self._loading: Dict[object, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    # Return (value, hit) for a key, calling loader() once on a miss.
+    def get_or_load(self, key, loader: Callable[[], object]) -> Tuple[object, bool]:
+        while True:
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key], True
+                pending = self._loading.get(key)
+                if pending is None:
+                    pending = self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()
+        try:
+            value = loader()
+            with self._lock:
+                self._data[key] = value
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+            return value, False
+        finally:
+            with self._lock:
+                del self._loading[key]
+            pending.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+class Job:
+    """One estimate request: parameters, status (queued, running, done, failed), result or error, timings."""
+
+    def __init__(self, params: Dict[str, object]):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.status = "queued"
+        self.result: Optional[Dict[str, object]] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def to_dict(self, with_result: bool = True) -> Dict[str, object]:
+        out = {
+            "id": self.id,
+            "status": self.status,
+            "model": self.params.get("model"),
+            "price_list": self.params.get("price_list"),
+            "queued_s": round((self.started or time.time()) - self.created, 3),
+            "run_s": round((self.finished or time.time()) - self.started, 3) if self.started else None,
+        }
+        if self.error:
+            out["error"] = self.error
+        if with_result and self.result is not None:
+            out["result"] = self.result
+        return out
+
+class EstimationService:
+    """Bounded job queue served by worker tasks that run the estimates on a thread pool."""
+
+    def __init__(self, *, workers: int = 2, queue_size: int = 16, models: int = 4, price_lists: int = 8,
+                 history: int = 256):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.history = history
+        self.models = LRUCache(models)
+        self.price_lists = LRUCache(price_lists)
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.running = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="estimate")
+        self._tasks: List[asyncio.Task] = []
+
+    # Start the worker tasks (inside the running event loop).
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # Queue a job; raises asyncio.QueueFull when the queue is full.
+    def submit(self, params: Dict[str, object]) -> Job:
+        job = Job(params)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        # Keep only the most recent finished jobs
+        while len(self.jobs) > self.history:
+            oldest = next(iter(self.jobs.values()))
+            if oldest.status in ("queued", "running"):
+                break
+            self.jobs.popitem(last=False)
+        return job
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started = time.time()
+            self.running += 1
+            try:
+                job.result = await loop.run_in_executor(self._executor, self._run, job.params)
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+            finally:
+                self.running -= 1
+                job.finished = time.time()
+                job.done.set()
+                self._queue.task_done()
+
+    # Run one estimate in a worker thread: cached model and price list, match, aggregate, optional outputs.
+    def _run(self, params: Dict[str, object]) -> Dict[str, object]:
+        timings: Dict[str, float] = {}
+        t0 = time.perf_counter()
+        model_path = str(params["model"])
+        index, model_hit = self.models.get_or_load(
+            _file_key(model_path), lambda: ModelIndex(open_ifc(model_path))
+        )
+        timings["model"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        csv_path = str(params["price_list"])
+        price_format = _price_format(params)
+        price_list, price_hit = self.price_lists.get_or_load(
+            (_file_key(csv_path), price_format),
+            lambda: compile_price_list(csv_path, price_format=price_format),
+        )
+        timings["price_list"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        table = estimate_element_table(index, price_list, tuple(params.get("classes") or ()))
+        snapshot = build_report_snapshot(table)
+        timings["estimate"] = time.perf_counter() - t0
+
+        outputs: Dict[str, str] = {}
+        output_dir = params.get("output_dir")
+        if output_dir:
+            from .helper_output import write_outputs_concurrently
+
+            t0 = time.perf_counter()
+            overlay_path = None
+            if params.get("overlay"):
+                stem = os.path.splitext(os.path.basename(model_path))[0]
+                overlay_path = os.path.join(str(output_dir), f"{stem}_cost_overlay.ifc")
+            outputs = write_outputs_concurrently(table, str(output_dir), overlay_path=overlay_path,
+                                                 json_dir=str(output_dir))
+            timings["outputs"] = time.perf_counter() - t0
+
+        items = list(json_items(snapshot))
+        return {
+            "elements": snapshot.total_elements,
+            "lines": len(table.line_element),
+            "items": items,
+            "total": round(sum(amount for _, _, _, amount in snapshot.boq_totals), 2),
+            "outputs": {name: os.path.abspath(path) for name, path in outputs.items()},
+            "cache": {"model": "hit" if model_hit else "miss", "price_list": "hit" if price_hit else "miss"},
+            "timings": {k: round(v, 4) for k, v in timings.items()},
+        }
+
+    def health(self) -> Dict[str, object]:
+        return {
+            "status": "ok",
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "running": self.running,
+            "workers": self.workers,
+            "jobs": len(self.jobs),
+            "cache": {"models": self.models.stats(), "price_lists": self.price_lists.stats()},
+        }
+
+    # Route one request; returns (HTTP status, JSON body, extra headers).
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, object, Dict[str, str]]:
+        if method == "GET" and path == "/health":
+            return 200, self.health(), {}
+        if method == "GET" and path == "/jobs":
+            return 200, [j.to_dict(with_result=False) for j in reversed(self.jobs.values())], {}
+        if method == "GET" and path.startswith("/jobs/"):
+            job = self.jobs.get(path[len("/jobs/"):])
+            if job is None:
+                return 404, {"error": "unknown job"}, {}
+            return 200, job.to_dict(), {}
+        if method == "DELETE" and path == "/cache":
+            self.models.clear()
+            self.price_lists.clear()
+            return 200, self.health(), {}
+        if method == "POST" and path == "/estimate":
+            try:
+                params = json.loads(body or b"{}")
+            except ValueError as e:
+                return 400, {"error": f"invalid JSON: {e}"}, {}
+            if not isinstance(params, dict):
+                return 400, {"error": "expected a JSON object"}, {}
+            for key in ("model", "price_list"):
+                if not params.get(key) or not os.path.isfile(str(params[key])):
+                    return 400, {"error": f"'{key}' must be the path of an existing file"}, {}
+            try:
+                job = self.submit(params)
+            except asyncio.QueueFull:
+                return 429, {"error": "queue full, retry later", "queue_size": self.queue_size}, {"Retry-After": "1"}
+            if params.get("wait"):
+                await job.done.wait()
+                return (200 if job.status == "done" else 500), job.to_dict(), {}
+            return 202, job.to_dict(), {"Location": f"/jobs/{job.id}"}
+        return 404, {"error": f"no route for {method} {path}"}, {}
+
+    # asyncio stream handler: parse one HTTP/1.1 request, answer with JSON and close the connection.
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                raw = await reader.readline()
+                if not raw:
+                    return  # connection closed before sending a request
+                request_line = raw.decode("latin-1").split()
+                if len(request_line) < 2:
+                    raise ValueError("malformed request line")
+                method, path = request_line[0].upper(), request_line[1].split("?", 1)[0]
+                headers: Dict[str, str] = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    status, payload, extra = 413, {"error": "request body too large"}, {}
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload, extra = await self.handle(method, path, body)
+            except (ValueError, asyncio.IncompleteReadError) as e:
+                status, payload, extra = 400, {"error": str(e)}, {}
+
+            data = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+            head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", "Content-Type: application/json; charset=utf-8",
+                    f"Content-Length: {len(data)}", "Connection: close"]
+            head += [f"{k}: {v}" for k, v in extra.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+            await writer.drain()
+        finally:
+            # Every connection is closed, whatever happened while reading or answering the request
+            writer.close()
+
+# Start the HTTP server on host:port and serve until cancelled.
+async def serve(host: str = "127.0.0.1", port: int = 8765, **options) -> None:
+    service = EstimationService(**options)
+    service.start()
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    print(f"Estimation service listening on http://{host}:{port} "
+          f"(workers={service.workers}, queue={service.queue_size})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local estimation service keeping models and price lists warm.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="estimates running in parallel")
+    parser.add_argument("--queue", type=int, default=16, help="queued estimates before answering 429")
+    parser.add_argument("--models", type=int, default=4, help="opened models kept in memory")
+    parser.add_argument("--price-lists", type=int, default=8, help="compiled price lists kept in memory")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, queue_size=args.queue,
+                          models=args.models, price_lists=args.price_lists))
+    except KeyboardInterrupt:
+        pass
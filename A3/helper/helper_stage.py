@@ -0,0 +1,105 @@
+"""
+Stage monitoring:
+- Measure wall time and resident memory (RSS) of each pipeline stage
+- Sample RSS in a background thread so every stage gets its own peak, not the process high-water mark
+
+Functions / classes:
+- current_rss: Return the current resident set size of the process in bytes (None if not available)
+- peak_rss: Return the process peak resident set size in bytes (None if not available)
+- StageMonitor: Context manager per stage collecting time, RSS at end and peak RSS during the stage
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Return the current resident set size of the process in bytes (Linux /proc, else psutil if installed).
+def current_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+# Return the process peak resident set size in bytes (resource module, else psutil on Windows).
+def peak_rss() -> Optional[int]:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, in kilobytes on Linux
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        pass
+    try:
+        import psutil
+        return getattr(psutil.Process().memory_info(), "peak_wset", None)
+    except Exception:
+        return None
+
+def _mb(value: Optional[int]) -> str:
+    return f"{value / (1024 * 1024):.1f}" if value is not None else "n/a"
+
+class StageMonitor:
+    """Record wall time, end RSS and peak RSS (sampled every sample_interval seconds) per stage."""
+
+    def __init__(self, sample_interval: float = 0.05):
+        self.sample_interval = sample_interval
+        self.stages: List[Dict[str, object]] = []
+
+    # Measure the enclosed block as one stage.
+    @contextmanager
+    def stage(self, name: str):
+        start_rss = current_rss()
+        peak = [start_rss or 0]
+        stop = threading.Event()
+
+        def _sample():
+            while not stop.wait(self.sample_interval):
+                rss = current_rss()
+                if rss is not None and rss > peak[0]:
+                    peak[0] = rss
+
+        sampler = threading.Thread(target=_sample, name=f"rss-{name}", daemon=True)
+        sampler.start()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            stop.set()
+            sampler.join()
+            end_rss = current_rss()
+            if end_rss is not None and end_rss > peak[0]:
+                peak[0] = end_rss
+            self.stages.append(
+                {
+                    "stage": name,
+                    "seconds": elapsed,
+                    "rss_end": end_rss,
+                    "rss_peak": peak[0] if start_rss is not None else None,
+                }
+            )
+
+    # Add a stage measured elsewhere (e.g. import time taken before the monitor existed).
+    def record(self, name: str, seconds: float) -> None:
+        self.stages.append({"stage": name, "seconds": seconds, "rss_end": current_rss(), "rss_peak": None})
+
+    # Return the stage table as text lines (time in seconds, memory in MB).
+    def report(self) -> List[str]:
+        headers = ["Stage", "Time [s]", "RSS end [MB]", "Peak RSS [MB]"]
+        rows = [[s["stage"], f"{s['seconds']:.3f}", _mb(s["rss_end"]), _mb(s["rss_peak"])] for s in self.stages]
+        widths = [max(len(h), *(len(r[i]) for r in rows)) if rows else len(h) for i, h in enumerate(headers)]
+        lines = [" | ".join(f"{h:<{widths[i]}}" for i, h in enumerate(headers))]
+        lines.append("─┼─".join("─" * w for w in widths))
+        for r in rows:
+            lines.append(" | ".join(f"{c:<{widths[i]}}" for i, c in enumerate(r)))
+        lines.append(f"Process peak RSS [MB]: {_mb(peak_rss())}")
+        return lines
@@ -8,22 +8,76 @@ Functions:
 - _best_match: Fuzzy pick the best CSV row for an element by comparing names
 - build_cost_estimation_summary: Aggregate quantities and costs by (ident, name, unit, unit_cost)
 - write_cost_estimation_report: Write a simple text report; return (path, grand_total)
+- _column_widths: Compute column widths from an iterable of rows without keeping the rows
+- _iter_table_lines: Yield the lines of an aligned table for known column widths
 - _fmt_table: Format data as aligned text table with headers and separator lines
+- _stream_report: Write title, table rows (generator) and footer through a buffered file, line by line
 - write_qto_types_no_cost: Write QTO report grouped by IfcElementType and Level (no costs)
 - write_qto_types_no_cost_totals: Write QTO total-only report (count per type, no level split)
 - write_boq_report: Write BOQ report with lines split by Cost Item and Level
 - write_boq_report_totals: Write BOQ total-only report (one line per Cost Item, no level split)
-- _get_level_name: Return the IfcBuildingStorey name containing the element
+- write_qto_elements: Write the detailed per-element report (one row per element -> cost item line), streamed
+- write_boq_scenarios: Write the scenario comparison BOQ (per item amount and delta of every scenario, totals)
+- write_boq_montecarlo: Write the Monte Carlo BOQ (base amount, mean, P10/P50/P90 per item and in total)
+- write_boq_preview: Write the preview BOQ extrapolated from a stratified sample, with margins and strata
+- write_preflight_report: Write the quantity completeness report by IFC class and storey
+- _write_boq_grouped: Write a BOQ split by any group column (zone, source model)
+- write_boq_zones: Write the BOQ split by zone (see helper_zones)
+- write_boq_sources: Write the federated BOQ split by source model, with the duplicates per source
+- atomic_path: Yield a temporary path next to the target and rename it onto the target on success
+- atomic_write: Open a temporary file next to the target and rename it onto the target on success
+
+The QTO/BOQ writers accept the IFC model, an ElementTable (helper_records) extracted once from it,
+or its immutable ReportSnapshot; files are written atomically (temporary file + rename) and streamed
+row by row from generators, so memory does not grow with the report length.
 """
 
+import gzip
+import io
 import os
-import difflib
-from typing import Dict, List, Tuple
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
 from collections import defaultdict, Counter
 import datetime
 
-from .helper_read import read_price_list, parse_decimal_eu
-from .helper_get import get_quantity_for_unit
+from .helper_read import read_price_list, parse_decimal_eu, row_density
+from .helper_get import QuantityProvider
+from .helper_match import best_index
+from .helper_records import UNTYPED, as_report_snapshot
+
+# Buffer size of the report files (rows are written one by one through it).
+WRITE_BUFFER_SIZE = 1 << 20
+# Compression level of the gzip reports (6: zlib default, most of the ratio of level 9 at a fraction of the time)
+GZIP_LEVEL = 6
+
+# Yield a temporary path in the target directory (same extension) and rename it onto the target on success.
+# Readers never see partial outputs; on error the temporary file is removed.
+@contextmanager
+def atomic_path(out_path: str):
+    directory, name = os.path.split(os.path.abspath(out_path))
+    tmp_path = os.path.join(directory, f".{uuid.uuid4().hex[:8]}.{name}")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Open a temporary file next to the target and rename it onto the target on success.
+# compress=True writes a gzip stream (text mode) whose header carries the target name, not the temporary one.
+@contextmanager
+def atomic_write(out_path: str, mode: str = "w", encoding: str = "utf-8", buffering: int = -1, compress: bool = False):
+    with atomic_path(out_path) as tmp_path:
+        if not compress:
+            with open(tmp_path, mode, buffering=buffering, encoding=encoding if "b" not in mode else None) as f:
+                yield f
+            return
+        name = os.path.basename(out_path)
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(name[:-3] if name.endswith(".gz") else name, "wb", GZIP_LEVEL, raw) as gz:
+                with io.TextIOWrapper(io.BufferedWriter(gz, max(buffering, io.DEFAULT_BUFFER_SIZE)), encoding=encoding) as f:
+                    yield f
 
 # Format numbers with EU style (1.234,56).
 # Converts standard float format to European notation with dot as thousands separator
@@ -34,17 +88,12 @@ def _format_number_eu(value: float, decimals: int = 2) -> str:
     return s.replace(",", "X").replace(".", ",").replace("X", ".")
 
 # Fuzzy pick the best CSV row for an element by comparing names.
-# Uses difflib.SequenceMatcher for similarity scoring.
+# Uses difflib.SequenceMatcher for similarity scoring (helper_match.best_index, first row on ties).
 def _best_match(element_name: str, candidates: List[Dict[str, str]], name_col: str) -> Dict[str, str] | None:
     if not candidates:
         return None
     base = (element_name or "").strip().lower()
-    scores = [
-        (difflib.SequenceMatcher(None, base, (c.get(name_col) or "").strip().lower()).ratio(), c)
-        for c in candidates
-    ]
-    scores.sort(key=lambda x: x[0], reverse=True)
-    return scores[0][1] if scores else None
+    return candidates[best_index(base, [(c.get(name_col) or "").strip().lower() for c in candidates])]
 
 # Aggregate quantities and costs by (ident, name, unit, unit_cost).
 # Groups multiple elements with same price list item and sums quantities.
@@ -62,12 +111,14 @@ def build_cost_estimation_summary(
 ) -> Dict[str, object]:
     rows = read_price_list(csv_path, delimiter=delimiter, encoding=encoding)
 
-    # Index rows by IFC class for quick lookup
+    # Index rows by IFC class for quick lookup (rows without Ifc Match are never matched)
     by_class: Dict[str, List[Dict[str, str]]] = {}
     for r in rows:
-        cls = (r.get(ifc_match_col) or "").strip() or "IfcElement"
-        by_class.setdefault(cls, []).append(r)
+        cls = (r.get(ifc_match_col) or "").strip()
+        if cls:
+            by_class.setdefault(cls, []).append(r)
 
+    quantities = QuantityProvider(ifc_file, (r.get(unit_col) or "" for r in rows))
     agg: Dict[Tuple[str, str, str, float], Dict[str, object]] = {}
     scanned = 0
     matched = 0
@@ -86,7 +137,7 @@ def build_cost_estimation_summary(
         name = (match.get(text_col) or "").strip()
         unit = (match.get(unit_col) or "").strip()
 
-        qty = get_quantity_for_unit(el, unit)  # derive quantity from model by unit
+        qty = quantities.quantity(el, unit, row_density(match))  # derive quantity from model by unit
         if qty is None:
             continue
 
@@ -167,7 +218,7 @@ def write_cost_estimation_report(
     items: List[Dict[str, object]] = summary["items"]
     grand_total: float = float(summary["grand_total"])
 
-    with open(out_path, "w", encoding="utf-8") as f:
+    with atomic_write(out_path) as f:
         f.write("COST ESTIMATION\n")
         f.write("===============\n\n")
         f.write(f"Rows: {len(items)}\n\n")
@@ -185,366 +236,423 @@ def write_cost_estimation_report(
 
     return out_path, grand_total
 
-# Format data as aligned text table with headers and separator lines.
-# Creates human-readable table with automatic column width calculation.
-def _fmt_table(headers, rows, max_col_width=48):
+# Compute column widths (capped at max_col_width) from an iterable of rows without keeping the rows.
+def _column_widths(headers, rows, max_col_width=48):
     widths = [len(h) for h in headers]
     for r in rows:
         for i, cell in enumerate(r):
             widths[i] = min(max(widths[i], len(str(cell))), max_col_width)
+    return widths
+
+# Yield the lines of an aligned table (header, separator, one line per row) for known column widths.
+def _iter_table_lines(headers, rows, widths):
     line_sep = "─"
-    header_line = " | ".join(f"{h:<{widths[i]}}" for i, h in enumerate(headers))
-    sep = "─┼─".join(line_sep * widths[i] for i in range(len(headers)))
-    out = [header_line, sep]
+    yield " | ".join(f"{h:<{widths[i]}}" for i, h in enumerate(headers))
+    yield "─┼─".join(line_sep * widths[i] for i in range(len(headers)))
     for r in rows:
-        out.append(" | ".join(f"{str(cell):<{widths[i]}}" for i, cell in enumerate(r)))
-    return out
+        yield " | ".join(f"{str(cell):<{widths[i]}}" for i, cell in enumerate(r))
+
+# Format data as aligned text table with headers and separator lines.
+# Creates human-readable table with automatic column width calculation.
+def _fmt_table(headers, rows, max_col_width=48):
+    return list(_iter_table_lines(headers, rows, _column_widths(headers, rows, max_col_width)))
+
+# Write lines separated by newlines (no trailing newline) through the file buffer, one line at a time.
+def _write_lines(f, lines) -> None:
+    first = True
+    for line in lines:
+        if not first:
+            f.write("\n")
+        f.write(line)
+        first = False
+
+# Write a report as a stream: title lines, table rows produced by rows() and footer lines produced by footer().
+# rows is a generator function called twice (column widths, then writing), so no row list is ever built;
+# widths can be passed directly when they are known from aggregated metadata.
+def _stream_report(out_path, title_lines, headers, rows, footer, widths=None, compress=False) -> str:
+    if widths is None:
+        widths = _column_widths(headers, rows())
+
+    def _lines():
+        yield from title_lines
+        yield from _iter_table_lines(headers, rows(), widths)
+        yield from footer()
+
+    with atomic_write(out_path, buffering=WRITE_BUFFER_SIZE, compress=compress) as f:
+        _write_lines(f, _lines())
+    return out_path
 
 # Write QTO report grouped by IfcElementType and Level (no costs).
 # Table shows subtotals per type and grand total.
+# Accepts the IFC model, an ElementTable or a ReportSnapshot.
 def write_qto_types_no_cost(model, output_dir="output", filename="QTO.txt"):
     os.makedirs(output_dir, exist_ok=True)
     out_path = os.path.join(output_dir, filename)
-
-    def _get_type(e):
-        if getattr(e, "IsTypedBy", None):
-            for rel in e.IsTypedBy:
-                if rel and rel.is_a("IfcRelDefinesByType") and rel.RelatingType:
-                    return rel.RelatingType
-        for rel in getattr(e, "IsDefinedBy", []) or []:
-            if rel and rel.is_a("IfcRelDefinesByType") and rel.RelatingType:
-                return rel.RelatingType
-        return None
+    snapshot = as_report_snapshot(model)
 
     # Aggregation structures
     type_level_counts = defaultdict(lambda: defaultdict(int))
     untyped_level_counts = defaultdict(lambda: defaultdict(int))
-
-    total = 0
-    for e in model.by_type("IfcElement"):
-        total += 1
-        level = _get_level_name(e)
-        tobj = _get_type(e)
-        if tobj:
-            tclass = tobj.is_a()
-            tname = getattr(tobj, "Name", None) or "(unnamed type)"
-            type_level_counts[(tclass, tname)][level] += 1
+    for tclass, tname, base, lvl, c in snapshot.type_counts:
+        if tclass is not None:
+            type_level_counts[(tclass, tname)][lvl] += c
         else:
-            untyped_level_counts[e.is_a()][level] += 1
-
-    # Build table rows
-    rows = []
-    index = 1
-    for (tclass, tname) in sorted(type_level_counts.keys(), key=lambda k: (k[0], k[1])):
-        level_map = type_level_counts[(tclass, tname)]
-        ttotal = sum(level_map.values())
-        for lvl, c in sorted(level_map.items(), key=lambda x: (x[0] or "",)):
-            rows.append([index, tclass, tname, lvl, c])
-        rows.append(["", "", "Subtotal", f"{tclass}/{tname}", ttotal])
-        index += 1
-
-    if untyped_level_counts:
+            untyped_level_counts[base][lvl] += c
+    total = snapshot.total_elements
+
+    # Table rows
+    def rows():
+        index = 1
+        for (tclass, tname) in sorted(type_level_counts.keys(), key=lambda k: (k[0], k[1])):
+            level_map = type_level_counts[(tclass, tname)]
+            ttotal = sum(level_map.values())
+            for lvl, c in sorted(level_map.items(), key=lambda x: (x[0] or "",)):
+                yield [index, tclass, tname, lvl, c]
+            yield ["", "", "Subtotal", f"{tclass}/{tname}", ttotal]
+            index += 1
+
         for base in sorted(untyped_level_counts.keys()):
             level_map = untyped_level_counts[base]
             btotal = sum(level_map.values())
             for lvl, c in sorted(level_map.items(), key=lambda x: (x[0] or "",)):
-                rows.append(["", base, "(untyped)", lvl, c])
-            rows.append(["", "", "Subtotal", base, btotal])
+                yield ["", base, "(untyped)", lvl, c]
+            yield ["", "", "Subtotal", base, btotal]
 
     headers = ["#", "IfcTypeClass", "Type Name", "Level", "Count"]
-    table_lines = _fmt_table(headers, rows)
-
     today = datetime.date.today().isoformat()
-    lines = []
-    lines.append("Quantity Take Off (QTO)")
-    lines.append(f"Date: {today}")
-    lines.append(f"Total Elements: {total}")
-    lines.append("")
-    lines.extend(table_lines)
-    lines.append("")
-    lines.append(f"TOTAL COUNT = {total}")
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-    return out_path
+    title = ["Quantity Take Off (QTO)", f"Date: {today}", f"Total Elements: {total}", ""]
+    return _stream_report(out_path, title, headers, rows, lambda: ["", f"TOTAL COUNT = {total}"])
 
 # Write QTO total-only report (count per type, no level split).
 # Provides aggregate counts per IfcTypeObject without level breakdown.
 def write_qto_types_no_cost_totals(model, output_dir="output", filename="QTO_total.txt"):
     os.makedirs(output_dir, exist_ok=True)
     out_path = os.path.join(output_dir, filename)
-
-    def _get_type(e):
-        if getattr(e, "IsTypedBy", None):
-            for rel in e.IsTypedBy:
-                if rel and rel.is_a("IfcRelDefinesByType") and rel.RelatingType:
-                    return rel.RelatingType
-        for rel in getattr(e, "IsDefinedBy", []) or []:
-            if rel and rel.is_a("IfcRelDefinesByType") and rel.RelatingType:
-                return rel.RelatingType
-        return None
+    snapshot = as_report_snapshot(model)
 
     counts = Counter()
     untyped = Counter()
-    total = 0
-
-    for e in model.by_type("IfcElement"):
-        total += 1
-        tobj = _get_type(e)
-        if tobj:
-            tclass = tobj.is_a()
-            tname = getattr(tobj, "Name", None) or "(unnamed type)"
-            counts[(tclass, tname)] += 1
+    for tclass, tname, base, _, c in snapshot.type_counts:
+        if tclass is not None:
+            counts[(tclass, tname)] += c
         else:
-            untyped[e.is_a()] += 1
+            untyped[base] += c
+    total = snapshot.total_elements
 
-    rows = []
-    idx = 1
-    for (tclass, tname), c in sorted(counts.items(), key=lambda x: (x[0][0], x[0][1])):
-        rows.append([idx, tclass, tname, c])
-        idx += 1
-    for base, c in sorted(untyped.items(), key=lambda x: (x[0],)):
-        rows.append(["", base, "(untyped)", c])
+    def rows():
+        idx = 1
+        for (tclass, tname), c in sorted(counts.items(), key=lambda x: (x[0][0], x[0][1])):
+            yield [idx, tclass, tname, c]
+            idx += 1
+        for base, c in sorted(untyped.items(), key=lambda x: (x[0],)):
+            yield ["", base, "(untyped)", c]
 
     headers = ["#", "IfcTypeClass", "Type Name", "Count"]
-    table_lines = _fmt_table(headers, rows)
-
     today = datetime.date.today().isoformat()
-    lines = []
-    lines.append("QUANTITY TAKE OFF (QTO) – TOTALS ONLY")
-    lines.append(f"Date: {today}")
-    lines.append(f"Total Elements: {total}")
-    lines.append("")
-    lines.extend(table_lines)
-    lines.append("")
-    lines.append(f"TOTAL COUNT = {total}")
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-    return out_path
+    title = ["QUANTITY TAKE OFF (QTO) – TOTALS ONLY", f"Date: {today}", f"Total Elements: {total}", ""]
+    return _stream_report(out_path, title, headers, rows, lambda: ["", f"TOTAL COUNT = {total}"])
 
 # Write BOQ report with lines split by Cost Item and Level.
 # Provides per-item total and grand total with level breakdown.
 # Columns: Item, Description, Unit, Level, Qty, Rate, Amount.
+# Accepts the IFC model (csv_path gives the units), an ElementTable or a ReportSnapshot.
 def write_boq_report(model, output_dir="output", filename="BOQ.txt", csv_path=None) -> str:
     os.makedirs(output_dir, exist_ok=True)
     out_path = os.path.join(output_dir, filename)
+    snapshot = as_report_snapshot(model, csv_path=csv_path)
+    totals = {"grand": 0.0}
 
-    # CSV units
-    csv_unit_map = {}
-    if csv_path and os.path.isfile(csv_path):
-        try:
-            from .helper_read import read_price_list
-            rows_csv = read_price_list(csv_path, delimiter=";", encoding="cp1252")
-            for r in rows_csv:
-                ident = r.get("Identification Code") or r.get("Identification") or ""
-                unit = r.get("Unit") or r.get("Measurement Unit") or ""
-                if ident:
-                    csv_unit_map[ident] = unit
-        except Exception:
-            pass
+    def rows():
+        grand_total = 0.0
+        item_total = 0.0
+        current = None
+        for item, lvl, qty, amount in snapshot.boq_by_level:
+            if current is not None and item != current:
+                # Item subtotal line
+                yield ["", "Item Subtotal", "", "", "", "", f"{item_total:.2f}"]
+                grand_total += item_total
+                item_total = 0.0
+            current = item
+            ci = snapshot.items[item]
+            item_total += amount
+            yield [ci.code, ci.description, ci.unit or "-", lvl,
+                   f"{qty:.4f}".replace('.', ','),  # ✅ Virgola per qty
+                   f"{ci.rate:.2f}".replace('.', ','),  # ✅ Virgola per rate
+                   f"{amount:.2f}".replace('.', ',')]  # ✅ Virgola per amount
+        if current is not None:
+            yield ["", "Item Subtotal", "", "", "", "", f"{item_total:.2f}"]
+            grand_total += item_total
+        totals["grand"] = grand_total
 
-    # Assignments
-    item_map = defaultdict(list)
-    for rel in model.by_type("IfcRelAssignsToControl"):
-        ci = getattr(rel, "RelatingControl", None)
-        if not ci or not ci.is_a("IfcCostItem"):
-            continue
-        for obj in rel.RelatedObjects or []:
-            if obj and obj.is_a("IfcElement"):
-                item_map[ci.id()].append(obj)
-
-    def _unit_cost(ci):
-        vals = getattr(ci, "CostValues", None) or []
-        if not vals:
-            return 0.0
-        v = vals[0].AppliedValue
-        try:
-            return float(getattr(v, "wrappedValue", v))
-        except Exception:
-            s = str(v)
-            if "(" in s and ")" in s:
-                try:
-                    return float(s.split("(")[1].split(")")[0])
-                except Exception:
-                    return 0.0
-        return 0.0
-
-    def _unit(ci):
-        ident = getattr(ci, "Identification", "") or ""
-        if ident in csv_unit_map:
-            return csv_unit_map[ident]
-        vals = getattr(ci, "CostValues", None) or []
-        if vals:
-            u = getattr(vals[0], "Unit", None)
-            return getattr(u, "Name", "") if u else "-"
-        return "-"
-
-    from helper.helper_get import get_quantity_for_unit
-
-    rows = []
-    grand_total = 0.0
+    headers = ["Item", "Description", "Unit", "Level", "Quantity", "Unit Cost", "Total Amount"]
+    today = datetime.date.today().isoformat()
+    title = ["BILL OF QUANTITIES (BOQ)", f"Date: {today}", ""]
+    return _stream_report(out_path, title, headers, rows, lambda: ["", f"TOTAL: {totals['grand']:.2f}"])
 
-    for cid, elems in sorted(item_map.items(), key=lambda x: x[0]):
-        ci = model[cid]
-        ident = getattr(ci, "Identification", "") or ci.GlobalId
-        descr = getattr(ci, "Name", "") or "(no name)"
-        unit = _unit(ci) or "-"
-        rate = _unit_cost(ci)
-
-        # Level aggregation
-        level_qty = defaultdict(float)
-        for e in elems:
-            lvl = _get_level_name(e)
-            q = get_quantity_for_unit(e, unit, model=model)  # ✅ Aggiungi model=model
-            if q is None:
-                q = 1.0
-            level_qty[lvl] += float(q)
+# Write a BOQ split by any group (zone, source model...): rows (item index, group, quantity, amount) grouped by item,
+# same layout as write_boq_report with the group column instead of the level; notes are printed after the total.
+def _write_boq_grouped(table, rows_by_group, out_path: str, group: str, title: str, notes: Sequence[str] = ()) -> str:
+    totals = {"grand": 0.0}
 
+    def rows():
+        grand_total = 0.0
         item_total = 0.0
-        for lvl, qty in sorted(level_qty.items(), key=lambda x: (x[0] or "",)):
-            amount = rate * qty
+        current = None
+        for item, zone, qty, amount in rows_by_group:
+            if current is not None and item != current:
+                yield ["", "Item Subtotal", "", "", "", "", f"{item_total:.2f}"]
+                grand_total += item_total
+                item_total = 0.0
+            current = item
+            ci = table.items[item]
             item_total += amount
-            rows.append([ident, descr, unit, lvl, 
-                        f"{qty:.4f}".replace('.', ','),  # ✅ Virgola per qty
-                        f"{rate:.2f}".replace('.', ','),  # ✅ Virgola per rate
-                        f"{amount:.2f}".replace('.', ',')])  # ✅ Virgola per amount
-        grand_total += item_total
-        # Item subtotal line
-        rows.append(["", "Item Subtotal", "", "", "", "", f"{item_total:.2f}"])
+            yield [ci.code, ci.description, ci.unit or "-", zone,
+                   f"{qty:.4f}".replace('.', ','),
+                   f"{ci.rate:.2f}".replace('.', ','),
+                   f"{amount:.2f}".replace('.', ',')]
+        if current is not None:
+            yield ["", "Item Subtotal", "", "", "", "", f"{item_total:.2f}"]
+            grand_total += item_total
+        totals["grand"] = grand_total
+
+    headers = ["Item", "Description", "Unit", group, "Quantity", "Unit Cost", "Total Amount"]
+    today = datetime.date.today().isoformat()
+    title_lines = [title, f"Date: {today}", ""]
+    return _stream_report(out_path, title_lines, headers, rows,
+                          lambda: ["", f"TOTAL: {totals['grand']:.2f}", *(["", *notes] if notes else [])])
 
-    headers = ["Item", "Description", "Unit", "Level", "Quantity", "Unit Cost", "Total Amount"]
-    table_lines = _fmt_table(headers, rows)
+# Write the BOQ split by zone: rows (item index, zone, quantity, amount) from aggregate_boq_by_zone (helper_zones).
+def write_boq_zones(table, rows_by_zone, output_dir="output", filename="BOQ_zones.txt") -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    return _write_boq_grouped(table, rows_by_zone, os.path.join(output_dir, filename), "Zone",
+                              "BILL OF QUANTITIES (BOQ) – BY ZONE")
 
-    today = datetime.date.today().isoformat()
-    lines = []
-    lines.append("BILL OF QUANTITIES (BOQ)")
-    lines.append(f"Date: {today}")
-    lines.append("")
-    lines.extend(table_lines)
-    lines.append("")
-    lines.append(f"TOTAL: {grand_total:.2f}")
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-    return out_path
+# Write the merged BOQ of a federation (helper_federation.FederationResult) split by source model,
+# with the elements read and the duplicates dropped per source.
+def write_boq_sources(result, output_dir="output", filename="BOQ_sources.txt") -> str:
+    from .helper_federation import aggregate_boq_by_source
+
+    os.makedirs(output_dir, exist_ok=True)
+    notes = [f"Duplicates by GlobalId (policy: {result.policy}), {result.conflicts} priced differently:"]
+    notes += _fmt_table(
+        ["Source", "Elements", "Duplicates dropped", "Merged"],
+        [[name, n, d, n - d] for name, n, d in zip(result.sources, result.elements, result.duplicates)],
+    )
+    return _write_boq_grouped(result.table, aggregate_boq_by_source(result), os.path.join(output_dir, filename),
+                              "Source", "BILL OF QUANTITIES (BOQ) – BY SOURCE MODEL", notes)
 
 # Write BOQ total-only report (one line per Cost Item, no level split).
 # Provides single aggregate line per cost item with total quantity and amount.
 def write_boq_report_totals(model, output_dir="output", filename="BOQ_total.txt", csv_path=None):
     os.makedirs(output_dir, exist_ok=True)
     out_path = os.path.join(output_dir, filename)
+    snapshot = as_report_snapshot(model, csv_path=csv_path)
+    totals = {"grand": 0.0}
 
-    # CSV units map
-    csv_unit_map = {}
-    if csv_path and os.path.isfile(csv_path):
-        try:
-            from .helper_read import read_price_list
-            rows_csv = read_price_list(csv_path, delimiter=";", encoding="cp1252")
-            for r in rows_csv:
-                ident = r.get("Identification Code") or r.get("Identification") or ""
-                unit = r.get("Unit") or r.get("Measurement Unit") or ""
-                if ident:
-                    csv_unit_map[ident] = unit
-        except Exception:
-            pass
+    def rows():
+        grand_total = 0.0
+        for item, _, qty_sum, amount in snapshot.boq_totals:
+            ci = snapshot.items[item]
+            grand_total += amount
+            yield [ci.code, ci.description, ci.unit or "-", f"{qty_sum:.4f}", f"{ci.rate:.2f}", f"{amount:.2f}"]
+        totals["grand"] = grand_total
 
-    # Assignments: cost item -> elements
-    item_map = defaultdict(list)
-    for rel in model.by_type("IfcRelAssignsToControl"):
-        ci = getattr(rel, "RelatingControl", None)
-        if not ci or not ci.is_a("IfcCostItem"):
-            continue
-        for obj in rel.RelatedObjects or []:
-            if obj and obj.is_a("IfcElement"):
-                item_map[ci.id()].append(obj)
-
-    def _unit_cost(ci):
-        vals = getattr(ci, "CostValues", None) or []
-        if not vals:
-            return 0.0
-        v = vals[0].AppliedValue
-        try:
-            return float(getattr(v, "wrappedValue", v))
-        except Exception:
-            s = str(v)
-            if "(" in s and ")" in s:
-                try:
-                    return float(s.split("(")[1].split(")")[0])
-                except Exception:
-                    return 0.0
-        return 0.0
-
-    def _unit(ci):
-        ident = getattr(ci, "Identification", "") or ""
-        if ident in csv_unit_map:
-            return csv_unit_map[ident]
-        vals = getattr(ci, "CostValues", None) or []
-        if vals:
-            u = getattr(vals[0], "Unit", None)
-            return getattr(u, "Name", "") if u else "-"
-        return "-"
-
-    from helper.helper_get import get_quantity_for_unit
-
-    rows = []
-    grand_total = 0.0
+    headers = ["Item", "Description", "Unit", "Quantity", "Unit Cost", "Total Amount"]
+    today = datetime.date.today().isoformat()
+    title = ["BILL OF QUANTITIES (BOQ) – TOTALS ONLY", f"Date: {today}", ""]
+    return _stream_report(out_path, title, headers, rows, lambda: ["", f"TOTAL: {totals['grand']:.2f}"])
+
+# Write the detailed per-element report: one row per element -> cost item line, then the unassigned elements.
+# Needs the ElementTable (per-element data). Column widths come from the string table and numeric maxima,
+# rows are generated from the table arrays and streamed: memory stays constant regardless of the row count.
+# compress=True writes QTO_elements.txt.gz through a streaming gzip writer.
+def write_qto_elements(table, output_dir="output", filename="QTO_elements.txt", compress=False) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, filename)
+    if compress and not out_path.endswith(".gz"):
+        out_path += ".gz"
+    s = table.strings
+    items = table.items
+
+    # Column widths from aggregated metadata (no row is formatted twice)
+    def _max_len(values, default=0):
+        return max((len(str(v)) for v in values), default=default)
+
+    used_types = set(table.type_name)
+    max_amount = max((q * items[i].rate for i, q in zip(table.line_item, table.line_quantity)), default=0.0)
+    max_qty = max(table.line_quantity, default=0.0)
+    headers = ["#", "GlobalId", "IfcClass", "Type Name", "Level", "Item", "Unit", "Quantity", "Unit Cost", "Amount"]
+    metadata = [
+        len(str(len(table.line_element) + len(table))),
+        _max_len(table.global_ids[:1], 22),
+        _max_len(s[r] for r in set(table.ifc_class)),
+        max(_max_len(s[r] for r in used_types if r != UNTYPED), len("(untyped)")),
+        _max_len(s[r] for r in set(table.level)),
+        _max_len(i.code for i in items),
+        _max_len(i.unit or "-" for i in items),
+        len(f"{max_qty:.4f}"),
+        _max_len(f"{i.rate:.2f}" for i in items),
+        len(f"{max_amount:.2f}"),
+    ]
+    widths = [min(max(len(h), m), 48) for h, m in zip(headers, metadata)]
+
+    def _element_cells(row):
+        tc = table.type_name[row]
+        return [table.global_ids[row], s[table.ifc_class[row]], s[tc] if tc != UNTYPED else "(untyped)", s[table.level[row]]]
+
+    def rows():
+        n = 0
+        assigned = bytearray(len(table))
+        for row, item, q in zip(table.line_element, table.line_item, table.line_quantity):
+            n += 1
+            assigned[row] = 1
+            ci = items[item]
+            yield [n] + _element_cells(row) + [ci.code, ci.unit or "-", f"{q:.4f}", f"{ci.rate:.2f}", f"{q * ci.rate:.2f}"]
+        for row in range(len(table)):
+            if not assigned[row]:
+                n += 1
+                yield [n] + _element_cells(row) + ["", "", "", "", ""]
 
-    for cid, elems in sorted(item_map.items(), key=lambda x: x[0]):
-        ci = model[cid]
-        ident = getattr(ci, "Identification", "") or ci.GlobalId
-        descr = getattr(ci, "Name", "") or "(no name)"
-        unit = _unit(ci) or "-"
-        rate = _unit_cost(ci)
-
-        qty_sum = 0.0
-        for e in elems:
-            q = get_quantity_for_unit(e, unit, model=model)  # ✅ Aggiungi model=model
-            if q is None:
-                q = 1.0
-            qty_sum += float(q)
-        amount = rate * qty_sum
-        grand_total += amount
-        rows.append([ident, descr, unit, f"{qty_sum:.4f}", f"{rate:.2f}", f"{amount:.2f}"])
+    today = datetime.date.today().isoformat()
+    title = ["QUANTITY TAKE OFF (QTO) – PER ELEMENT", f"Date: {today}", f"Total Elements: {len(table)}", ""]
+    return _stream_report(out_path, title, headers, rows, lambda: ["", f"TOTAL LINES = {len(table.line_element)}"],
+                          widths=widths, compress=compress)
 
-    headers = ["Item", "Description", "Unit", "Quantity", "Unit Cost", "Total Amount"]
-    table_lines = _fmt_table(headers, rows)
+# Write the scenario comparison BOQ from a ScenarioComparison (helper_scenario): one row per cost item with the
+# base amount and, per scenario, the amount and its delta; a TOTAL row and the grand total deltas in the footer.
+def write_boq_scenarios(comparison, output_dir="output", filename="BOQ_scenarios.txt") -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, filename)
+    names = [s.name for s in comparison.scenarios]
+    amounts, totals = comparison.amounts, comparison.totals
+
+    def _pct(delta, base):
+        return f"{100.0 * delta / base:+.2f}%" if base else "-"
+
+    def rows():
+        for i, ci in enumerate(comparison.items):
+            base = amounts[i, 0]
+            row = [ci.code, ci.description, ci.unit or "-", f"{comparison.quantities[i]:.4f}", f"{base:.2f}"]
+            for s in range(1, len(names) + 1):
+                row += [f"{amounts[i, s]:.2f}", f"{amounts[i, s] - base:+.2f}"]
+            yield row
+        total = ["TOTAL", "", "", "", f"{totals[0]:.2f}"]
+        for s in range(1, len(names) + 1):
+            total += [f"{totals[s]:.2f}", f"{totals[s] - totals[0]:+.2f}"]
+        yield total
+
+    headers = ["Item", "Description", "Unit", "Quantity", "Base Amount"]
+    for name in names:
+        headers += [name, f"Δ {name}"]
 
     today = datetime.date.today().isoformat()
-    lines = []
-    lines.append("BILL OF QUANTITIES (BOQ) – TOTALS ONLY")
-    lines.append(f"Date: {today}")
-    lines.append("")
-    lines.extend(table_lines)
-    lines.append("")
-    lines.append(f"TOTAL: {grand_total:.2f}")
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-    return out_path
+    title = ["BILL OF QUANTITIES (BOQ) – SCENARIO COMPARISON", f"Date: {today}", ""]
+    for name, scenario, missing in zip(names, comparison.scenarios, comparison.missing):
+        note = f" ({missing} item(s) not in the price list: base unit cost)" if missing else ""
+        title.append(f"{name}: {scenario.source}{note}")
+    title.append("")
+
+    def footer():
+        yield ""
+        yield f"BASE TOTAL: {totals[0]:.2f}"
+        for s, name in enumerate(names, start=1):
+            delta = totals[s] - totals[0]
+            yield f"{name}: {totals[s]:.2f} ({delta:+.2f}, {_pct(delta, totals[0])})"
+
+    return _stream_report(out_path, title, headers, rows, footer)
+
+# Write the Monte Carlo BOQ from a MonteCarloResult (helper_montecarlo): base amount, mean and percentiles per item,
+# then the grand total. Item percentiles do not add up to the total percentiles (items vary independently).
+def write_boq_montecarlo(result, output_dir="output", filename="BOQ_montecarlo.txt") -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, filename)
+    from .helper_montecarlo import PERCENTILES
+
+    def _range(lo, hi):
+        return f"{100.0 * lo:+.1f}% / {100.0 * hi:+.1f}%"
+
+    def rows():
+        for i, ci in enumerate(result.items):
+            u = result.uncertainty[i]
+            yield [ci.code, ci.description, ci.unit or "-", _range(u.rate_min, u.rate_max),
+                   _range(u.quantity_min, u.quantity_max), f"{result.base[i]:.2f}", f"{result.mean[i]:.2f}"] + \
+                  [f"{p:.2f}" for p in result.percentiles[i]]
+        yield ["TOTAL", "", "", "", "", f"{result.base_total:.2f}", f"{result.total_mean:.2f}"] + \
+              [f"{p:.2f}" for p in result.total_percentiles]
+
+    headers = ["Item", "Description", "Unit", "Rate Range", "Quantity Range", "Base Amount", "Mean"]
+    headers += [f"P{p}" for p in PERCENTILES]
+    today = datetime.date.today().isoformat()
+    seed = result.seed if result.seed is not None else "random"
+    title = ["BILL OF QUANTITIES (BOQ) – MONTE CARLO", f"Date: {today}", f"Samples: {result.samples}, seed: {seed}", ""]
+    footer = ["", f"TOTAL: {result.base_total:.2f} (deterministic)"]
+    footer += [f"P{p}: {v:.2f}" for p, v in zip(PERCENTILES, result.total_percentiles)]
+    return _stream_report(out_path, title, headers, rows, lambda: footer)
+
+# Write the preview BOQ from a PreviewEstimate (helper_preview): extrapolated quantity and amount per cost item with
+# the margin of error, the total, and the strata (class, storey) with their sample sizes.
+def write_boq_preview(preview, output_dir="output", filename="BOQ_preview.txt") -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, filename)
+    conf = f"{100.0 * preview.confidence:g}%"
 
-# Return the IfcBuildingStorey name containing the element, else '(no level)'.
-# Traverses spatial containment hierarchy to find building storey.
-def _get_level_name(e) -> str:
-    try:
-        import ifcopenshell.util.element as uel
-        container = uel.get_container(e)
-        cur = container
-        while cur:
-            if cur.is_a("IfcBuildingStorey"):
-                name = getattr(cur, "Name", None)
-                return name if name else cur.GlobalId
-            rels = getattr(cur, "Decomposes", []) or []
-            cur = rels[0].RelatingObject if rels else None
-    except Exception:
-        pass
-    # Fallback: direct spatial containment
-    for rel in getattr(e, "ContainedInStructure", []) or []:
-        cur = getattr(rel, "RelatingStructure", None)
-        while cur:
-            if cur.is_a("IfcBuildingStorey"):
-                name = getattr(cur, "Name", None)
-                return name if name else cur.GlobalId
-            rels = getattr(cur, "Decomposes", []) or []
-            cur = rels[0].RelatingObject if rels else None
-    return "(no level)"
\ No newline at end of file
+    def rows():
+        for it in preview.items:
+            yield [it.code, it.description, it.unit or "-", f"{it.quantity:.4f}", f"{it.rate:.2f}",
+                   f"{it.amount:.2f}", f"± {it.margin:.2f}", it.sampled]
+        yield ["TOTAL", "", "", "", "", f"{preview.total:.2f}", f"± {preview.total_margin:.2f}", ""]
+
+    headers = ["Item", "Description", "Unit", "Est. Quantity", "Unit Cost", "Est. Amount", f"Margin ({conf})", "Sampled"]
+    today = datetime.date.today().isoformat()
+    seed = preview.seed if preview.seed is not None else "random"
+    title = [
+        "BILL OF QUANTITIES (BOQ) – PREVIEW (STRATIFIED SAMPLE)",
+        f"Date: {today}",
+        f"Sample: {preview.sample} of {preview.population} elements in {len(preview.strata)} strata (IFC class x storey), "
+        f"seed: {seed}",
+        f"Confidence: {conf} (normal approximation, finite population correction)",
+        "",
+    ]
+
+    def footer():
+        yield ""
+        yield f"TOTAL: {preview.total:.2f} ± {preview.total_margin:.2f} ({conf})"
+        yield f"Elements without price list match (extrapolated): {preview.unmatched:.0f}"
+        yield ""
+        strata_headers = ["IfcClass", "Level", "Elements", "Sampled"]
+        strata_rows = [[cls, lvl, n, s] for cls, lvl, n, s in preview.strata]
+        yield from _fmt_table(strata_headers, strata_rows)
+
+    return _stream_report(out_path, title, headers, rows, footer)
+
+# Write the pre-flight report from a PreflightReport (helper_preflight): coverage by IFC class and storey, the missing quantity kinds and the first missing elements.
+def write_preflight_report(report, output_dir="output", filename="PREFLIGHT.txt") -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, filename)
+
+    def rows():
+        for cls, lvl, n, priced, missing, by_kind in report.strata:
+            coverage = f"{100.0 * (1 - missing / priced):.1f}%" if priced else "-"
+            kinds = ", ".join(f"{k} {c}" for k, c in sorted(by_kind.items())) or "-"
+            yield [cls, lvl, n, priced, missing, kinds, coverage]
+
+    headers = ["IfcClass", "Level", "Elements", "Priced", "Missing Qty", "Missing Kinds", "Coverage"]
+    today = datetime.date.today().isoformat()
+    title = [
+        "PRE-FLIGHT CHECK – QUANTITY COMPLETENESS",
+        f"Date: {today}",
+        f"Elements: {report.elements}, priced: {report.priced}, missing quantities: {report.missing}, "
+        f"coverage: {100.0 * report.coverage:.1f}%",
+        "",
+    ]
+
+    def footer():
+        yield ""
+        if report.missing_by_kind:
+            yield "Missing by kind: " + ", ".join(f"{k} {c}" for k, c in sorted(report.missing_by_kind.items()))
+        if report.missing_examples:
+            yield ""
+            yield f"First {len(report.missing_examples)} elements without the needed quantity (priced with 1.0):"
+            yield from _fmt_table(["GlobalId", "IfcClass", "Level", "Needs"], [list(r) for r in report.missing_examples])
+
+    return _stream_report(out_path, title, headers, rows, footer)
@@ -0,0 +1,279 @@
+"""
+Zone and grid BOQ:
+- Extract one axis-aligned bounding box per element once (world coordinates in metres): from the tessellated
+  geometry (ifcopenshell.geom iterator, all cores) or only from the placement (point box at the element origin,
+  no tessellation); elements without geometry fall back to the placement
+- Keep the boxes in a .npz cache keyed by the model, so later zone queries do not recompute the geometry
+- Index the boxes in a uniform grid of XY buckets: a zone query only visits the cells the zone covers
+- Assign every element to the first zone containing the center of its box and aggregate the BOQ per zone
+
+Zone specs (CLI --zones=SPEC):
+- "zones.csv": one box per row, Zone;X Min;Y Min;Z Min;X Max;Y Max;Z Max (metres, EU decimals, empty = unbounded)
+- "grid": the bays between the consecutive axes of the IfcGrid objects of the model
+- "grid:12.5": regular 12.5 m x 12.5 m bays over the extent of the elements
+
+Functions / classes:
+- Zone: Named box (xmin, ymin, zmin, xmax, ymax, zmax), infinite bounds allowed
+- ElementBoxes: Bounding box per ElementTable row (NaN when unknown)
+- element_boxes: Extract (or load from the cache) the bounding boxes of the table elements
+- SpatialIndex: Uniform grid of XY buckets over element boxes
+- read_zones_csv / grid_bays / regular_bays / parse_zones: Build the zones
+- ZoneAssignment: Zones and zone index per table row (-1 outside all the zones)
+- assign_zones: Assign the elements to the zones with the spatial index
+- aggregate_boq_by_zone: Sum quantities and amounts per cost item and zone
+"""
+
+import math
+import os
+from array import array
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .helper_read import parse_decimal_eu, read_price_list
+
+OUTSIDE = "(outside zones)"
+
+class Zone(NamedTuple):
+    """Named axis-aligned box in metres; -inf / inf leave a direction unbounded."""
+
+    name: str
+    box: Tuple[float, float, float, float, float, float]
+
+class ElementBoxes(NamedTuple):
+    """Bounding boxes (rows, 6: xmin, ymin, zmin, xmax, ymax, zmax in metres) in ElementTable row order."""
+
+    global_ids: Tuple[str, ...]
+    boxes: np.ndarray
+
+    # Box centers (rows, 3), NaN for unknown boxes.
+    def centers(self) -> np.ndarray:
+        return (self.boxes[:, :3] + self.boxes[:, 3:]) / 2.0
+
+# Bounding boxes from the tessellated geometry (world coordinates), {entity id: box}.
+def _geometry_boxes(model, elements) -> Dict[int, Tuple[float, ...]]:
+    import multiprocessing
+    import ifcopenshell.geom
+
+    settings = ifcopenshell.geom.settings()
+    settings.set("use-world-coords", True)
+    out: Dict[int, Tuple[float, ...]] = {}
+    if not elements:
+        return out
+    iterator = ifcopenshell.geom.iterator(settings, model, multiprocessing.cpu_count(), include=elements)
+    if iterator.initialize():
+        while True:
+            shape = iterator.get()
+            verts = np.asarray(shape.geometry.verts, dtype=float).reshape(-1, 3)
+            if len(verts):
+                out[shape.id] = (*verts.min(axis=0), *verts.max(axis=0))
+            if not iterator.next():
+                break
+    return out
+
+# Point box at the origin of the element placement (project length unit scaled to metres), None without placement.
+def _placement_box(e, scale: float) -> Optional[Tuple[float, ...]]:
+    import ifcopenshell.util.placement
+
+    placement = getattr(e, "ObjectPlacement", None)
+    if placement is None:
+        return None
+    origin = ifcopenshell.util.placement.get_local_placement(placement)[:3, 3] * scale
+    return (*origin, *origin)
+
+# Extract the bounding box of every table element (geometry=False: placement only). With cache_path, boxes are
+# loaded from the cache when it was written for the same key and GlobalIds, else extracted and saved there.
+def element_boxes(model, table, *, geometry: bool = True, cache_path: Optional[str] = None,
+                  key: str = "") -> ElementBoxes:
+    import ifcopenshell.util.unit
+
+    global_ids = tuple(table.global_ids)
+    key = f"{key}|{'geometry' if geometry else 'placement'}"
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cached:
+                if str(cached["key"]) == key and tuple(cached["global_ids"]) == global_ids:
+                    return ElementBoxes(global_ids, cached["boxes"])
+        except (OSError, KeyError, ValueError):
+            print(f"[WARNING] Unreadable bounding box cache, extracting again: {cache_path}")
+
+    entities = [model.by_guid(g) for g in global_ids]
+    shapes = _geometry_boxes(model, entities) if geometry else {}
+    scale = ifcopenshell.util.unit.calculate_unit_scale(model)
+    boxes = np.full((len(entities), 6), np.nan)
+    for row, e in enumerate(entities):
+        box = shapes.get(e.id()) or _placement_box(e, scale)
+        if box is not None:
+            boxes[row] = box
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(cache_path, "wb") as f:
+            np.savez(f, key=np.array(key), global_ids=np.array(global_ids), boxes=boxes)
+    return ElementBoxes(global_ids, boxes)
+
+class SpatialIndex:
+    """
+    Uniform grid of XY buckets over element boxes: every box is listed in the cells it overlaps.
+    The default cell size gives about one element per cell over the extent of the boxes.
+    """
+
+    def __init__(self, boxes: np.ndarray, cell: Optional[float] = None):
+        self.boxes = boxes
+        known = np.flatnonzero(~np.isnan(boxes).any(axis=1))
+        self.buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        if not len(known):
+            self.origin, self.cell, self.shape = (0.0, 0.0), 1.0, (0, 0)
+            return
+        lo = boxes[known, :2].min(axis=0)
+        hi = boxes[known, 3:5].max(axis=0)
+        if cell is None:
+            extent = max(float((hi - lo).max()), 1e-6)
+            cell = extent / max(1.0, math.sqrt(len(known)))
+        self.origin, self.cell = (float(lo[0]), float(lo[1])), float(cell)
+        self.shape = tuple(int(n) + 1 for n in (hi - lo) // self.cell)
+
+        first = ((boxes[known, :2] - lo) // self.cell).astype(int)
+        last = ((boxes[known, 3:5] - lo) // self.cell).astype(int)
+        for row, (i0, j0), (i1, j1) in zip(known.tolist(), first.tolist(), last.tolist()):
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self.buckets[(i, j)].append(row)
+
+    # Cell range covered by [lo, hi] along one axis, clipped to the grid.
+    def _span(self, lo: float, hi: float, axis: int) -> range:
+        first = max(0, math.floor((lo - self.origin[axis]) / self.cell) if math.isfinite(lo) else 0)
+        last = min(self.shape[axis] - 1,
+                   math.floor((hi - self.origin[axis]) / self.cell) if math.isfinite(hi) else self.shape[axis] - 1)
+        return range(first, last + 1)
+
+    # Rows whose boxes intersect the query box (xmin, ymin, zmin, xmax, ymax, zmax), sorted.
+    def query(self, box: Sequence[float]) -> np.ndarray:
+        found = set()
+        for i in self._span(box[0], box[3], 0):
+            for j in self._span(box[1], box[4], 1):
+                found.update(self.buckets.get((i, j), ()))
+        rows = np.fromiter(sorted(found), dtype=np.intp, count=len(found))
+        b = self.boxes[rows]
+        lo, hi = np.asarray(box[:3]), np.asarray(box[3:])
+        return rows[(b[:, :3] <= hi).all(axis=1) & (b[:, 3:] >= lo).all(axis=1)]
+
+# Read zones from a CSV: Zone;X Min;Y Min;Z Min;X Max;Y Max;Z Max (metres, empty bound = unbounded).
+def read_zones_csv(csv_path: str, *, delimiter: str = ";", encoding: str = "cp1252") -> List[Zone]:
+    columns = ("X Min", "Y Min", "Z Min", "X Max", "Y Max", "Z Max")
+    zones: List[Zone] = []
+    for r in read_price_list(csv_path, delimiter=delimiter, encoding=encoding):
+        name = (r.get("Zone") or "").strip()
+        if not name:
+            continue
+        bounds = []
+        for k, col in enumerate(columns):
+            raw = (r.get(col) or "").strip()
+            bounds.append(parse_decimal_eu(raw) if raw else (-math.inf if k < 3 else math.inf))
+        zones.append(Zone(name, tuple(bounds)))
+    return zones
+
+# End points of a grid axis curve (IfcPolyline or IfcLine) in the grid coordinate system.
+def _axis_points(curve) -> Optional[Tuple[Tuple[float, ...], Tuple[float, ...]]]:
+    if curve is None:
+        return None
+    if curve.is_a("IfcPolyline") and len(curve.Points) >= 2:
+        return tuple(curve.Points[0].Coordinates), tuple(curve.Points[-1].Coordinates)
+    if curve.is_a("IfcLine"):
+        start = tuple(curve.Pnt.Coordinates)
+        d = curve.Dir.Orientation.DirectionRatios
+        return start, tuple(s + float(v) for s, v in zip(start, d))
+    return None
+
+# Bays between consecutive axes of every IfcGrid (axes parallel to X or Y after the grid placement);
+# bays are named "A-B/1-2" from the axis tags and unbounded in Z.
+def grid_bays(model) -> List[Zone]:
+    import ifcopenshell.util.placement
+    import ifcopenshell.util.unit
+
+    scale = ifcopenshell.util.unit.calculate_unit_scale(model)
+    zones: List[Zone] = []
+    for grid in model.by_type("IfcGrid"):
+        matrix = (ifcopenshell.util.placement.get_local_placement(grid.ObjectPlacement)
+                  if grid.ObjectPlacement else np.eye(4))
+        xs: List[Tuple[float, str]] = []
+        ys: List[Tuple[float, str]] = []
+        for axis in list(grid.UAxes or []) + list(grid.VAxes or []) + list(getattr(grid, "WAxes", None) or []):
+            points = _axis_points(axis.AxisCurve)
+            if points is None:
+                continue
+            (x0, y0), (x1, y1) = [(matrix @ np.array([p[0], p[1], 0.0, 1.0]))[:2].tolist() for p in points]
+            x0, y0, x1, y1 = x0 * scale, y0 * scale, x1 * scale, y1 * scale
+            tag = axis.AxisTag or str(axis.id())
+            if abs(x1 - x0) < abs(y1 - y0):
+                xs.append(((x0 + x1) / 2.0, tag))
+            else:
+                ys.append(((y0 + y1) / 2.0, tag))
+        xs.sort()
+        ys.sort()
+        for (xa, ta), (xb, tb) in zip(xs, xs[1:]):
+            for (ya, ua), (yb, ub) in zip(ys, ys[1:]):
+                zones.append(Zone(f"{ta}-{tb}/{ua}-{ub}", (xa, ya, -math.inf, xb, yb, math.inf)))
+    return zones
+
+# Regular step x step bays (metres) on a grid aligned to the extent of the known boxes, named "X1/Y1", "X2/Y1", ...
+# by column and row; only the bays containing at least one box center are returned (row by row).
+def regular_bays(boxes: ElementBoxes, step: float) -> List[Zone]:
+    centers = boxes.centers()[:, :2]
+    centers = centers[~np.isnan(centers).any(axis=1)]
+    if not len(centers) or step <= 0:
+        return []
+    x0, y0 = (float(v) for v in np.floor(boxes.boxes[:, :2][~np.isnan(boxes.boxes).any(axis=1)].min(axis=0) / step) * step)
+    cells = {(int(j), int(i)) for i, j in ((centers - (x0, y0)) // step).tolist()}
+    return [
+        Zone(f"X{i + 1}/Y{j + 1}", (x0 + i * step, y0 + j * step, -math.inf,
+                                    x0 + (i + 1) * step, y0 + (j + 1) * step, math.inf))
+        for j, i in sorted(cells)
+    ]
+
+# Build the zones of a spec: "zones.csv", "grid" (IfcGrid bays) or "grid:STEP" (regular bays in metres).
+def parse_zones(spec: str, model, boxes: ElementBoxes) -> List[Zone]:
+    if spec == "grid":
+        zones = grid_bays(model)
+        if not zones:
+            print("[WARNING] No IfcGrid with axes parallel to X and Y in the model: no grid bays")
+        return zones
+    if spec.startswith("grid:"):
+        return regular_bays(boxes, float(spec.split(":", 1)[1]))
+    if not os.path.isfile(spec):
+        raise FileNotFoundError(f"Zones file not found: {spec}")
+    return read_zones_csv(spec)
+
+class ZoneAssignment(NamedTuple):
+    """Zones and the zone index of every ElementTable row (-1 when the element is outside all the zones)."""
+
+    zones: Tuple[Zone, ...]
+    zone_of: array
+
+# Assign every element to the first zone that contains the center of its box. Each zone queries the spatial
+# index (a box whose center is inside the zone intersects it), so only the elements near the zone are tested.
+def assign_zones(boxes: ElementBoxes, zones: Sequence[Zone], index: Optional[SpatialIndex] = None) -> ZoneAssignment:
+    index = index or SpatialIndex(boxes.boxes)
+    centers = boxes.centers()
+    zone_of = np.full(len(boxes.global_ids), -1, dtype=np.int32)
+    for z, zone in enumerate(zones):
+        rows = index.query(zone.box)
+        c = centers[rows]
+        inside = (zone_of[rows] < 0) & (c >= zone.box[:3]).all(axis=1) & (c <= zone.box[3:]).all(axis=1)
+        zone_of[rows[inside]] = z
+    return ZoneAssignment(tuple(zones), array("i", zone_of.tobytes()))
+
+# Sum quantities and amounts per cost item and zone, as aggregate_boq by level: (item index, zone, qty, amount),
+# zones in their given order within an item, elements outside all the zones last.
+def aggregate_boq_by_zone(table, assignment: ZoneAssignment) -> List[Tuple[int, str, float, float]]:
+    qty = defaultdict(float)
+    zone_of = assignment.zone_of
+    for row, item, q in zip(table.line_element, table.line_item, table.line_quantity):
+        qty[(item, zone_of[row])] += q
+
+    out: List[Tuple[int, str, float, float]] = []
+    names = [z.name for z in assignment.zones]
+    for (item, z), q in sorted(qty.items(), key=lambda x: (x[0][0], x[0][1] < 0, x[0][1])):
+        out.append((item, names[z] if z >= 0 else OUTSIDE, q, table.items[item].rate * q))
+    return out
@@ -0,0 +1,40 @@
+"""
+Shared test setup:
+- Put the A3 folder on sys.path, so the tests import helper.* and A3_TOOL as the scripts do
+- build_model: Synthetic IFC4 model of named elements on storeys, each with an optional base length
+"""
+
+import os
+import sys
+from typing import Iterable, Optional, Tuple
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ifcopenshell
+from ifcopenshell.guid import new as new_guid
+
+# Build a model from (IFC class, Name, storey, length or None) tuples, elements in the given order.
+def _build_model(elements: Iterable[Tuple[str, str, str, Optional[float]]]):
+    model = ifcopenshell.file(schema="IFC4")
+    model.create_entity("IfcProject", GlobalId=new_guid(), Name="Synthetic")
+    storeys = {}
+    for cls, name, storey, length in elements:
+        if storey not in storeys:
+            storeys[storey] = (model.create_entity("IfcBuildingStorey", GlobalId=new_guid(), Name=storey), [])
+        e = model.create_entity(cls, GlobalId=new_guid(), Name=name)
+        if length is not None:
+            q = model.create_entity("IfcQuantityLength", Name="Length", LengthValue=float(length))
+            qset = model.create_entity("IfcElementQuantity", GlobalId=new_guid(), Name="BaseQuantities", Quantities=[q])
+            model.create_entity("IfcRelDefinesByProperties", GlobalId=new_guid(), RelatedObjects=[e],
+                                RelatingPropertyDefinition=qset)
+        storeys[storey][1].append(e)
+    for storey, members in storeys.values():
+        model.create_entity("IfcRelContainedInSpatialStructure", GlobalId=new_guid(), RelatedElements=members,
+                            RelatingStructure=storey)
+    return model
+
+@pytest.fixture
+def build_model():
+    return _build_model
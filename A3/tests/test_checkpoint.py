@@ -0,0 +1,59 @@
+"""
+Stage checkpoints of a full run (A3_TOOL.structural_cost_estimation, helper_checkpoint):
+- a checkpointed run followed by a resumed run with unchanged inputs skips every completed stage
+- a resumed run with a changed price list starts over
+"""
+
+import os
+
+import pytest
+
+import A3_TOOL
+
+PRICE_LIST = "Identification Code;Name;Ifc Match;IfcCostValue;Unit\nB1;HEB 200;IfcBeam;10,00;m\nC1;C 300;IfcColumn;5,50;m\n"
+ELEMENTS = ([("IfcBeam", "HEB 200", "L1", float(i)) for i in range(1, 7)]
+            + [("IfcColumn", "C 300", "L2", 2.0) for _ in range(4)])
+
+@pytest.fixture
+def inputs(tmp_path, build_model):
+    model_path = str(tmp_path / "model.ifc")
+    build_model(ELEMENTS).write(model_path)
+    price_path = tmp_path / "prices.csv"
+    price_path.write_text(PRICE_LIST, encoding="cp1252")
+    return model_path, str(price_path), str(tmp_path / "output")
+
+# {file name: modification time} of the outputs.
+def _outputs(output_dir):
+    return {name: os.stat(os.path.join(output_dir, name)).st_mtime_ns
+            for name in os.listdir(output_dir) if os.path.isfile(os.path.join(output_dir, name))}
+
+# Stage replacement failing the test when a resumed run repeats it.
+def _not_repeated(*args, **kwargs):
+    raise AssertionError("stage repeated on resume")
+
+def test_resume_skips_completed_stages(inputs, monkeypatch, capsys):
+    model_path, price_path, output_dir = inputs
+    assert A3_TOOL.structural_cost_estimation(model_path, price_path, output_dir, checkpoint_stages=True) is not None
+    written = _outputs(output_dir)
+    assert {"QTO.txt", "BOQ.txt", "QTO_total.txt", "BOQ_total.txt", "A3_TOOL.json", "model_cost.ifc"} <= set(written)
+    capsys.readouterr()
+
+    monkeypatch.setattr(A3_TOOL, "_open_stage", _not_repeated)
+    monkeypatch.setattr(A3_TOOL, "_match_stage", _not_repeated)
+    assert A3_TOOL.structural_cost_estimation(model_path, price_path, output_dir, resume=True) is not None
+
+    assert "Resumed from the checkpoint: element table loaded, 6 outputs already written" in capsys.readouterr().out
+    assert _outputs(output_dir) == written
+
+def test_changed_price_list_starts_over(inputs, capsys):
+    model_path, price_path, output_dir = inputs
+    A3_TOOL.structural_cost_estimation(model_path, price_path, output_dir, checkpoint_stages=True)
+    with open(price_path, "w", encoding="cp1252") as f:
+        f.write(PRICE_LIST.replace("10,00", "12,00"))
+    capsys.readouterr()
+
+    A3_TOOL.structural_cost_estimation(model_path, price_path, output_dir, resume=True)
+
+    assert "Resumed from the checkpoint" not in capsys.readouterr().out
+    with open(os.path.join(output_dir, "BOQ_total.txt"), encoding="utf-8") as f:
+        assert "TOTAL: 296.00" in f.read()
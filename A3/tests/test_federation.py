@@ -0,0 +1,76 @@
+"""
+GlobalId deduplication of federated tables (helper_federation.merge_element_tables), one case per policy:
+- "A" and "B" share the element "dup", priced 2 x B1 in A and 3 x B1 in B (a conflict)
+- "same" is in both with the same line (a duplicate, not a conflict)
+"""
+
+import pytest
+
+from helper.helper_federation import merge_element_tables
+from helper.helper_records import ElementTable
+
+# Table of (GlobalId, [(code, quantity), ...]) elements; item rates: B1 = 10.0, C1 = 5.0.
+def _table(elements):
+    rates = {"B1": 10.0, "C1": 5.0}
+    table = ElementTable(schema="IFC4")
+    items = {}
+    for gid, lines in elements:
+        row = table.add_element(gid, "IfcBeam", None, None, "L1")
+        for code, q in lines:
+            if code not in items:
+                items[code] = table.add_item(code, f"Item {code}", "m", rates[code])
+            table.add_line(row, items[code], q)
+    return table
+
+SOURCES = [
+    ("A", _table([("a1", [("B1", 1.0)]), ("dup", [("B1", 2.0)]), ("same", [("C1", 1.0)])])),
+    ("B", _table([("dup", [("B1", 3.0)]), ("same", [("C1", 1.0)]), ("b1", [])])),
+]
+
+# {GlobalId: (source name, [(code, quantity), ...])} of a merged table.
+def _merged(result):
+    table = result.table
+    lines = {}
+    for row, item, q in zip(table.line_element, table.line_item, table.line_quantity):
+        lines.setdefault(row, []).append((table.items[item].code, q))
+    return {gid: (result.sources[result.source_of[row]], lines.get(row, []))
+            for row, gid in enumerate(table.global_ids)}
+
+def test_first_keeps_the_first_copy():
+    result = merge_element_tables(SOURCES, "first")
+    merged = _merged(result)
+    assert merged["dup"] == ("A", [("B1", 2.0)])
+    assert merged["same"] == ("A", [("C1", 1.0)])
+    assert set(merged) == {"a1", "dup", "same", "b1"}
+    assert result.elements == (3, 3)
+    assert result.duplicates == (0, 2)
+    assert result.conflicts == 1
+
+def test_last_keeps_the_last_copy():
+    result = merge_element_tables(SOURCES, "last")
+    merged = _merged(result)
+    assert merged["dup"] == ("B", [("B1", 3.0)])
+    assert merged["same"] == ("B", [("C1", 1.0)])
+    assert result.duplicates == (2, 0)
+    assert result.conflicts == 1
+
+def test_max_keeps_the_highest_amount():
+    # dup: 2 x 10.0 = 20.0 in A against 3 x 10.0 = 30.0 in B; same: equal amounts, the first copy wins
+    result = merge_element_tables(SOURCES, "max")
+    merged = _merged(result)
+    assert merged["dup"] == ("B", [("B1", 3.0)])
+    assert merged["same"] == ("A", [("C1", 1.0)])
+    assert result.duplicates == (1, 1)
+    assert result.conflicts == 1
+
+def test_error_raises_on_a_duplicate():
+    with pytest.raises(ValueError, match="dup"):
+        merge_element_tables(SOURCES, "error")
+    result = merge_element_tables([SOURCES[0], ("C", _table([("c1", [("B1", 1.0)])]))], "error")
+    assert result.duplicates == (0, 0)
+    assert result.conflicts == 0
+    assert len(result.table) == 4
+
+def test_unknown_policy():
+    with pytest.raises(ValueError, match="Unknown duplicate policy"):
+        merge_element_tables(SOURCES, "newest")
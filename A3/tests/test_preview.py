@@ -0,0 +1,56 @@
+"""
+Stratified preview estimate (helper_preview.preview_estimate) on a synthetic model:
+- a census reproduces the exact totals with a margin of 0
+- strata of identical elements are extrapolated exactly, unmatched elements included
+- the same seed draws the same sample
+"""
+
+import pytest
+
+from helper.helper_estimate import CompiledPriceList
+from helper.helper_preview import preview_estimate
+
+PRICE_ROWS = [
+    {"Identification Code": "B1", "Name": "HEB 200", "Ifc Match": "IfcBeam", "IfcCostValue": "10,00", "Unit": "m"},
+    {"Identification Code": "C1", "Name": "C 300", "Ifc Match": "IfcColumn", "IfcCostValue": "5,50", "Unit": "m"},
+]
+
+# 6 beams of lengths 1..6 on L1, 4 columns of 2 m on L2 and L3, 3 walls (not in the price list) on L1.
+ELEMENTS = ([("IfcBeam", "HEB 200", "L1", float(i)) for i in range(1, 7)]
+            + [("IfcColumn", "C 300", level, 2.0) for level in ("L2", "L3") for _ in range(4)]
+            + [("IfcWall", "Wall", "L1", 1.0) for _ in range(3)])
+
+def test_census_reproduces_exact_totals(build_model):
+    estimate = preview_estimate(build_model(ELEMENTS), CompiledPriceList(PRICE_ROWS), sample_size=100, seed=1)
+
+    assert estimate.population == estimate.sample == len(ELEMENTS)
+    items = {i.code: i for i in estimate.items}
+    assert items["B1"].quantity == pytest.approx(21.0)
+    assert items["B1"].amount == pytest.approx(210.0)
+    assert items["C1"].quantity == pytest.approx(16.0)
+    assert items["C1"].amount == pytest.approx(88.0)
+    assert estimate.total == pytest.approx(298.0)
+    assert estimate.total_margin == 0.0
+    assert all(i.margin == 0.0 for i in estimate.items)
+    assert estimate.unmatched == pytest.approx(3.0)
+
+def test_identical_strata_extrapolate_exactly(build_model):
+    elements = ([("IfcColumn", "C 300", "L2", 2.0) for _ in range(20)]
+                + [("IfcWall", "Wall", "L1", 1.0) for _ in range(10)])
+    estimate = preview_estimate(build_model(elements), CompiledPriceList(PRICE_ROWS), sample_size=6, seed=3)
+
+    assert estimate.strata == (("IfcColumn", "L2", 20, 4), ("IfcWall", "L1", 10, 2))
+    (item,) = estimate.items
+    assert item.quantity == pytest.approx(40.0)
+    assert item.amount == pytest.approx(220.0)
+    assert item.margin == pytest.approx(0.0)
+    assert estimate.unmatched == pytest.approx(10.0)
+
+def test_same_seed_same_sample(build_model):
+    model = build_model(ELEMENTS)
+    price_list = CompiledPriceList(PRICE_ROWS)
+    first = preview_estimate(model, price_list, sample_size=6, seed=42)
+    second = preview_estimate(model, price_list, sample_size=6, seed=42)
+
+    assert first.sample < first.population
+    assert first == second